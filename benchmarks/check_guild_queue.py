@@ -0,0 +1,129 @@
+# Randomized consistency check of GuildQueue against a plain list.
+# A small CHUNK_SIZE makes chunk splits, empty-chunk removal and Fenwick tree
+# rebuilds happen constantly, so every code path is exercised within a few ops.
+# Half of the rounds queue Track records with a low PACK_THRESHOLD, so chunks are
+# packed and unpacked as well; those are compared by their records.
+#
+#   python benchmarks/check_guild_queue.py                 # 200 rounds of 500 operations
+#   python benchmarks/check_guild_queue.py --rounds 2000 --seed 7
+import random
+import argparse
+
+import fakes
+
+bot = fakes.import_bot()
+
+
+def make_track(number):
+    return bot.Track(
+        f"Song {number} \u00e9", duration=number * 1.5, video_id=f"vid{number}" if number % 3 else None,
+        query=f"Artist {number % 5} - Song {number}", artist=f"Artist {number % 5}" if number % 4 else None,
+        artwork_url=f"https://i.scdn.co/image/{number % 7}", is_spotify=bool(number % 2), spotify_id=f"sp{number}"
+    )
+
+
+def check_round(rng, operations, chunk_size, tracks):
+    queue = bot.GuildQueue()
+    queue.CHUNK_SIZE = chunk_size
+    queue.PACK_THRESHOLD = chunk_size * 3 if tracks else 0
+    make = make_track if tracks else int
+    value = (lambda item: tuple(item.to_record())) if tracks else (lambda item: item)
+    values = lambda items: [value(item) for item in items]
+    expected = []
+    next_item = 0
+
+    for _ in range(operations):
+        operation = rng.choice(("append", "append", "extend", "appendleft", "insert", "popleft", "pop", "move", "shuffle", "clear", "slice", "index", "snapshot"))
+        if operation == "append":
+            item = make(next_item)
+            queue.append(item)
+            expected.append(item)
+            next_item += 1
+        elif operation == "extend":
+            items = [make(number) for number in range(next_item, next_item + rng.randrange(chunk_size * 3))]
+            next_item += len(items)
+            queue.extend(items)
+            expected.extend(items)
+        elif operation == "appendleft":
+            item = make(next_item)
+            queue.appendleft(item)
+            expected.insert(0, item)
+            next_item += 1
+        elif operation == "insert":
+            index = rng.randint(-len(expected) - 2, len(expected) + 2)
+            item = make(next_item)
+            queue.insert(index, item)
+            # list.insert clamps the same way: negative past the start inserts first, past the end appends
+            expected.insert(index, item)
+            next_item += 1
+        elif operation == "popleft" and expected:
+            assert value(queue.popleft()) == value(expected.pop(0))
+        elif operation == "pop" and expected:
+            index = rng.randrange(-len(expected), len(expected))
+            assert value(queue.pop(index)) == value(expected.pop(index))
+        elif operation == "move" and expected:
+            from_index = rng.randrange(len(expected))
+            to_index = rng.randrange(len(expected))
+            item = expected.pop(from_index)
+            expected.insert(to_index, item)
+            assert value(queue.move(from_index, to_index)) == value(item)
+        elif operation == "shuffle":
+            queue.shuffle()
+            assert sorted(values(queue)) == sorted(values(expected))
+            expected = list(queue)
+        elif operation == "clear" and rng.random() < 0.1:
+            queue.clear()
+            expected.clear()
+        elif operation == "slice":
+            start = rng.randint(-len(expected) - 2, len(expected) + 2)
+            stop = rng.randint(-len(expected) - 2, len(expected) + 2)
+            step = rng.choice((None, None, 1, 2, 3))
+            assert values(queue[start:stop:step]) == values(expected[start:stop:step]), (start, stop, step)
+        elif operation == "snapshot":
+            # A snapshot keeps its contents while the queue is shuffled and drained
+            snapshot, before = queue.snapshot(), values(expected)
+            queue.shuffle()
+            expected = list(queue)
+            for _ in range(rng.randrange(len(expected) + 1)):
+                assert value(queue.popleft()) == value(expected.pop(0))
+            assert values(snapshot) == before
+        elif operation == "index" and expected:
+            index = rng.randrange(-len(expected), len(expected))
+            assert value(queue[index]) == value(expected[index])
+
+        assert len(queue) == len(expected)
+        assert bool(queue) == bool(expected)
+        for index in (len(expected), -len(expected) - 1):
+            try:
+                queue[index]
+            except IndexError:
+                pass
+            else:
+                raise AssertionError(f"index {index} did not raise IndexError")
+
+        # Entries near the playhead must be stored objects, not copies decoded from a packed chunk
+        assert all(isinstance(chunk, list) for chunk in queue._chunks[:2])
+        assert not expected or queue[0] is queue[0]
+    assert values(queue) == values(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz GuildQueue against a plain list")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--operations", type=int, default=500, help="operations per round (default: 500)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducing a failure")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    for round_index in range(args.rounds):
+        try:
+            check_round(rng, args.operations, chunk_size=rng.choice((1, 2, 3, 4, 8)), tracks=rng.random() < 0.5)
+        except AssertionError:
+            print(f"GuildQueue diverged from list in round {round_index} (seed {seed})")
+            raise
+    print(f"GuildQueue matched list over {args.rounds} rounds of {args.operations} operations (seed {seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+# Offline stand-ins for yt-dlp, Spotify and Discord used by the benchmarks and the load simulator.
+# Extraction and Spotify responses come from the recorded fixtures in fixtures/,
+# with ids and titles varied per request so caches and queues see distinct tracks.
+import os
+import sys
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+import itertools
+import discord
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Simulated Discord API round trip for responses, followups and message sends/edits
+API_LATENCY = 0.0
+
+FRAME_SECONDS = 0.02
+_IDS = itertools.count(1)
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def import_bot(log_level="WARNING"):
+    """Import the bot module with in-memory state, no metrics server and scratch files in a temp directory"""
+    workdir = tempfile.mkdtemp(prefix="djpablo-bench-")
+    settings = {
+        "STATE_BACKEND": "memory",
+        "LOUDNESS_ANALYSIS": "0",
+        "LOUDNESS_DB_PATH": os.path.join(workdir, "loudness.db"),
+        "OPUS_CACHE_DIR": os.path.join(workdir, "opus_cache"),
+        "LOG_FILE": os.path.join(workdir, "music_bot.log"),
+        "LOG_LEVEL": log_level,
+        "METRICS_PORT": "0",
+        "YTDL_WORKERS": "0",
+    }
+    # Set explicitly (not setdefault) so a shell or .env configuration cannot leak into the results
+    os.environ.update(settings)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import dj_pablo
+    return dj_pablo
+
+
+def fake_video_id(query):
+    """Stable 11 character YouTube-style id for a query"""
+    return hashlib.blake2b(query.encode(), digest_size=8).hexdigest()[:11]
+
+
+class FixtureExtractor:
+    """Replaces dj_pablo.EXTRACTION_POOL: answers searches and stream lookups from fixtures.
+
+    `latency` seconds are awaited per call to stand in for network time (0 measures
+    only the bot's own overhead).
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.calls = {}
+        self._search = load_fixture("ytdlp_search.json")
+        self._stream = load_fixture("ytdlp_stream.json")
+
+    async def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    async def extract(self, profile, query):
+        self.calls[profile] = self.calls.get(profile, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        video_id = fake_video_id(query)
+        if profile.startswith("stream"):
+            info = copy.deepcopy(self._stream)
+            info["id"] = video_id
+            info["webpage_url"] = f"https://www.youtube.com/watch?v={video_id}"
+            return info
+        info = copy.deepcopy(self._search)
+        entry = info["entries"][0]
+        entry["id"] = video_id
+        entry["url"] = f"https://www.youtube.com/watch?v={video_id}"
+        entry["title"] = query.split(":", 1)[-1].strip()
+        return info
+
+
+class FixtureSpotifyClient:
+    """Replaces the AsyncSpotifyClient: serves a playlist of `track_count` tracks built from the recorded page"""
+
+    def __init__(self, track_count, latency=0):
+        self.track_count = track_count
+        self.latency = latency
+        self.requests = 0
+        self._items = load_fixture("spotify_playlist_page.json")["items"]
+
+    async def get(self, path, params=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = params or {}
+        offset, limit = params.get("offset", 0), params.get("limit", 100)
+        items = []
+        for index in range(offset, min(offset + limit, self.track_count)):
+            item = copy.deepcopy(self._items[index % len(self._items)])
+            item["track"]["id"] = f"{item['track']['id'][:14]}{index:08d}"
+            item["track"]["name"] = f"{item['track']['name']} #{index}"
+            items.append(item)
+        return {"items": items, "total": self.track_count}
+
+    async def close(self):
+        pass
+
+
+class AudioStats:
+    """Frames read by all fake audio players, and how many were read more than a frame late"""
+
+    def __init__(self):
+        self.frames = 0
+        self.late_frames = 0
+        self._lock = threading.Lock()
+
+    def add(self, frames, late_frames):
+        with self._lock:
+            self.frames += frames
+            self.late_frames += late_frames
+
+    def snapshot(self):
+        with self._lock:
+            return self.frames, self.late_frames
+
+
+AUDIO_STATS = AudioStats()
+
+
+class SilentOpusSource(discord.AudioSource):
+    """`seconds` of Opus silence, standing in for an ffmpeg process streaming a track"""
+
+    SILENCE = b"\xf8\xff\xfe"
+
+    def __init__(self, seconds):
+        self.frames_left = int(seconds / FRAME_SECONDS)
+
+    def read(self):
+        if self.frames_left <= 0:
+            return b""
+        self.frames_left -= 1
+        return self.SILENCE
+
+    def is_opus(self):
+        return True
+
+
+class FakeAudioPlayer(threading.Thread):
+    """Reads a source every 20 ms on its own thread and calls `after` when it ends, like discord.py's AudioPlayer"""
+
+    def __init__(self, source, after):
+        super().__init__(daemon=True)
+        self.source = source
+        self.after = after
+        self._end = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def run(self):
+        frames = late_frames = 0
+        next_frame = time.perf_counter()
+        try:
+            while not self._end.is_set():
+                if not self._resumed.is_set():
+                    self._resumed.wait()
+                    next_frame = time.perf_counter()
+                    continue
+                if not self.source.read():
+                    self._end.set()
+                    break
+                frames += 1
+                next_frame += FRAME_SECONDS
+                delay = next_frame - time.perf_counter()
+                if delay < -FRAME_SECONDS:
+                    # A frame behind: discord.py sends immediately to catch up, listeners hear jitter
+                    late_frames += 1
+                self._end.wait(max(0.0, delay))
+        finally:
+            AUDIO_STATS.add(frames, late_frames)
+            self.source.cleanup()
+            if self.after is not None:
+                self.after(None)
+
+    def is_playing(self):
+        return self._resumed.is_set() and not self._end.is_set()
+
+    def is_paused(self):
+        return not self._end.is_set() and not self._resumed.is_set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def stop(self):
+        self._end.set()
+        self._resumed.set()
+
+
+class FakeVoiceClient:
+    """Voice client that plays sources on a FakeAudioPlayer thread without connecting anywhere.
+
+    `playing` fakes the playing state for benchmarks that never start a source.
+    """
+
+    def __init__(self, channel=None, playing=False):
+        self.channel = channel
+        self.guild = channel.guild if channel is not None else None
+        self.source = None
+        self._player = None
+        self._playing = playing
+        self._connected = True
+
+    def is_connected(self):
+        return self._connected
+
+    def is_playing(self):
+        if self._player is not None:
+            return self._player.is_playing()
+        return self._playing
+
+    def is_paused(self):
+        return self._player is not None and self._player.is_paused()
+
+    def play(self, source, *, after=None, **kwargs):
+        if self.is_playing():
+            raise discord.ClientException("Already playing audio.")
+        self.source = source
+        self._player = FakeAudioPlayer(source, after)
+        self._player.start()
+
+    def pause(self):
+        if self._player is not None:
+            self._player.pause()
+
+    def resume(self):
+        if self._player is not None:
+            self._player.resume()
+
+    def stop(self):
+        player, self._player = self._player, None
+        self.source = None
+        self._playing = False
+        if player is not None:
+            player.stop()
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+        self._connected = False
+        if self.guild is not None and self.guild.voice_client is self:
+            self.guild.voice_client = None
+
+
+async def api_call():
+    if API_LATENCY:
+        await asyncio.sleep(API_LATENCY)
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None, view=None):
+        self.id = next(_IDS)
+        self.channel = channel
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.view = view
+
+    async def edit(self, *, content=None, embed=None, view=None, **kwargs):
+        await api_call()
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        if view is not None:
+            self.view = view
+        return self
+
+    async def delete(self):
+        await api_call()
+
+
+class FakeTextChannel:
+    def __init__(self, guild):
+        self.id = next(_IDS)
+        self.guild = guild
+        self.name = "music"
+        self.messages_sent = 0
+
+    async def send(self, content=None, *, embed=None, view=None, **kwargs):
+        await api_call()
+        self.messages_sent += 1
+        return FakeMessage(self, content, embed, view)
+
+
+class FakeVoiceChannel:
+    """Voice channel whose connect() attaches a FakeVoiceClient to its guild after `connect_latency` seconds"""
+
+    def __init__(self, guild, connect_latency=0.0):
+        self.id = next(_IDS)
+        self.guild = guild
+        self.name = "Music"
+        self.connect_latency = connect_latency
+
+    async def connect(self, **kwargs):
+        if self.connect_latency:
+            await asyncio.sleep(self.connect_latency)
+        self.guild.voice_client = FakeVoiceClient(self)
+        return self.guild.voice_client
+
+
+class FakeResponse:
+    """interaction.response: records when the interaction was first answered"""
+
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self.messages = []
+
+    def is_done(self):
+        return self._interaction.responded_at is not None
+
+    def _respond(self):
+        if self._interaction.responded_at is not None:
+            raise discord.InteractionResponded(self._interaction)
+        self._interaction.responded_at = time.perf_counter()
+
+    async def defer(self, **kwargs):
+        self._respond()
+        await api_call()
+
+    async def send_message(self, content=None, **kwargs):
+        self._respond()
+        await api_call()
+        self.messages.append((content, kwargs))
+
+    async def edit_message(self, **kwargs):
+        self._respond()
+        await api_call()
+        self.messages.append((None, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        await api_call()
+        self.messages.append((content, kwargs))
+
+
+class FakeUser:
+    def __init__(self, user_id, voice_channel=None):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.voice = type("VoiceState", (), {"channel": voice_channel})()
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id, voice_client=None):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.voice_client = voice_client
+        self.shard_id = 0
+
+
+class FakeInteraction:
+    """Slash command or button interaction; `responded_at` is the perf_counter() time of the first response.
+
+    `message` is the message a button belongs to.
+    """
+
+    def __init__(self, guild, user, channel=None, message=None):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel
+        self.message = message
+        self.created_at = time.perf_counter()
+        self.responded_at = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup()
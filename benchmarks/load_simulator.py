@@ -0,0 +1,279 @@
+# Multi-guild load simulator: drives the real /play, /skip, /queue and now playing button
+# handlers for a growing number of simulated guilds in one process, and reports how
+# quickly interactions are answered. Discord, yt-dlp and ffmpeg are replaced by the
+# fakes in fakes.py; audio is "played" on one thread per voice client like discord.py does.
+#
+#   python benchmarks/load_simulator.py                                # ramp 10, 50, 100, 250, 500 guilds
+#   python benchmarks/load_simulator.py --ramp 100 1000 --stage-seconds 60
+#
+# Discord drops interactions that are not answered (or deferred) within 3 seconds, so
+# the key result is the largest guild count whose p99 first-response time stays under that.
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import fakes
+
+# Discord's deadline for the first response to an interaction
+RESPONSE_DEADLINE = 3.0
+
+# Relative frequency of each simulated user action
+ACTIONS = {
+    "play": 30,
+    "skip": 10,
+    "queue": 15,
+    "button_pause": 15,
+    "button_skip": 10,
+    "button_queue": 10,
+    "button_shuffle": 10,
+}
+
+bot = None
+
+
+def percentile(samples, quantile):
+    return samples[min(int(len(samples) * quantile), len(samples) - 1)] if samples else None
+
+
+def summarize(samples):
+    """p50/p95/p99/max in milliseconds"""
+    samples = sorted(samples)
+    return {
+        name: round(value * 1000, 2) if value is not None else None
+        for name, value in (
+            ("p50_ms", percentile(samples, 0.5)),
+            ("p95_ms", percentile(samples, 0.95)),
+            ("p99_ms", percentile(samples, 0.99)),
+            ("max_ms", samples[-1] if samples else None),
+        )
+    }
+
+
+class StageStats:
+    """Interaction timings collected while one ramp stage runs"""
+
+    def __init__(self):
+        self.first_response = {}
+        self.handler = {}
+        self.errors = 0
+        self.missed = 0
+        self.loop_lag = []
+
+    def record(self, action, first_response, handler):
+        self.first_response.setdefault(action, []).append(first_response)
+        self.handler.setdefault(action, []).append(handler)
+        if first_response > RESPONSE_DEADLINE:
+            self.missed += 1
+
+
+class SimulatedGuild:
+    """One guild with a text channel, a voice channel and a member issuing commands"""
+
+    def __init__(self, index, args, rng):
+        self.guild = fakes.FakeGuild(900000 + index)
+        self.guild_id = str(self.guild.id)
+        self.channel = fakes.FakeTextChannel(self.guild)
+        self.voice_channel = fakes.FakeVoiceChannel(self.guild, args.voice_connect_ms / 1000)
+        self.user = fakes.FakeUser(index, self.voice_channel)
+        self.args = args
+        self.rng = rng
+
+    def now_playing_message(self):
+        return bot.GUILD_NOW_PLAYING_MESSAGES.get(self.guild_id)
+
+    def button(self, name):
+        """The now playing message's control button (a fresh view if no message was sent yet)"""
+        message = self.now_playing_message()
+        view = message.view if message is not None and message.view is not None else bot.MusicControlView()
+        return getattr(view, name)
+
+    def handler_for(self, action):
+        if action == "play":
+            song = self.rng.randrange(self.args.distinct_songs)
+            return lambda interaction: bot.play.callback(interaction, f"Benchmark Artist {song % 97} - Song {song}")
+        if action == "skip":
+            return bot.skip.callback
+        if action == "queue":
+            return bot.queue.callback
+        button = self.button({
+            "button_pause": "pause_button",
+            "button_skip": "skip_button",
+            "button_queue": "queue_button",
+            "button_shuffle": "shuffle_button",
+        }[action])
+        return button.callback
+
+    async def run(self, stats_holder):
+        # Everyone starts by queueing something
+        action = "play"
+        while True:
+            handler = self.handler_for(action)
+            interaction = fakes.FakeInteraction(self.guild, self.user, self.channel, self.now_playing_message())
+            # discord.py runs every command in its own task; the wait to be scheduled is part of the latency
+            try:
+                await asyncio.create_task(handler(interaction))
+            except Exception:
+                stats_holder[0].errors += 1
+            finished = time.perf_counter()
+            responded_at = interaction.responded_at or finished
+            stats_holder[0].record(action, responded_at - interaction.created_at, finished - interaction.created_at)
+
+            await asyncio.sleep(self.rng.expovariate(self.args.actions_per_minute / 60))
+            action = self.rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+
+
+async def sample_loop_lag(stats_holder, interval=0.05):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats_holder[0].loop_lag.append(max(time.perf_counter() - started - interval, 0.0))
+
+
+def install_fakes(args):
+    """Point the bot's extraction and audio source creation at the offline stand-ins"""
+    bot.EXTRACTION_POOL = fakes.FixtureExtractor(args.extract_latency_ms / 1000)
+
+    async def create_silent_source(song_metadata, eq_preset, start_seconds=0):
+        # Stands in for spawning ffmpeg and opening the stream
+        await asyncio.sleep(args.source_latency_ms / 1000)
+        return fakes.SilentOpusSource(args.track_seconds - start_seconds)
+
+    bot.create_audio_source = create_silent_source
+    fakes.API_LATENCY = args.api_latency_ms / 1000
+
+
+def stage_report(guilds, seconds, stats, audio_before, audio_after, stalls):
+    all_first = [value for samples in stats.first_response.values() for value in samples]
+    all_handler = [value for samples in stats.handler.values() for value in samples]
+    return {
+        "guilds": len(guilds),
+        "playing": sum(1 for guild in guilds if guild.guild.voice_client and guild.guild.voice_client.is_playing()),
+        "interactions": len(all_first),
+        "interactions_per_second": round(len(all_first) / seconds, 1),
+        "errors": stats.errors,
+        "missed_deadline": stats.missed,
+        "first_response": summarize(all_first),
+        "handler": summarize(all_handler),
+        "loop_lag": summarize(stats.loop_lag),
+        "loop_stalls": stalls,
+        "audio_frames": audio_after[0] - audio_before[0],
+        "late_audio_frames": audio_after[1] - audio_before[1],
+        "by_action": {
+            action: {
+                "count": len(samples),
+                "first_response": summarize(samples),
+                "handler": summarize(stats.handler[action]),
+            }
+            for action, samples in sorted(stats.first_response.items())
+        },
+    }
+
+
+def print_stage(report):
+    first, lag = report["first_response"], report["loop_lag"]
+    print(
+        f"{report['guilds']:>6} guilds  {report['playing']:>6} playing  "
+        f"{report['interactions_per_second']:>7} int/s  "
+        f"first response p50/p95/p99 {first['p50_ms']}/{first['p95_ms']}/{first['p99_ms']} ms  "
+        f"loop lag p99 {lag['p99_ms']} ms  "
+        f"missed {report['missed_deadline']}  errors {report['errors']}  "
+        f"late audio frames {report['late_audio_frames']}/{report['audio_frames']}",
+        flush=True
+    )
+
+
+async def simulate(args):
+    # The bot schedules work with bot.loop from audio threads; set it up as logging in would
+    await bot.bot._async_setup_hook()
+    bot.LOOP_WATCHDOG.start()
+    install_fakes(args)
+
+    rng = random.Random(args.seed)
+    stats_holder = [StageStats()]
+    guilds = []
+    tasks = [asyncio.create_task(sample_loop_lag(stats_holder))]
+    reports = []
+    try:
+        for guild_count in args.ramp:
+            while len(guilds) < guild_count:
+                guild = SimulatedGuild(len(guilds), args, random.Random(rng.random()))
+                guilds.append(guild)
+                tasks.append(asyncio.create_task(guild.run(stats_holder)))
+                # Spread session starts over the first second of the stage
+                await asyncio.sleep(1 / guild_count)
+
+            stats_holder[0] = StageStats()
+            audio_before = fakes.AUDIO_STATS.snapshot()
+            stalls_before = bot.LOOP_WATCHDOG.stalls
+            started = time.perf_counter()
+            await asyncio.sleep(args.stage_seconds)
+            report = stage_report(
+                guilds, time.perf_counter() - started, stats_holder[0],
+                audio_before, fakes.AUDIO_STATS.snapshot(), bot.LOOP_WATCHDOG.stalls - stalls_before
+            )
+            reports.append(report)
+            print_stage(report)
+            if args.stop_on_miss and report["missed_deadline"]:
+                print("Stopping: interactions missed the response deadline")
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for guild in guilds:
+            if guild.guild.voice_client is not None:
+                await guild.guild.voice_client.disconnect()
+        for task in list(bot.GUILD_PREFETCH_TASKS.values()) + [task for _, task in bot.GUILD_PRELOAD_TASKS.values()]:
+            task.cancel()
+    return reports
+
+
+def main():
+    global bot
+    parser = argparse.ArgumentParser(description="Simulate many guilds using DJ Pablo at once and measure interaction latency")
+    parser.add_argument("--ramp", type=int, nargs="+", default=[10, 50, 100, 250, 500],
+                        help="guild counts to step through (default: 10 50 100 250 500)")
+    parser.add_argument("--stage-seconds", type=float, default=30, help="how long each guild count runs (default: 30)")
+    parser.add_argument("--actions-per-minute", type=float, default=4,
+                        help="average commands and button presses per guild per minute (default: 4)")
+    parser.add_argument("--distinct-songs", type=int, default=2000,
+                        help="size of the song pool queries are drawn from; smaller means more cache hits (default: 2000)")
+    parser.add_argument("--track-seconds", type=float, default=60, help="length of every simulated track (default: 60)")
+    parser.add_argument("--extract-latency-ms", type=float, default=400, help="simulated yt-dlp time per call (default: 400)")
+    parser.add_argument("--source-latency-ms", type=float, default=150,
+                        help="simulated ffmpeg start-up time per track (default: 150)")
+    parser.add_argument("--api-latency-ms", type=float, default=60,
+                        help="simulated Discord API round trip per response or message (default: 60)")
+    parser.add_argument("--voice-connect-ms", type=float, default=500, help="simulated voice connect time (default: 500)")
+    parser.add_argument("--stop-on-miss", action="store_true", help="stop ramping once an interaction misses the 3s deadline")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING", help="bot log level during the run (default: WARNING)")
+    parser.add_argument("--output", default="load_results.json", help="where to write the results")
+    args = parser.parse_args()
+
+    bot = fakes.import_bot(args.log_level)
+    reports = asyncio.run(simulate(args))
+
+    within_deadline = [
+        report["guilds"] for report in reports
+        if not report["missed_deadline"] and report["first_response"]["p99_ms"] is not None
+        and report["first_response"]["p99_ms"] < RESPONSE_DEADLINE * 1000
+    ]
+    summary = {
+        "max_guilds_within_deadline": max(within_deadline) if within_deadline else None,
+        "settings": vars(args),
+        "stages": reports,
+    }
+    with open(args.output, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Largest guild count answering every interaction within {RESPONSE_DEADLINE:g}s: {summary['max_guilds_within_deadline']}")
+    print(f"Results written to {args.output}")
+    if not within_deadline:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
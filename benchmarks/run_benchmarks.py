@@ -0,0 +1,240 @@
+# Offline benchmarks for DJ Pablo's hot paths. No network or Discord connection is
+# needed: yt-dlp and Spotify are answered from recorded fixtures (see fakes.py).
+#
+#   python benchmarks/run_benchmarks.py                      # writes benchmark_results.json
+#   python benchmarks/run_benchmarks.py --compare old.json   # also flags regressions against a baseline
+#
+# Measured: background Spotify playlist ingestion (process_remaining_tracks) throughput,
+# /queue embed render time, /shuffle cost and memory per queued track, each at several sizes.
+import os
+import gc
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+
+import fakes
+
+bot = fakes.import_bot()
+
+GUILD_ID = "1"
+PLAYLIST_URL = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+
+# Metrics checked by --compare (means and tail latencies of sub-millisecond timings are too noisy)
+COMPARED_METRICS = ("seconds", "tracks_per_second", "bytes_per_track", "p50_ms")
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 4),
+        "samples": len(samples),
+    }
+
+
+def build_queue(size):
+    """A queue of `size` Spotify-style tracks, as playlist ingestion would leave it"""
+    items = fakes.load_fixture("spotify_playlist_page.json")["items"]
+    queue = bot.GuildQueue()
+    for index in range(size):
+        track = bot.spotify_track_metadata(items[index % len(items)]["track"])
+        track.title = f"{track.title} #{index}"
+        track.video_id = fakes.fake_video_id(track.query + str(index))
+        track.duration = 180 + index % 120
+        queue.append(track)
+    return queue
+
+
+def reset_guild():
+    """Fresh queue and resolution cache, so every run starts cold"""
+    for task in bot.GUILD_PREFETCH_TASKS.values():
+        task.cancel()
+    bot.GUILD_PREFETCH_TASKS.clear()
+    bot.SONG_QUEUES[GUILD_ID] = bot.GuildQueue()
+    bot.CURRENT_SONG_INFO.pop(GUILD_ID, None)
+    bot.RESOLUTION_CACHE = bot.MemoryResolutionCache(bot.RESOLUTION_CACHE_TTL, bot.RESOLUTION_CACHE_MAX_ENTRIES)
+
+
+async def ingest_playlist(track_count, extractor):
+    """Queue a Spotify playlist the way /play does: first track up front, the rest in the background"""
+    bot.EXTRACTION_POOL = extractor
+    cursor = bot.SpotifyTrackCursor(fakes.FixtureSpotifyClient(track_count), PLAYLIST_URL)
+    await cursor.first()
+    started = time.perf_counter()
+    await bot.process_remaining_tracks(cursor, GUILD_ID, None)
+    return time.perf_counter() - started
+
+
+async def bench_ingestion(sizes, latency):
+    results = {}
+    # Without a listener draining the queue, the high-water mark would pause ingestion at the first 100 tracks
+    bot.INGEST_QUEUE_HIGH_WATER = 0
+    for size in sizes:
+        reset_guild()
+        extractor = fakes.FixtureExtractor(latency)
+        seconds = await ingest_playlist(size, extractor)
+        queued = len(bot.SONG_QUEUES[GUILD_ID])
+        results[f"ingest.spotify.cold.{size}"] = {
+            "seconds": round(seconds, 4),
+            "tracks_per_second": round(queued / seconds, 1),
+            "queued": queued,
+            "searches": extractor.calls.get("search", 0),
+        }
+
+        # Replaying the playlist resolves every track from the resolution cache
+        bot.SONG_QUEUES[GUILD_ID] = bot.GuildQueue()
+        seconds = await ingest_playlist(size, extractor)
+        queued = len(bot.SONG_QUEUES[GUILD_ID])
+        results[f"ingest.spotify.cached.{size}"] = {
+            "seconds": round(seconds, 4),
+            "tracks_per_second": round(queued / seconds, 1),
+            "queued": queued,
+        }
+    return results
+
+
+async def bench_memory(size):
+    reset_guild()
+    bot.INGEST_QUEUE_HIGH_WATER = 0
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        await ingest_playlist(size, fakes.FixtureExtractor())
+        # Only what the queue itself keeps alive counts
+        bot.RESOLUTION_CACHE = bot.MemoryResolutionCache(bot.RESOLUTION_CACHE_TTL, bot.RESOLUTION_CACHE_MAX_ENTRIES)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    queued = len(bot.SONG_QUEUES[GUILD_ID])
+    return {f"memory.queue.{size}": {"bytes_per_track": round(retained / queued, 1), "queued": queued}}
+
+
+async def bench_queue_embed(sizes, repeat):
+    results = {}
+    for size in sizes:
+        reset_guild()
+        bot.SONG_QUEUES[GUILD_ID] = build_queue(size)
+        bot.CURRENT_SONG_INFO[GUILD_ID] = {"title": "Benchmark track"}
+        view = bot.QueuePaginationView(GUILD_ID)
+        last_page = view.get_total_pages() - 1
+        samples = []
+        for index in range(repeat):
+            # First, middle and last pages: deep pages must not cost more than the first
+            view.current_page = (0, last_page // 2, last_page)[index % 3]
+            started = time.perf_counter()
+            view.create_queue_embed()
+            samples.append(time.perf_counter() - started)
+        view.stop()
+        results[f"queue_embed.render.{size}"] = summarize(samples)
+    return results
+
+
+async def bench_shuffle(sizes, repeat):
+    results = {}
+    guild = fakes.FakeGuild(int(GUILD_ID), fakes.FakeVoiceClient(playing=True))
+    user = fakes.FakeUser(1)
+    for size in sizes:
+        reset_guild()
+        bot.SONG_QUEUES[GUILD_ID] = build_queue(size)
+        samples = []
+        for _ in range(max(3, repeat // 10)):
+            interaction = fakes.FakeInteraction(guild, user)
+            started = time.perf_counter()
+            await bot.shuffle_command.callback(interaction)
+            samples.append(time.perf_counter() - started)
+        results[f"shuffle.command.{size}"] = summarize(samples)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=fakes.ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline run; returns the regressions beyond `tolerance` percent"""
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        old_metrics = baseline.get("results", {}).get(name)
+        if not old_metrics:
+            continue
+        for metric, value in metrics.items():
+            old_value = old_metrics.get(metric)
+            if metric not in COMPARED_METRICS or not old_value:
+                continue
+            higher_is_better = metric.endswith("per_second")
+            change = (value - old_value) / old_value * 100
+            worse = -change if higher_is_better else change
+            marker = "  REGRESSION" if worse > tolerance else ""
+            print(f"{name:32} {metric:18} {old_value:>12} -> {value:<12} {change:+7.1f}%{marker}")
+            if marker:
+                regressions.append((name, metric, change))
+    return regressions
+
+
+async def run(args):
+    results = {}
+    results.update(await bench_ingestion(args.tracks, args.extract_latency_ms / 1000))
+    results.update(await bench_memory(max(args.tracks)))
+    results.update(await bench_queue_embed(args.queue_sizes, args.repeat))
+    results.update(await bench_shuffle(args.queue_sizes, args.repeat))
+    reset_guild()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DJ Pablo's offline benchmarks")
+    parser.add_argument("--tracks", type=int, nargs="+", default=[500, 5000],
+                        help="playlist sizes for the ingestion benchmark (default: 500 5000)")
+    parser.add_argument("--queue-sizes", type=int, nargs="+", default=[10, 1000, 10000, 100000],
+                        help="queue sizes for the render and shuffle benchmarks")
+    parser.add_argument("--repeat", type=int, default=300, help="renders timed per queue size (default: 300)")
+    parser.add_argument("--extract-latency-ms", type=float, default=0,
+                        help="simulated yt-dlp latency per call (default: 0, measures only the bot's own overhead)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=10,
+                        help="percent change counted as a regression in --compare (default: 10)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "extract_latency_ms": args.extract_latency_ms,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, metrics in results.items():
+        print(f"{name:32} " + "  ".join(f"{metric}={value}" for metric, value in metrics.items()))
+    print(f"Results written to {os.path.abspath(args.output)}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} (revision {baseline.get('meta', {}).get('revision')}):")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
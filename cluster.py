@@ -0,0 +1,307 @@
+# Cluster launcher for DJ Pablo: runs MusicBot.py as several worker processes,
+# each an AutoShardedBot owning a contiguous range of shards, and supervises them.
+#
+#   python cluster.py                 # one worker per CPU core, Discord's recommended shard count
+#   python cluster.py --workers 4 --shards 16
+#
+# Workers are restarted when they exit or stop writing their health heartbeat,
+# and a combined health summary is logged and written to cluster_health.json.
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import logging.handlers
+import argparse
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MusicBot.py")
+HEARTBEAT_DIR = os.getenv("CLUSTER_HEARTBEAT_DIR", "cluster_heartbeats")
+HEALTH_FILE = os.getenv("CLUSTER_HEALTH_FILE", "cluster_health.json")
+LOG_FILE_BASE, LOG_FILE_EXT = os.path.splitext(os.getenv("LOG_FILE", "music_bot.log"))
+
+# A worker that has not written a heartbeat for this long is considered hung and restarted;
+# workers start heartbeating right after login, and get START_GRACE seconds to write the first one
+HEARTBEAT_TIMEOUT = int(os.getenv("CLUSTER_HEARTBEAT_TIMEOUT", "60"))
+START_GRACE = int(os.getenv("CLUSTER_START_GRACE", "180"))
+
+# Discord allows max_concurrency shard identifies per IDENTIFY_INTERVAL seconds for the whole bot,
+# so workers are started one at a time, each after the previous one's shards had time to identify
+IDENTIFY_INTERVAL = 5
+HEALTH_INTERVAL = 60
+
+# Restart back-off: doubles after each quick crash, reset once a worker stays up for STABLE_AFTER seconds
+RESTART_BACKOFF_MIN = 2
+RESTART_BACKOFF_MAX = 120
+STABLE_AFTER = 300
+
+# Seconds workers get to close their voice connections on shutdown before being killed
+SHUTDOWN_TIMEOUT = 20
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.handlers.RotatingFileHandler('cluster.log', maxBytes=10 * 1024 * 1024, backupCount=3),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("cluster")
+
+
+async def get_gateway_info():
+    """Ask Discord how many shards the bot should run and how many may identify at once"""
+    headers = {"Authorization": f"Bot {TOKEN}"}
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot") as response:
+            response.raise_for_status()
+            data = await response.json()
+            return data["shards"], data.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+def split_shards(shard_count, workers):
+    """Divide shard ids 0..shard_count-1 into `workers` contiguous, nearly equal ranges"""
+    base, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for index in range(workers):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class Worker:
+    """One bot process and its restart bookkeeping"""
+
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.heartbeat_file = os.path.join(HEARTBEAT_DIR, f"worker-{cluster_id}.json")
+        self.process = None
+        self.started_at = 0
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_MIN
+
+    async def start(self):
+        env = {
+            **os.environ,
+            "CLUSTER_ID": str(self.cluster_id),
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": ",".join(map(str, self.shard_ids)),
+            "CLUSTER_HEARTBEAT_FILE": self.heartbeat_file,
+            # Rotating one file from several processes is unsafe, so each worker gets its own
+            "LOG_FILE": f"{LOG_FILE_BASE}.worker-{self.cluster_id}{LOG_FILE_EXT}",
+        }
+        try:
+            os.remove(self.heartbeat_file)
+        except FileNotFoundError:
+            pass
+        self.process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=env)
+        self.started_at = time.time()
+        logger.info("Started worker %s (pid %s) for shards %s-%s", self.cluster_id, self.process.pid, self.shard_ids[0], self.shard_ids[-1])
+
+    def read_heartbeat(self):
+        try:
+            with open(self.heartbeat_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def heartbeat_age(self):
+        """Seconds since the last heartbeat (or since start if there has been none yet)"""
+        try:
+            return time.time() - os.path.getmtime(self.heartbeat_file)
+        except OSError:
+            return time.time() - self.started_at
+
+    def is_hung(self):
+        if not os.path.exists(self.heartbeat_file):
+            return self.heartbeat_age() > START_GRACE
+        return self.heartbeat_age() > HEARTBEAT_TIMEOUT
+
+    def identify_window(self, max_concurrency):
+        """Seconds this worker's shards need to identify at Discord's rate limit"""
+        buckets = -(-len(self.shard_ids) // max_concurrency)
+        return buckets * IDENTIFY_INTERVAL
+
+    def stop(self, sig=signal.SIGINT):
+        """Ask the worker to shut down; SIGINT lets discord.py close its connections cleanly"""
+        if self.process and self.process.returncode is None:
+            self.process.send_signal(sig)
+
+
+class ClusterSupervisor:
+    """Runs the workers, restarts crashed or hung ones and aggregates their health"""
+
+    def __init__(self, workers, max_concurrency=1):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.stopping = asyncio.Event()
+        self.identify_lock = asyncio.Lock()
+
+    async def start_worker(self, worker):
+        """Start a worker, keeping other (re)starts back until its shards have identified"""
+        async with self.identify_lock:
+            if self.stopping.is_set():
+                return False
+            await worker.start()
+            try:
+                await asyncio.wait_for(self.stopping.wait(), worker.identify_window(self.max_concurrency))
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    async def supervise(self, worker):
+        while not self.stopping.is_set():
+            if not await self.start_worker(worker):
+                return
+            returncode = await worker.process.wait()
+            if self.stopping.is_set():
+                return
+            uptime = time.time() - worker.started_at
+            if uptime >= STABLE_AFTER:
+                worker.backoff = RESTART_BACKOFF_MIN
+            logger.warning("Worker %s exited with code %s after %.0fs; restarting in %ss", worker.cluster_id, returncode, uptime, worker.backoff)
+            worker.restarts += 1
+            try:
+                await asyncio.wait_for(self.stopping.wait(), worker.backoff)
+                return
+            except asyncio.TimeoutError:
+                pass
+            worker.backoff = min(worker.backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def watch_heartbeats(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.stopping.wait(), HEARTBEAT_TIMEOUT / 4)
+                return
+            except asyncio.TimeoutError:
+                pass
+            for worker in self.workers:
+                if worker.process and worker.process.returncode is None and worker.is_hung():
+                    logger.error("Worker %s has not reported for %.0fs; killing it", worker.cluster_id, worker.heartbeat_age())
+                    worker.stop(signal.SIGKILL)
+
+    def health(self):
+        """Combined health of all workers"""
+        reports = []
+        for worker in self.workers:
+            running = worker.process is not None and worker.process.returncode is None
+            heartbeat = (worker.read_heartbeat() if running else None) or {}
+            reports.append({
+                "cluster_id": worker.cluster_id,
+                "pid": worker.process.pid if running else None,
+                "shards": [worker.shard_ids[0], worker.shard_ids[-1]],
+                "running": running,
+                "ready": running and heartbeat.get("ready", False),
+                "restarts": worker.restarts,
+                "heartbeat_age": round(worker.heartbeat_age(), 1),
+                "guilds": heartbeat.get("guilds", 0),
+                "voice_connections": heartbeat.get("voice_connections", 0),
+                "playing": heartbeat.get("playing", 0),
+                "latency_ms": heartbeat.get("latency_ms"),
+                "ffmpeg_processes": heartbeat.get("ffmpeg_processes", 0),
+            })
+        latencies = [report["latency_ms"] for report in reports if report["latency_ms"] is not None]
+        return {
+            "workers": len(reports),
+            "ready": sum(1 for report in reports if report["ready"]),
+            "guilds": sum(report["guilds"] for report in reports),
+            "voice_connections": sum(report["voice_connections"] for report in reports),
+            "playing": sum(report["playing"] for report in reports),
+            "max_latency_ms": max(latencies) if latencies else None,
+            "time": time.time(),
+            "per_worker": reports,
+        }
+
+    async def report_health(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), HEALTH_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            health = self.health()
+            logger.info(
+                "Cluster health: %s/%s workers ready, %s guilds, %s/%s voice connections playing, max latency %s ms", health['ready'], health['workers'], health['guilds'], health['playing'], health['voice_connections'], health['max_latency_ms']
+            )
+            try:
+                tmp_path = f"{HEALTH_FILE}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(health, f, indent=2)
+                os.replace(tmp_path, HEALTH_FILE)
+            except OSError as e:
+                logger.warning("Failed to write %s: %s", HEALTH_FILE, e)
+
+    async def shutdown(self):
+        logger.info("Shutting down cluster workers")
+        self.stopping.set()
+        for worker in self.workers:
+            worker.stop()
+        running = [worker.process.wait() for worker in self.workers if worker.process and worker.process.returncode is None]
+        try:
+            await asyncio.wait_for(asyncio.gather(*running), SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            for worker in self.workers:
+                worker.stop(signal.SIGKILL)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.create_task(self.shutdown()))
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+        await asyncio.gather(
+            *(self.supervise(worker) for worker in self.workers),
+            self.watch_heartbeats(),
+            self.report_health(),
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run DJ Pablo as a cluster of sharded worker processes")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CLUSTER_WORKERS", "0")) or os.cpu_count() or 1,
+                        help="number of worker processes (default: CLUSTER_WORKERS or the CPU count)")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "0")),
+                        help="total shard count (default: SHARD_COUNT or Discord's recommendation)")
+    args = parser.parse_args()
+
+    if not TOKEN:
+        logger.error("DISCORD_TOKEN is not set")
+        sys.exit(1)
+
+    try:
+        recommended_shards, max_concurrency = await get_gateway_info()
+    except aiohttp.ClientError as e:
+        if not args.shards:
+            raise
+        logger.warning("Could not fetch gateway info, assuming one identify at a time: %s", e)
+        recommended_shards, max_concurrency = None, 1
+    shard_count = args.shards or recommended_shards
+    worker_count = max(1, min(args.workers, shard_count))
+    os.makedirs(HEARTBEAT_DIR, exist_ok=True)
+    logger.info("Starting %s workers for %s shards", worker_count, shard_count)
+
+    workers = [
+        Worker(cluster_id, shard_ids, shard_count)
+        for cluster_id, shard_ids in enumerate(split_shards(shard_count, worker_count))
+    ]
+    supervisor = ClusterSupervisor(workers, max_concurrency)
+    try:
+        await supervisor.run()
+    finally:
+        if not supervisor.stopping.is_set():
+            await supervisor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
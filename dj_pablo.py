@@ -0,0 +1,5241 @@
+# Importing libraries and modules
+import os
+import discord
+from discord.ext import commands
+from discord import app_commands
+from dotenv import load_dotenv
+import ytdl_worker # NEW - yt-dlp extraction worker processes
+from concurrent.futures import ProcessPoolExecutor # NEW - For the extraction process pool
+from concurrent.futures.process import BrokenProcessPool # NEW
+import multiprocessing # NEW
+from collections import deque # NEW
+import asyncio # NEW
+import aiohttp # NEW - Async Spotify Web API client
+import re # NEW - For URL pattern matching
+import logging # NEW - For server logging
+from datetime import datetime, timedelta # NEW - For timestamps
+import random # NEW - For shuffle functionality
+import time # NEW - For stream URL freshness checks
+from itertools import islice, chain # NEW - For looking ahead in the queue
+from urllib.parse import urlparse, parse_qs # NEW - For reading stream URL expiry
+import sqlite3 # NEW - For the persistent resolution cache
+import threading # NEW - For guarding shared SQLite connections
+import json # NEW - For parsing ffmpeg loudness measurements
+import logging.handlers # NEW - Queue-based, rotating log handlers
+from queue import SimpleQueue # NEW - Log record queue
+from bisect import bisect_left # NEW - For histogram buckets
+from contextlib import contextmanager # NEW - For timing blocks into histograms
+from aiohttp import web # NEW - Metrics endpoint
+import traceback # NEW - For capturing the stack of a blocked event loop
+import contextvars # NEW - For tracing /play requests across awaits
+import atexit # NEW - For flushing queued log records on exit
+import platform # NEW - For locating the ffmpeg executable
+import shutil # NEW
+import mmap # NEW - For reading cached Opus tracks
+import struct # NEW - For the Opus cache file format
+from collections import OrderedDict # NEW - For LRU bookkeeping
+import weakref # NEW - For tracking live ffmpeg processes
+import sys # NEW - For interning repeated track strings
+from array import array # NEW - For packed queue chunks
+try:
+    import numpy as np # NEW - Optional, for the in-process DSP equalizer
+except ImportError:
+    np = None
+try:
+    import redis # NEW - Optional, for state shared between bot processes
+    import redis.asyncio
+except ImportError:
+    redis = None
+
+# Environment variables for tokens and other sensitive data
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+
+# Logging: records are queued and written by a background thread, so disk I/O never blocks the
+# event loop. The file is rotated by size (or by time with LOG_ROTATE_WHEN, e.g. "midnight")
+LOG_FILE = os.getenv("LOG_FILE", "music_bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # Log file format: "json" (one object per line) or "text"
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+TEXT_LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects; fields passed with `extra=` are included"""
+
+    STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted, so %-style messages are only built on the listener thread.
+
+    Log arguments must therefore not be mutated after the call (strings, numbers
+    and exceptions are all this bot passes).
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def configure_logging():
+    """Route all logging through a queue to a background thread writing the rotating log file and the console"""
+    if LOG_ROTATE_WHEN:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    file_handler.setFormatter(JsonLogFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_LOG_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_LOG_FORMAT))
+
+    log_queue = SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.handlers[:] = [DeferredQueueHandler(log_queue)]
+    listener.start()
+    # Flush queued records on exit
+    atexit.register(listener.stop)
+    return listener
+
+
+LOG_LISTENER = configure_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics; cluster workers add
+# their worker index to the port). 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+
+class Histogram:
+    """Prometheus-style latency histogram, optionally split by one label. Thread-safe, so the
+    audio threads can observe into it too.
+    """
+
+    def __init__(self, name, documentation, buckets, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._lock = threading.Lock()
+        self._series = {}  # label value -> per-bucket counts followed by sum and count
+
+    def observe(self, value, label_value=None):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, label_value=None):
+        """Observe the duration of the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label_value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((str(label_value), list(series)) for label_value, series in self._series.items())
+        for label_value, series in series_items:
+            labels = f'{self.label}="{label_value}"' if self.label else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {series[-1]}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{suffix} {series[-1]}")
+        return "\n".join(lines)
+
+
+def render_gauge(name, documentation, samples, metric_type="gauge"):
+    """Prometheus text for a gauge (or counter); `samples` are (labels dict or None, value) pairs"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{label_value}"' for key, label_value in (labels or {}).items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines)
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+YTDLP_EXTRACT_SECONDS = Histogram(
+    "djpablo_ytdlp_extract_seconds", "yt-dlp extraction time by option profile", LATENCY_BUCKETS, label="profile"
+)
+SPOTIFY_REQUEST_SECONDS = Histogram(
+    "djpablo_spotify_request_seconds", "Spotify Web API request time including retries", LATENCY_BUCKETS
+)
+FIRST_AUDIO_SECONDS = Histogram(
+    "djpablo_time_to_first_audio_seconds", "Time from picking the next track to its first audio frame",
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+LOOP_LAG_SECONDS = Histogram(
+    "djpablo_event_loop_lag_seconds", "How late the event loop ran a scheduled wake-up",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 3)
+)
+EMBED_UPDATE_SECONDS = Histogram(
+    "djpablo_embed_update_seconds", "Now playing message update time by action (edit or send)",
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5), label="action"
+)
+
+
+class StageStats:
+    """Rolling window of recent span durations per trace stage, reported as percentiles"""
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentiles(self):
+        """{stage: ({quantile: seconds}, sample count)}"""
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: ({quantile: samples[min(int(quantile * len(samples)), len(samples) - 1)] for quantile in self.QUANTILES},
+                    len(samples))
+            for stage, samples in snapshot.items()
+        }
+
+    def render(self, name, documentation):
+        lines = [f"# HELP {name} {documentation}", f"# TYPE {name} summary"]
+        for stage, (quantiles, count) in sorted(self.percentiles().items()):
+            for quantile, seconds in quantiles.items():
+                lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {seconds:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines)
+
+
+PLAY_STAGE_STATS = StageStats(1000)
+
+
+class PlayTrace:
+    """Timed spans of one /play request, from the interaction to the first audio frame.
+
+    The trace is emitted (as a structured log record, and into PLAY_STAGE_STATS)
+    once every holder has released it: the command handler and, if the request
+    started playback, the audio source after its first read.
+    """
+
+    def __init__(self, guild_id, query):
+        self.trace_id = os.urandom(4).hex()
+        self.guild_id = guild_id
+        self.query = query
+        self.started = time.perf_counter()
+        self.spans = []
+        self._holds = 1
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def add_span(self, name, started, duration, **attributes):
+        with self._lock:
+            if self._finished:
+                return
+            self.spans.append({
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 1),
+                "duration_ms": round(duration * 1000, 1),
+                **attributes,
+            })
+
+    def hold(self):
+        with self._lock:
+            self._holds += 1
+
+    def release(self):
+        with self._lock:
+            self._holds -= 1
+            if self._holds > 0 or self._finished:
+                return
+            self._finished = True
+        total = time.perf_counter() - self.started
+        PLAY_STAGE_STATS.record("total", total)
+        for span in self.spans:
+            PLAY_STAGE_STATS.record(span["name"], span["duration_ms"] / 1000)
+        logger.info(
+            "Trace %s for /play in guild %s: %.0f ms total (%s)",
+            self.trace_id, self.guild_id, total * 1000,
+            ", ".join(f"{span['name']} {span['duration_ms']:.0f} ms" for span in self.spans),
+            extra={"trace_id": self.trace_id, "guild_id": self.guild_id, "query": self.query,
+                   "total_ms": round(total * 1000, 1), "spans": self.spans}
+        )
+
+
+# The /play trace of the current task (None outside /play and in background work)
+CURRENT_TRACE = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def trace_span(name, **attributes):
+    """Time the block as a span of the current /play trace, if any; the yielded dict takes extra attributes"""
+    trace = CURRENT_TRACE.get()
+    if trace is None:
+        yield attributes
+        return
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        trace.add_span(name, started, time.perf_counter() - started, **attributes)
+
+
+def trace_event(name, **attributes):
+    """Record a zero-length marker (e.g. which fallback succeeded) in the current /play trace"""
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add_span(name, time.perf_counter(), 0, **attributes)
+
+class SpotifyAPIError(Exception):
+    """Raised when the Spotify Web API returns an unrecoverable error"""
+
+
+class AsyncSpotifyClient:
+    """Minimal asyncio Spotify Web API client using the client credentials flow.
+
+    Requests never block the event loop, 429 responses are retried after the
+    advertised Retry-After delay, and at most `max_concurrency` requests are
+    in flight at once.
+    """
+
+    API_URL = "https://api.spotify.com/v1"
+    TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+    def __init__(self, client_id, client_secret, max_concurrency=8, max_retries=5):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_retries = max_retries
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._session = None
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = None
+
+    async def _get_session(self):
+        # The session and locks must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._token_lock = asyncio.Lock()
+        return self._session
+
+    async def _get_token(self, force_refresh=False):
+        async with self._token_lock:
+            if self._token and not force_refresh and time.time() < self._token_expires_at - 60:
+                return self._token
+            session = await self._get_session()
+            auth = aiohttp.BasicAuth(self.client_id, self.client_secret)
+            async with session.post(self.TOKEN_URL, data={"grant_type": "client_credentials"}, auth=auth) as response:
+                if response.status != 200:
+                    raise SpotifyAPIError(f"Token request failed with HTTP {response.status}")
+                payload = await response.json()
+            self._token = payload["access_token"]
+            self._token_expires_at = time.time() + payload.get("expires_in", 3600)
+            return self._token
+
+    async def get(self, path, params=None):
+        """GET an API path, retrying on rate limits, expired tokens and server errors"""
+        with SPOTIFY_REQUEST_SECONDS.time():
+            return await self._get(path, params)
+
+    async def _get(self, path, params):
+        session = await self._get_session()
+        force_refresh = False
+        for attempt in range(self.max_retries):
+            token = await self._get_token(force_refresh)
+            force_refresh = False
+            async with self._semaphore:
+                async with session.get(f"{self.API_URL}/{path}", params=params,
+                                       headers={"Authorization": f"Bearer {token}"}) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+
+            if status == 429:
+                delay = int(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+                logger.warning("Spotify rate limit hit on '%s', retrying in %ss", path, delay)
+                await asyncio.sleep(delay)
+            elif status == 401:
+                force_refresh = True
+            elif status >= 500:
+                await asyncio.sleep(2 ** attempt)
+            else:
+                raise SpotifyAPIError(f"Spotify request '{path}' failed with HTTP {status}")
+
+        raise SpotifyAPIError(f"Spotify request '{path}' failed after {self.max_retries} attempts")
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+# Spotify API setup
+SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
+SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+
+# Maximum number of Spotify page requests in flight at once
+SPOTIFY_MAX_CONCURRENCY = int(os.getenv("SPOTIFY_MAX_CONCURRENCY", "8"))
+
+# Playlist and album pages requested concurrently ahead of background ingestion
+SPOTIFY_LOOKAHEAD_PAGES = int(os.getenv("SPOTIFY_LOOKAHEAD_PAGES", "3"))
+
+# Entries in the first YouTube playlist page (one YouTube page) and the most a later page may list
+YOUTUBE_PLAYLIST_FIRST_PAGE = 100
+YOUTUBE_PLAYLIST_MAX_PAGE = 800
+
+# Initialize Spotify client (only if credentials are provided)
+spotify_client = None
+if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
+    try:
+        spotify_client = AsyncSpotifyClient(
+            SPOTIFY_CLIENT_ID,
+            SPOTIFY_CLIENT_SECRET,
+            max_concurrency=SPOTIFY_MAX_CONCURRENCY
+        )
+        print("Spotify API initialized successfully!")
+    except Exception as e:
+        print(f"Failed to initialize Spotify API: {e}")
+        spotify_client = None
+
+# Queues longer than this keep their cold chunks (past the first two) in packed
+# columnar PackedTracks storage; 0 disables packing
+QUEUE_PACK_THRESHOLD = int(os.getenv("QUEUE_PACK_THRESHOLD", "2000"))
+
+class GuildQueue:
+    """Song queue stored as a list of chunks with a Fenwick tree over the chunk sizes.
+
+    Positions are located in O(log n) without copying, so page slicing, removal
+    and moves stay cheap on queues with thousands of tracks. `version` changes on
+    every mutation, letting views detect changes without comparing contents.
+
+    On queues longer than PACK_THRESHOLD, full chunks away from both ends are
+    packed into the queue's PackedTrackStore. The first two chunks are always plain
+    lists, so the entries near the playhead (which prefetching and preloading hold
+    on to) keep their identity; a packed chunk is unpacked as soon as it is modified.
+    """
+
+    CHUNK_SIZE = 256
+    PACK_THRESHOLD = QUEUE_PACK_THRESHOLD
+
+    def __init__(self, items=()):
+        self.version = 0
+        self._store = PackedTrackStore()
+        self._packed_entries = 0
+        self._chunks = []
+        self._tree = [0]
+        self._length = 0
+        self._rebuild(list(items))
+
+    def _rebuild(self, items=None, store_entries=False):
+        """Re-chunk `items` (or drop empty chunks) and rebuild the Fenwick tree.
+
+        With `store_entries`, int items are entry numbers in the store (see shuffle).
+        """
+        if items is not None:
+            self._chunks = [items[i:i + self.CHUNK_SIZE] for i in range(0, len(items), self.CHUNK_SIZE)]
+            pack = self.PACK_THRESHOLD and len(items) > self.PACK_THRESHOLD
+            for chunk_index, chunk in enumerate(self._chunks):
+                if pack and 2 <= chunk_index < len(self._chunks) - 1 and self._pack(chunk_index, store_entries):
+                    continue
+                if store_entries:
+                    self._chunks[chunk_index] = [self._store.get(item) if type(item) is int else item for item in chunk]
+            self._packed_entries = sum(len(chunk) for chunk in self._chunks if isinstance(chunk, PackedTracks))
+            self._compact()
+        else:
+            self._chunks = [chunk for chunk in self._chunks if chunk]
+            # Removing a chunk at the front moves packed chunks towards the playhead
+            self._unpack(0)
+            self._unpack(1)
+        self._length = sum(len(chunk) for chunk in self._chunks)
+        tree = [0] * (len(self._chunks) + 1)
+        for i, chunk in enumerate(self._chunks, 1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, chunk_index, delta):
+        i = chunk_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index):
+        """Map a queue position to (chunk index, offset within the chunk)"""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("queue index out of range")
+        chunk_index = 0
+        bit = 1 << (len(self._tree) - 1).bit_length()
+        while bit:
+            candidate = chunk_index + bit
+            if candidate < len(self._tree) and self._tree[candidate] <= index:
+                chunk_index = candidate
+                index -= self._tree[candidate]
+            bit >>= 1
+        return chunk_index, index
+
+    def _pack(self, chunk_index, store_entries=False):
+        """Pack the chunk at `chunk_index` if it holds only Tracks; returns whether it was packed"""
+        chunk = self._chunks[chunk_index]
+        if not all(type(item) is Track or (store_entries and type(item) is int) for item in chunk):
+            return False
+        entries = array("I", [item if type(item) is int else self._store.add(item) for item in chunk])
+        self._chunks[chunk_index] = PackedTracks(self._store, entries)
+        self._packed_entries += len(entries)
+        return True
+
+    def _unpack(self, chunk_index):
+        """Return the chunk at `chunk_index` as a plain list, unpacking it if needed"""
+        if chunk_index >= len(self._chunks):
+            return None
+        chunk = self._chunks[chunk_index]
+        if isinstance(chunk, PackedTracks):
+            chunk = self._chunks[chunk_index] = chunk.unpack()
+            self._packed_entries -= len(chunk)
+            self._compact()
+        return chunk
+
+    def _compact(self):
+        """Move the packed chunks to a new store once most of the old one is unreferenced"""
+        if len(self._store) <= max(4 * self.CHUNK_SIZE, 2 * self._packed_entries):
+            return
+        store = PackedTrackStore()
+        for chunk_index, chunk in enumerate(self._chunks):
+            if isinstance(chunk, PackedTracks):
+                # New chunk objects: snapshots being iterated keep reading the old store
+                entries = array("I", [store.copy(chunk.store, entry) for entry in chunk.entries])
+                self._chunks[chunk_index] = PackedTracks(store, entries)
+        self._store = store
+
+    def _remove_at(self, chunk_index, offset):
+        chunk = self._unpack(chunk_index)
+        item = chunk.pop(offset)
+        self._length -= 1
+        if chunk:
+            self._tree_add(chunk_index, -1)
+        else:
+            self._rebuild()
+        return item
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return []
+            chunk_index, offset = self._locate(start)
+            items = []
+            while len(items) < stop - start:
+                items.extend(self._chunks[chunk_index][offset:offset + stop - start - len(items)])
+                chunk_index += 1
+                offset = 0
+            return items
+        chunk_index, offset = self._locate(index)
+        return self._chunks[chunk_index][offset]
+
+    def append(self, item):
+        if not self._chunks or len(self._chunks[-1]) >= self.CHUNK_SIZE:
+            # Once the queue is long, every full chunk behind the first two is cold
+            if self.PACK_THRESHOLD and self._length >= self.PACK_THRESHOLD:
+                for chunk_index in range(2, len(self._chunks)):
+                    if type(self._chunks[chunk_index]) is list:
+                        self._pack(chunk_index)
+            self._chunks.append([item])
+            self._rebuild()
+        else:
+            self._chunks[-1].append(item)
+            self._tree_add(len(self._chunks) - 1, 1)
+            self._length += 1
+        self.version += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def appendleft(self, item):
+        self.insert(0, item)
+
+    def insert(self, index, item):
+        """Insert before `index`; positions past the end append"""
+        if index < 0:
+            index = max(0, index + self._length)
+        if index >= self._length:
+            self.append(item)
+            return
+        chunk_index, offset = self._locate(index)
+        chunk = self._unpack(chunk_index)
+        chunk.insert(offset, item)
+        self._length += 1
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            self._chunks[chunk_index:chunk_index + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+            self._rebuild()
+        else:
+            self._tree_add(chunk_index, 1)
+        self.version += 1
+
+    def popleft(self):
+        if not self._length:
+            raise IndexError("pop from an empty queue")
+        item = self._remove_at(0, 0)
+        self.version += 1
+        return item
+
+    def pop(self, index=-1):
+        """Remove and return the entry at `index`"""
+        item = self._remove_at(*self._locate(index))
+        self.version += 1
+        return item
+
+    def move(self, from_index, to_index):
+        """Move the entry at `from_index` so that it ends up at `to_index`; returns it"""
+        item = self.pop(from_index)
+        self.insert(to_index, item)
+        return item
+
+    def shuffle(self):
+        """Shuffle in place (the queue object stays the same for concurrent producers)"""
+        # Packed entries are shuffled as store entry numbers, so they move without being decoded
+        items = []
+        for chunk in self._chunks:
+            items.extend(chunk.entries if isinstance(chunk, PackedTracks) else chunk)
+        random.shuffle(items)
+        self._rebuild(items, store_entries=self._packed_entries > 0)
+        self.version += 1
+
+    def snapshot(self):
+        """Iterable of the current entries that stays valid while the queue changes.
+
+        Packed chunks are immutable and only decoded while iterating, so a snapshot of
+        a long queue is cheap to take on the event loop and can be consumed off it.
+        """
+        return chain.from_iterable([chunk if isinstance(chunk, PackedTracks) else list(chunk) for chunk in self._chunks])
+
+    def clear(self):
+        self._store = PackedTrackStore()
+        self._packed_entries = 0
+        self._chunks = []
+        self._tree = [0]
+        self._length = 0
+        self.version += 1
+
+
+# Create the structure for queueing songs - Dictionary of GuildQueue per guild
+SONG_QUEUES = {}
+
+# Track current playing song info for embeds
+CURRENT_SONG_INFO = {}
+
+# Audio EQ presets with higher quality settings: output bitrate and
+# equalizer bands as (frequency Hz, bandwidth Hz, gain dB). "passthrough"
+# presets copy Opus streams without re-encoding when the source allows it.
+AUDIO_PRESETS = {
+    "default": {"bitrate": "256k", "bands": []},
+    "bass_boost": {"bitrate": "256k", "bands": [(60, 50, 5), (170, 50, 3)]},
+    "enhanced": {"bitrate": "320k", "bands": [(60, 50, 6), (170, 50, 4), (350, 50, 2), (3000, 100, 2), (6000, 100, 1)]},
+    "vocal_boost": {"bitrate": "256k", "bands": [(1000, 200, 3), (3000, 200, 2)]},
+    "treble_boost": {"bitrate": "256k", "bands": [(4000, 100, 3), (8000, 100, 4)]},
+    "cinema": {"bitrate": "320k", "bands": [(60, 50, 4), (170, 50, 2), (1000, 200, -1), (6000, 100, 2)]},
+    "raw": {"bitrate": "256k", "bands": [], "passthrough": True}
+}
+
+# Loudness normalization target (integrated LUFS, true peak dBTP, loudness range LU)
+LOUDNESS_TARGET_I = -16.0
+LOUDNESS_TARGET_TP = -1.5
+LOUDNESS_TARGET_LRA = 11.0
+LIVE_LOUDNORM_FILTER = f"loudnorm=I={LOUDNESS_TARGET_I:g}:TP={LOUDNESS_TARGET_TP:g}:LRA={LOUDNESS_TARGET_LRA:g}"
+
+
+def build_audio_filters(eq_preset, loudness=None):
+    """Build the ffmpeg -af chain for a preset.
+
+    With a stored loudness measurement the track gets a cheap precomputed gain
+    (plus a peak limiter for the EQ boost); otherwise live single-pass loudnorm.
+    """
+    filters = [
+        f"equalizer=f={frequency}:width_type=h:width={width}:g={gain}"
+        for frequency, width, gain in AUDIO_PRESETS[eq_preset]["bands"]
+    ]
+    if loudness:
+        # Never raise the measured true peak above the target ceiling
+        gain_db = min(LOUDNESS_TARGET_I - loudness["input_i"], LOUDNESS_TARGET_TP - loudness["input_tp"])
+        filters.append(f"volume={gain_db:.2f}dB")
+        filters.append(f"alimiter=limit={10 ** (LOUDNESS_TARGET_TP / 20):.3f}:level=disabled")
+    else:
+        filters.append(LIVE_LOUDNORM_FILTER)
+    return ",".join(filters)
+
+
+def preset_bitrate_kbps(eq_preset):
+    """A preset's output bitrate in kbps (as discord.py's Opus encoder takes it)"""
+    return int(AUDIO_PRESETS[eq_preset]["bitrate"].rstrip("k"))
+
+
+def build_pcm_ffmpeg_options(loudness=None):
+    """ffmpeg options for decoding a track to PCM for the DSP equalizer (loudness handling only, no EQ).
+
+    The EQ and its limiter run in DSPEqualizerSource and the preset's bitrate is applied by
+    discord.py's encoder (see play_next_song), since the output is not encoded by ffmpeg.
+    """
+    return {
+        "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
+        "options": f"-vn -af \"{build_audio_filters('default', loudness)}\"",
+    }
+
+
+def build_ffmpeg_options(eq_preset, loudness=None):
+    """ffmpeg input/output options for streaming a track with the given preset"""
+    return {
+        "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
+        "options": f"-vn -ar 48000 -ac 2 -b:a {AUDIO_PRESETS[eq_preset]['bitrate']} -af \"{build_audio_filters(eq_preset, loudness)}\"",
+    }
+
+
+def can_passthrough(song_metadata):
+    """Whether a resolved stream is already 48 kHz Opus and can be sent to Discord without re-encoding"""
+    codec = song_metadata.audio_codec or ""
+    return codec.startswith("opus") and song_metadata.audio_rate == 48000
+
+
+def get_ffmpeg_executable():
+    """Detect OS and return the ffmpeg executable path"""
+    system = platform.system().lower()
+    if system == "windows":
+        return "bin/ffmpeg/ffmpeg.exe"
+    # On Linux, use bundled ffmpeg if present, else system ffmpeg
+    bundled_linux_ffmpeg = os.path.join("bin", "ffmpeg", "ffmpeg")
+    if os.path.isfile(bundled_linux_ffmpeg) and os.access(bundled_linux_ffmpeg, os.X_OK):
+        return bundled_linux_ffmpeg
+    return shutil.which("ffmpeg") or "ffmpeg"
+
+# Current EQ setting per guild
+GUILD_EQ_SETTINGS = {}
+
+# "ffmpeg" bakes the EQ into the ffmpeg filter graph; "dsp" decodes to PCM and applies
+# it in-process with NumPy, so EQ changes take effect mid-track
+EQ_ENGINE = os.getenv("EQ_ENGINE", "ffmpeg")
+if EQ_ENGINE == "dsp" and np is None:
+    logger.warning("EQ_ENGINE=dsp requires numpy; falling back to the ffmpeg equalizer")
+    EQ_ENGINE = "ffmpeg"
+
+# Maximum number of ffmpeg processes (playback and loudness analysis); further ones wait for a free slot
+FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", "32"))
+
+# An ffmpeg process that leaves a read blocked for this many seconds is considered stuck and killed
+FFMPEG_STALL_TIMEOUT = float(os.getenv("FFMPEG_STALL_TIMEOUT", "20"))
+
+# Seconds between ffmpeg supervisor checks (stall detection and /proc accounting)
+FFMPEG_MONITOR_INTERVAL = 5
+
+# Seconds of decoded audio kept per shared decode; guilds starting a track within this window
+# of each other share one ffmpeg process (0 disables sharing)
+SHARED_DECODE_BUFFER_SECONDS = float(os.getenv("SHARED_DECODE_BUFFER_SECONDS", "30"))
+
+# The DSP equalizer processes each 20 ms frame (960 samples) in blocks of this many samples
+DSP_BLOCK_SIZE = 120
+
+# The DSP equalizer's limiter holds boosted peaks at the true peak target, like alimiter does for
+# the ffmpeg engine; after a peak its gain recovers by this factor of the remaining reduction per frame
+DSP_LIMITER_CEILING = 32767 * 10 ** (LOUDNESS_TARGET_TP / 20)
+DSP_LIMITER_RELEASE = 0.85
+
+# Store the last now playing message for each guild to update it
+GUILD_NOW_PLAYING_MESSAGES = {}
+
+
+# Number of upcoming tracks whose stream URLs are resolved ahead of the playhead
+PREFETCH_WINDOW = int(os.getenv("PREFETCH_WINDOW", "3"))
+
+# Fallback lifetime (seconds) for stream URLs that carry no "expire" parameter
+STREAM_URL_MAX_AGE = int(os.getenv("STREAM_URL_MAX_AGE", "18000"))
+
+# Background stream URL prefetch task per guild
+GUILD_PREFETCH_TASKS = {}
+
+# Seconds before the end of a track at which the next track's audio source is opened and primed
+GAPLESS_PRELOAD_SECONDS = float(os.getenv("GAPLESS_PRELOAD_SECONDS", "5"))
+
+# Primed audio source for the next queue entry per guild, and the (queue entry, task) preparing it
+GUILD_PRELOADED_SOURCES = {}
+GUILD_PRELOAD_TASKS = {}
+
+# Lazily expanded (Spotify) playlists stop pulling new tracks while this many songs are queued
+INGEST_QUEUE_HIGH_WATER = int(os.getenv("INGEST_QUEUE_HIGH_WATER", "100"))
+
+# Set whenever playback takes a song off a guild's queue, to wake paused ingestion
+GUILD_QUEUE_DRAINED = {}
+
+# Maximum number of playlist tracks looked up concurrently during background ingestion
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+
+# Log ingestion progress every this many tracks
+INGEST_PROGRESS_INTERVAL = 50
+
+# Running background playlist ingestions per guild (progress dicts)
+GUILD_INGESTIONS = {}
+
+# yt-dlp extraction process pool (0 workers runs extraction on the thread executor instead)
+YTDL_WORKERS = int(os.getenv("YTDL_WORKERS", str(min(4, os.cpu_count() or 1))))
+YTDL_TIMEOUT = int(os.getenv("YTDL_TIMEOUT", "60"))
+YTDL_RECYCLE_AFTER = int(os.getenv("YTDL_RECYCLE_AFTER", "500"))
+
+# Background loudness analysis (replaces live loudnorm with a precomputed gain on later plays)
+LOUDNESS_ANALYSIS_ENABLED = os.getenv("LOUDNESS_ANALYSIS", "1") == "1"
+LOUDNESS_ANALYSIS_CONCURRENCY = int(os.getenv("LOUDNESS_ANALYSIS_CONCURRENCY", "1"))
+LOUDNESS_DB_PATH = os.getenv("LOUDNESS_DB_PATH", "loudness.db")
+
+# On-disk cache of encoded Opus output for hot tracks (0 bytes disables it)
+OPUS_CACHE_DIR = os.getenv("OPUS_CACHE_DIR", "opus_cache")
+OPUS_CACHE_MAX_BYTES = int(os.getenv("OPUS_CACHE_MAX_MB", "2048")) * 1024 * 1024
+OPUS_CACHE_MIN_PLAYS = int(os.getenv("OPUS_CACHE_MIN_PLAYS", "2"))
+OPUS_CACHE_MAGIC = b"DJPOPUS1"
+OPUS_PACKET_HEADER = struct.Struct("<H")
+
+# Persistent query -> YouTube video cache
+RESOLUTION_CACHE_PATH = os.getenv("RESOLUTION_CACHE_PATH", "resolution_cache.db")
+RESOLUTION_CACHE_TTL = int(os.getenv("RESOLUTION_CACHE_TTL", str(7 * 24 * 3600)))
+RESOLUTION_CACHE_MAX_ENTRIES = int(os.getenv("RESOLUTION_CACHE_MAX_ENTRIES", "50000"))
+
+# Persistent guild state (queues, EQ presets, playing track): changes are written every
+# GUILD_STATE_FLUSH_INTERVAL seconds; RESUME_PLAYBACK rejoins voice and continues after a restart
+GUILD_STATE_DB_PATH = os.getenv("GUILD_STATE_DB_PATH", "guild_state.db")
+GUILD_STATE_FLUSH_INTERVAL = float(os.getenv("GUILD_STATE_FLUSH_INTERVAL", "5"))
+RESUME_PLAYBACK = os.getenv("RESUME_PLAYBACK", "1") == "1"
+
+# Cluster mode (set by cluster.py for each worker process): total shard count, the shard ids
+# this process owns, its worker index and the file its health heartbeat is written to
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()] or None
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+CLUSTER_HEARTBEAT_FILE = os.getenv("CLUSTER_HEARTBEAT_FILE")
+CLUSTER_HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TASK = None
+
+# Event loop watchdog: lag is sampled every LOOP_LAG_INTERVAL seconds and the loop thread's stack
+# is captured when it is blocked for LOOP_STALL_SECONDS. LOOP_SLOW_CALLBACK_MS > 0 also turns on
+# asyncio debug mode, which logs every callback running longer than that (with some overhead)
+LOOP_LAG_INTERVAL = 0.25
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_SECONDS", "1"))
+LOOP_SLOW_CALLBACK_MS = int(os.getenv("LOOP_SLOW_CALLBACK_MS", "0"))
+
+# Where guild state and the resolution cache live: "sqlite" (local files), "redis" (shared by
+# every bot process, so guilds can be split between processes) or "memory" (tests)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "djpablo:")
+if STATE_BACKEND == "redis" and redis is None:
+    logger.warning("STATE_BACKEND=redis requires the redis package; falling back to sqlite")
+    STATE_BACKEND = "sqlite"
+# The client connects lazily on its first command
+REDIS_CLIENT = redis.asyncio.from_url(REDIS_URL) if STATE_BACKEND == "redis" else None
+
+# Helper functions for URL detection and processing
+def is_spotify_url(url):
+    """Check if the URL is a Spotify URL"""
+    spotify_patterns = [
+        r'https://open\.spotify\.com/(track|playlist|album)/([a-zA-Z0-9]+)',
+        r'spotify:(track|playlist|album):([a-zA-Z0-9]+)'
+    ]
+    return any(re.match(pattern, url) for pattern in spotify_patterns)
+
+def is_youtube_playlist(url):
+    """Check if the URL is a YouTube playlist"""
+    youtube_playlist_patterns = [
+        r'https://www\.youtube\.com/playlist\?list=([a-zA-Z0-9_-]+)',
+        r'https://youtube\.com/playlist\?list=([a-zA-Z0-9_-]+)',
+        r'https://m\.youtube\.com/playlist\?list=([a-zA-Z0-9_-]+)'
+    ]
+    return any(re.match(pattern, url) for pattern in youtube_playlist_patterns)
+
+def extract_spotify_id(url):
+    """Extract Spotify ID and type from URL"""
+    patterns = [
+        r'https://open\.spotify\.com/(track|playlist|album)/([a-zA-Z0-9]+)',
+        r'spotify:(track|playlist|album):([a-zA-Z0-9]+)'
+    ]
+    for pattern in patterns:
+        match = re.match(pattern, url)
+        if match:
+            return match.group(1), match.group(2)
+    return None, None
+
+def spotify_track_metadata(track, artist_name=None, artwork_url=None):
+    """Build the Track used for queueing from a Spotify track object"""
+    if artist_name is None:
+        artist_name = ", ".join([artist["name"] for artist in track["artists"]])
+    track_name = track["name"]
+    # Get album artwork (first image is usually largest)
+    if artwork_url is None and track.get("album") and track["album"].get("images"):
+        artwork_url = track["album"]["images"][0]["url"]
+
+    return Track(
+        track_name,
+        query=f"{artist_name} - {track_name}",
+        artist=artist_name,
+        artwork_url=artwork_url,
+        is_spotify=True,
+        spotify_id=track.get("id")
+    )
+
+
+class SpotifyTrackCursor:
+    """Lazily pages through a Spotify track, playlist or album, yielding Track records.
+
+    Only the first page is fetched up front. As the consumer advances, up to
+    `lookahead` following pages are requested concurrently, so paging keeps up
+    with fast consumers without listing the whole playlist. `total` is known
+    once the first page has arrived. With `start_offset` listing continues from
+    that position, e.g. to resume a playlist after a restart.
+    """
+
+    def __init__(self, client, url, start_offset=0, lookahead=SPOTIFY_LOOKAHEAD_PAGES):
+        self.client = client
+        self.url = url
+        self.content_type, self.spotify_id = extract_spotify_id(url)
+        self.total = 0
+        self.pages_fetched = 0
+        self.lookahead = max(1, lookahead)
+        self._buffer = deque()
+        self._path = None
+        self._params = {}
+        self._page_size = 0
+        self._next_offset = start_offset
+        self._pages_in_flight = deque()
+        self._artist_name = None
+        self._artwork_url = None
+        self._started = False
+        # Playlist offsets of the tracks handed out and not yet passed to resume_offset()
+        self._handed_out = deque()
+        self._handed_out_base = 0
+
+    async def start(self):
+        """Fetch the first page (idempotent)"""
+        if self._started:
+            return
+        self._started = True
+        if self.content_type == "track":
+            track = await self.client.get(f"tracks/{self.spotify_id}")
+            self.total = 1
+            self.pages_fetched = 1
+            if self._next_offset == 0:
+                self._buffer.append((0, spotify_track_metadata(track)))
+            self._next_offset = 1
+
+        elif self.content_type == "playlist":
+            # Only request the fields we use to keep pages small
+            self._path = f"playlists/{self.spotify_id}/tracks"
+            self._params = {"fields": "total,items(track(id,name,artists(name),album(images)))"}
+            self._page_size = 100
+            offset = self._next_offset
+            self._next_offset += self._page_size
+            self._add_page(offset, await self.client.get(self._path, {**self._params, "offset": offset, "limit": self._page_size}))
+
+        elif self.content_type == "album":
+            album = await self.client.get(f"albums/{self.spotify_id}")
+            self._artist_name = ", ".join([artist["name"] for artist in album["artists"]])
+            # Get album artwork (same for all tracks in album)
+            if album.get("images"):
+                self._artwork_url = album["images"][0]["url"]
+            self._path = f"albums/{self.spotify_id}/tracks"
+            self._page_size = 50
+            self.total = album["tracks"].get("total", 0)
+            # The album response embeds the first page of tracks
+            if self._next_offset == 0:
+                self._next_offset = self._page_size
+                self._add_page(0, album["tracks"])
+
+    def _add_page(self, offset, page):
+        self.pages_fetched += 1
+        self.total = page.get("total", self.total)
+        for index, item in enumerate(page.get("items") or [], offset):
+            track = item.get("track") if self.content_type == "playlist" else item
+            if track and track.get("artists"):
+                self._buffer.append((index, spotify_track_metadata(track, self._artist_name, self._artwork_url)))
+
+    def _fetch_ahead(self):
+        """Keep up to `lookahead` page requests in flight"""
+        while self._path and len(self._pages_in_flight) < self.lookahead and self._next_offset < self.total:
+            offset = self._next_offset
+            self._next_offset += self._page_size
+            params = {**self._params, "offset": offset, "limit": self._page_size}
+            self._pages_in_flight.append((offset, asyncio.create_task(self.client.get(self._path, params))))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.start()
+        # Request the following pages while the consumer works through the second half of this one
+        if len(self._buffer) <= self._page_size // 2:
+            self._fetch_ahead()
+        while not self._buffer:
+            self._fetch_ahead()
+            if not self._pages_in_flight:
+                raise StopAsyncIteration
+            offset, task = self._pages_in_flight.popleft()
+            self._add_page(offset, await task)
+        offset, track = self._buffer.popleft()
+        self._handed_out.append(offset)
+        return track
+
+    @property
+    def handed_out(self):
+        """Number of tracks returned so far"""
+        return self._handed_out_base + len(self._handed_out)
+
+    def resume_offset(self, done):
+        """Playlist offset to continue from once the first `done` tracks handed out have been dealt with"""
+        while self._handed_out and self._handed_out_base < done:
+            self._handed_out.popleft()
+            self._handed_out_base += 1
+        if self._handed_out:
+            return self._handed_out[0]
+        if self._buffer:
+            return self._buffer[0][0]
+        if self._pages_in_flight:
+            return self._pages_in_flight[0][0]
+        return self._next_offset
+
+    async def first(self):
+        """Return the first track (fetching only the first page), or None if there are none"""
+        try:
+            return await self.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def close(self):
+        """Cancel page requests that are still in flight"""
+        while self._pages_in_flight:
+            self._pages_in_flight.popleft()[1].cancel()
+
+
+class YouTubePlaylistStream:
+    """Pages through a YouTube playlist in the extraction pool, yielding Track records.
+
+    Each page is a flat listing of one range of entries (playliststart/playlistend).
+    YouTube has no offsets, so every listing walks the playlist from its start; pages
+    double in size up to YOUTUBE_PLAYLIST_MAX_PAGE to keep that re-walking small. The
+    next page is requested once the consumer is halfway through the current one, so
+    at most two pages are held. `total` is the playlist size when YouTube reports it,
+    otherwise None.
+    """
+
+    def __init__(self, url, first_page=YOUTUBE_PLAYLIST_FIRST_PAGE, max_page=YOUTUBE_PLAYLIST_MAX_PAGE):
+        self.url = url
+        self.total = None
+        self.count = 0
+        self.pages_fetched = 0
+        self._max_page = max_page
+        self._buffer = deque()
+        self._page_size = first_page
+        self._prefetch_at = 0
+        self._next_start = 1
+        self._page_in_flight = None
+        self._exhausted = False
+
+    def _fetch_ahead(self):
+        """Request the next page unless one is already in flight"""
+        if self._page_in_flight is not None or self._exhausted:
+            return
+        start, end = self._next_start, self._next_start + self._page_size - 1
+        self._next_start = end + 1
+        self._page_size = min(self._page_size * 2, self._max_page)
+        overrides = {"playliststart": start, "playlistend": end}
+        self._page_in_flight = (end - start + 1, asyncio.create_task(EXTRACTION_POOL.extract("playlist", self.url, overrides)))
+
+    def _add_page(self, requested, info):
+        self.pages_fetched += 1
+        self._prefetch_at = requested // 2
+        if self.total is None:
+            self.total = info.get("playlist_count")
+        entries = info.get("entries") or []
+        # A short page is the end of the playlist
+        if len(entries) < requested:
+            self._exhausted = True
+        for entry in entries:
+            if entry and entry.get("id"):
+                # Only the video id is kept; the stream URL is resolved near the playhead
+                self._buffer.append(create_song_metadata(
+                    entry.get("title") or "Unknown Title",
+                    duration=entry.get("duration"),
+                    video_id=entry["id"],
+                ))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if len(self._buffer) <= self._prefetch_at:
+            self._fetch_ahead()
+        while not self._buffer:
+            self._fetch_ahead()
+            if self._page_in_flight is None:
+                raise StopAsyncIteration
+            (requested, task), self._page_in_flight = self._page_in_flight, None
+            try:
+                info = await task
+            except BaseException:
+                # Later pages would leave a gap, so the stream ends here
+                self._exhausted = True
+                raise
+            self._add_page(requested, info)
+        self.count += 1
+        return self._buffer.popleft()
+
+    async def first(self):
+        """Return the first track once the first page is listed, or None if there are none"""
+        try:
+            return await self.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def close(self):
+        """Stop listing; a page request still in flight is cancelled"""
+        self._exhausted = True
+        self._buffer.clear()
+        if self._page_in_flight is not None:
+            self._page_in_flight[1].cancel()
+            self._page_in_flight = None
+
+
+async def search_ytdlp_async(query, profile):
+    """Run a yt-dlp extraction with the named option profile in the extraction pool"""
+    return await EXTRACTION_POOL.extract(profile, query)
+
+
+# yt-dlp options for turning a search query into a video id (no stream URL extraction)
+YTDL_SEARCH_OPTIONS = {
+    "extract_flat": "in_playlist",
+    "noplaylist": True,
+    "quiet": True,
+    "no_warnings": True,
+    "socket_timeout": 15,
+    "retries": 3,
+}
+
+# yt-dlp options for resolving the playable stream URL of a single video
+YTDL_STREAM_OPTIONS = {
+    "format": "bestaudio[acodec=opus]/bestaudio[ext=webm]/bestaudio[ext=m4a]/bestaudio",
+    "noplaylist": True,
+    "youtube_include_dash_manifest": False,
+    "youtube_include_hls_manifest": False,
+    "extractaudio": True,
+    "audioformat": "opus",
+    "audioquality": 0,  # Best quality
+    "prefer_ffmpeg": True,
+    "quiet": True,  # Reduce output verbosity
+    "no_warnings": True,  # Suppress warnings
+    "socket_timeout": 30,  # Prevent hanging
+    "retries": 3,  # Retry failed downloads
+    "age_limit": 99,  # Bypass age restrictions
+    "geo_bypass": True,  # Try to bypass geo-restrictions
+}
+
+# Simplified options used as the last stream resolution attempt
+YTDL_SIMPLE_OPTIONS = {
+    "format": "bestaudio/best",
+    "noplaylist": True,
+    "quiet": True,
+    "no_warnings": True,
+    "extractaudio": True,
+    "audioformat": "best",
+}
+
+
+# Flat, lazy listing of playlist entries (ids and titles only); YouTubePlaylistStream sets the range per page
+YTDL_PLAYLIST_OPTIONS = {
+    "extract_flat": True,
+    "lazy_playlist": True,
+    "socket_timeout": 15,
+    "quiet": True,
+    "no_warnings": True,
+}
+
+
+def with_cookies(ydl_options):
+    """Return a copy of the yt-dlp options using cookies.txt if it is present"""
+    ydl_options = ydl_options.copy()
+    cookies_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cookies.txt")
+    if os.path.exists(cookies_path):
+        ydl_options["cookiefile"] = cookies_path
+    return ydl_options
+
+
+def build_ytdl_profiles():
+    """Named yt-dlp option sets; each extraction worker keeps one warm YoutubeDL per profile"""
+    cookies_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cookies.txt")
+    if os.path.exists(cookies_path):
+        logger.info("Using cookies.txt for yt-dlp: %s", cookies_path)
+    else:
+        logger.info("No cookies.txt found, not using YouTube cookies for yt-dlp")
+
+    return {
+        "search": with_cookies(YTDL_SEARCH_OPTIONS),
+        "search_nocookies": YTDL_SEARCH_OPTIONS,
+        "alternative": {**YTDL_SEARCH_OPTIONS, "socket_timeout": 15, "retries": 2},
+        "stream": with_cookies(YTDL_STREAM_OPTIONS),
+        "stream_fallback": {**YTDL_STREAM_OPTIONS, "extractor_args": {"youtube": {"skip": ["dash", "hls"]}}},
+        "stream_simple": YTDL_SIMPLE_OPTIONS,
+        "playlist": with_cookies(YTDL_PLAYLIST_OPTIONS),
+    }
+
+
+class ExtractionPool:
+    """Process pool running yt-dlp extractions with warm, per-profile YoutubeDL instances.
+
+    Extraction is CPU-heavy Python, so running it in separate processes keeps
+    the GIL (and the gateway heartbeat) free. Each call has a timeout. After
+    `recycle_after` calls a replacement pool is warmed in the background and
+    swapped in; a timed-out call retires the pool immediately and kills its
+    workers after a grace period. With zero workers extraction falls back to
+    the default thread executor.
+    """
+
+    def __init__(self, workers, timeout, recycle_after):
+        self.workers = workers
+        self.timeout = timeout
+        self.recycle_after = recycle_after
+        self._executor = None
+        self._warmup = None
+        self._recycling = None
+        self._profiles = None
+        self._calls = 0
+
+    def _spawn(self):
+        """Create a pool and start initializing all of its workers; returns (executor, warmup future)"""
+        self._profiles = build_ytdl_profiles()
+        # spawn avoids forking a process that is running threads and an event loop. Spawned
+        # workers re-import the started script, which is why that is the thin MusicBot.py
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=ytdl_worker.init_worker,
+            initargs=(self._profiles,)
+        )
+        loop = asyncio.get_running_loop()
+        warmup = asyncio.gather(*(loop.run_in_executor(executor, ytdl_worker.ping) for _ in range(self.workers)))
+        return executor, warmup
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            self._executor, self._warmup = self._spawn()
+            self._calls = 0
+
+    async def _recycle(self):
+        """Warm a replacement pool, then swap it in and let the old one finish its in-flight calls"""
+        old_executor = self._executor
+        executor = None
+        try:
+            executor, warmup = self._spawn()
+            await warmup
+        except Exception as e:
+            logger.error("Failed to recycle yt-dlp extraction pool: %s", e)
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            return
+        finally:
+            self._recycling = None
+
+        if self._executor is not old_executor:
+            # The pool was retired (timeout, crash or shutdown) while warming; its successor stays
+            executor.shutdown(wait=False, cancel_futures=True)
+            return
+        self._executor, self._warmup = executor, warmup
+        self._calls = 0
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+        logger.info("Recycled yt-dlp extraction pool")
+
+    def _retire(self, kill_after=None):
+        """Stop routing calls to the current pool; optionally kill its workers after a grace period"""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        if kill_after is not None:
+            def kill_stuck_workers():
+                for process in processes:
+                    if process.is_alive():
+                        logger.warning("Killing stuck yt-dlp worker process %s", process.pid)
+                        process.kill()
+            asyncio.get_running_loop().call_later(kill_after, kill_stuck_workers)
+
+    async def start(self):
+        """Spawn and initialize every worker ahead of the first request"""
+        if self.workers <= 0:
+            return
+        self._ensure_executor()
+        await self._warmup
+        logger.info("yt-dlp extraction pool ready with %s worker processes", self.workers)
+
+    async def extract(self, profile, query, overrides=None):
+        """Extract `query` with a profile; `overrides` change that profile's options for this call only"""
+        with YTDLP_EXTRACT_SECONDS.time(profile), trace_span(f"ytdlp:{profile}"):
+            return await self._extract(profile, query, overrides)
+
+    async def _extract(self, profile, query, overrides):
+        loop = asyncio.get_running_loop()
+        if self.workers <= 0:
+            if self._profiles is None:
+                self._profiles = build_ytdl_profiles()
+            return await asyncio.wait_for(
+                loop.run_in_executor(None, ytdl_worker.extract_once, {**self._profiles[profile], **(overrides or {})}, query),
+                self.timeout
+            )
+
+        self._ensure_executor()
+        self._calls += 1
+        if self._calls >= self.recycle_after and self._recycling is None:
+            self._recycling = asyncio.create_task(self._recycle())
+        executor = self._executor
+
+        try:
+            # Worker start-up is not charged against the per-call timeout
+            await asyncio.shield(self._warmup)
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, ytdl_worker.extract, profile, query, overrides),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("yt-dlp extraction timed out after %ss for '%s', replacing worker pool", self.timeout, query)
+            if executor is self._executor:
+                self._retire(kill_after=self.timeout)
+            raise
+        except BrokenProcessPool:
+            logger.error("yt-dlp extraction pool broke (worker crashed), starting a new one")
+            if executor is self._executor:
+                self._retire()
+            raise
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+EXTRACTION_POOL = ExtractionPool(YTDL_WORKERS, YTDL_TIMEOUT, YTDL_RECYCLE_AFTER)
+
+
+def format_duration(duration):
+    """Format a duration in seconds as the ' (m:ss)' suffix used in messages"""
+    if not duration:
+        return ""
+    minutes, seconds = divmod(int(duration), 60)
+    return f" ({minutes}:{seconds:02d})"
+
+
+class Track:
+    """Queue entry for one song. Slotted to keep long queues small; artist and artwork
+    strings are interned so that e.g. every track of an album shares one copy.
+    """
+
+    __slots__ = (
+        "title", "duration", "video_id", "_webpage_url", "query", "artist", "artwork_url",
+        "is_spotify", "spotify_id", "audio_url", "audio_codec", "audio_rate", "resolved_at",
+    )
+
+    def __init__(self, title, duration=None, video_id=None, webpage_url=None, query=None,
+                 artist=None, artwork_url=None, is_spotify=False, spotify_id=None):
+        self.title = title
+        self.duration = duration or 0
+        self.video_id = video_id
+        self._webpage_url = webpage_url
+        self.query = query
+        self.artist = sys.intern(artist) if artist else None
+        self.artwork_url = sys.intern(artwork_url) if artwork_url else None
+        self.is_spotify = is_spotify
+        self.spotify_id = spotify_id
+        self.audio_url = None
+        self.audio_codec = None
+        self.audio_rate = None
+        self.resolved_at = None
+
+    @property
+    def webpage_url(self):
+        if self._webpage_url:
+            return self._webpage_url
+        return f"https://www.youtube.com/watch?v={self.video_id}" if self.video_id else None
+
+    @webpage_url.setter
+    def webpage_url(self, value):
+        self._webpage_url = value
+
+    @property
+    def duration_str(self):
+        return format_duration(self.duration)
+
+    def to_record(self):
+        """Compact JSON-serializable form; stream URLs are left out since they expire"""
+        return [self.title, self.duration, self.video_id, self._webpage_url, self.query,
+                self.artist, self.artwork_url, self.is_spotify, self.spotify_id]
+
+    @classmethod
+    def from_record(cls, record):
+        title, duration, video_id, webpage_url, query, artist, artwork_url, is_spotify, spotify_id = record
+        return cls(title, duration=duration, video_id=video_id, webpage_url=webpage_url, query=query,
+                   artist=artist, artwork_url=artwork_url, is_spotify=is_spotify, spotify_id=spotify_id)
+
+
+class PackedTrackStore:
+    """Columnar storage for the packed entries of one queue.
+
+    Text fields share one UTF-8 buffer with per-entry offsets and field lengths, artist
+    and artwork are indexes into a table of distinct values, and durations and flags
+    are typed arrays, which takes well under half the memory of the Track objects.
+    Entries are appended and referred to by number; the store is rebuilt by the queue
+    once most of it is no longer referenced. Resolved stream URLs are not kept.
+    """
+
+    TEXT_FIELDS = ("title", "video_id", "_webpage_url", "query", "spotify_id")
+
+    def __init__(self):
+        self._text = bytearray()
+        self._starts = array("I", [0])
+        self._lengths = array("I")
+        self._values = [None]
+        self._value_indexes = {None: 0}
+        self._artists = array("I")
+        self._artworks = array("I")
+        self._durations = array("d")
+        self._flags = bytearray()
+
+    def __len__(self):
+        return len(self._durations)
+
+    def _value_index(self, value):
+        index = self._value_indexes.get(value)
+        if index is None:
+            index = self._value_indexes[value] = len(self._values)
+            self._values.append(value)
+        return index
+
+    def add(self, track):
+        """Store `track`, returning its entry number"""
+        for field in self.TEXT_FIELDS:
+            data = (getattr(track, field) or "").encode("utf-8", "surrogatepass")
+            self._text += data
+            self._lengths.append(len(data))
+        self._starts.append(len(self._text))
+        self._artists.append(self._value_index(track.artist))
+        self._artworks.append(self._value_index(track.artwork_url))
+        self._durations.append(track.duration or 0)
+        self._flags.append(bool(track.is_spotify))
+        return len(self._durations) - 1
+
+    def copy(self, source, entry):
+        """Copy entry number `entry` of another store without decoding it, returning its new number"""
+        fields = len(self.TEXT_FIELDS)
+        self._text += source._text[source._starts[entry]:source._starts[entry + 1]]
+        self._starts.append(len(self._text))
+        self._lengths += source._lengths[entry * fields:(entry + 1) * fields]
+        self._artists.append(self._value_index(source._values[source._artists[entry]]))
+        self._artworks.append(self._value_index(source._values[source._artworks[entry]]))
+        self._durations.append(source._durations[entry])
+        self._flags.append(source._flags[entry])
+        return len(self._durations) - 1
+
+    def get(self, entry):
+        """Decode entry number `entry` into a new Track"""
+        fields = []
+        start = self._starts[entry]
+        for length in self._lengths[entry * len(self.TEXT_FIELDS):(entry + 1) * len(self.TEXT_FIELDS)]:
+            fields.append(self._text[start:start + length].decode("utf-8", "surrogatepass") or None)
+            start += length
+        title, video_id, webpage_url, query, spotify_id = fields
+        duration = self._durations[entry]
+        return Track(title, duration=int(duration) if duration.is_integer() else duration, video_id=video_id,
+                     webpage_url=webpage_url, query=query, artist=self._values[self._artists[entry]],
+                     artwork_url=self._values[self._artworks[entry]], is_spotify=bool(self._flags[entry]),
+                     spotify_id=spotify_id)
+
+
+class PackedTracks:
+    """Read-only queue chunk of entry numbers in a PackedTrackStore; entries are decoded on access"""
+
+    __slots__ = ("store", "entries")
+
+    def __init__(self, store, entries):
+        self.store = store
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store.get(entry) for entry in self.entries[index]]
+        return self.store.get(self.entries[index])
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield self.store.get(entry)
+
+    def unpack(self):
+        return list(self)
+
+
+def create_song_metadata(title, duration=None, video_id=None, webpage_url=None, query=None, spotify_metadata=None):
+    """Build a queue entry. Only an identifier is stored; the stream URL is resolved near the playhead."""
+    # A Spotify listing entry becomes the queue entry itself, keeping its title, artist and artwork
+    if spotify_metadata:
+        spotify_metadata.video_id = video_id
+        spotify_metadata.webpage_url = webpage_url
+        spotify_metadata.duration = duration or 0
+        if query:
+            spotify_metadata.query = query
+        return spotify_metadata
+
+    return Track(title, duration=duration, video_id=video_id, webpage_url=webpage_url, query=query)
+
+
+def stream_url_is_fresh(song_metadata):
+    """Check whether a queue entry has a stream URL that will outlive the track"""
+    audio_url = song_metadata.audio_url
+    if not audio_url:
+        return False
+
+    # googlevideo URLs carry their expiry as a unix timestamp
+    expire = parse_qs(urlparse(audio_url).query).get("expire")
+    if expire and expire[0].isdigit():
+        return int(expire[0]) - time.time() > max(60, song_metadata.duration or 0)
+
+    return time.time() - (song_metadata.resolved_at or 0) < STREAM_URL_MAX_AGE
+
+
+async def resolve_stream_url(song_metadata):
+    """Resolve (or refresh) the stream URL of a queue entry. Returns True on success."""
+    if song_metadata.webpage_url:
+        target = song_metadata.webpage_url
+    else:
+        target = "ytsearch1:" + song_metadata.query
+
+    attempts = [
+        ("primary", "stream"),
+        ("fallback", "stream_fallback"),
+        ("simple", "stream_simple"),
+    ]
+
+    for attempt_name, profile in attempts:
+        try:
+            info = await search_ytdlp_async(target, profile)
+        except Exception as e:
+            logger.warning("Stream resolution (%s) failed for '%s': %s", attempt_name, song_metadata.title, e)
+            continue
+
+        if info and "entries" in info:
+            entries = [entry for entry in info["entries"] if entry]
+            info = entries[0] if entries else None
+
+        if info and info.get("url"):
+            song_metadata.audio_url = info["url"]
+            song_metadata.audio_codec = info.get("acodec")
+            song_metadata.audio_rate = info.get("asr")
+            song_metadata.resolved_at = time.time()
+            if not song_metadata.video_id and info.get("id"):
+                song_metadata.video_id = info["id"]
+                song_metadata.webpage_url = info.get("webpage_url") or f"https://www.youtube.com/watch?v={info['id']}"
+            if not song_metadata.duration and info.get("duration"):
+                song_metadata.duration = info["duration"]
+            logger.debug("Resolved stream URL for '%s' using %s options", song_metadata.title, attempt_name)
+            trace_event("stream_resolved", option_set=attempt_name)
+            return True
+
+    logger.error("All stream resolution attempts failed for '%s'", song_metadata.title)
+    return False
+
+
+def schedule_prefetch(guild_id):
+    """Start the stream URL prefetch for a guild unless one is already running"""
+    task = GUILD_PREFETCH_TASKS.get(guild_id)
+    if task is None or task.done():
+        GUILD_PREFETCH_TASKS[guild_id] = asyncio.create_task(prefetch_upcoming(guild_id))
+
+
+async def prefetch_upcoming(guild_id):
+    """Resolve stream URLs for the next PREFETCH_WINDOW tracks so track changes are near-instant"""
+    # Started from a /play request, but not part of its trace
+    CURRENT_TRACE.set(None)
+    attempted = set()
+    while True:
+        upcoming = list(islice(SONG_QUEUES.get(guild_id) or (), PREFETCH_WINDOW))
+        eq_preset = GUILD_EQ_SETTINGS.get(guild_id, "enhanced")
+        pending = [
+            song for song in upcoming
+            if id(song) not in attempted
+            and not stream_url_is_fresh(song)
+            and not OPUS_CACHE.contains(song.video_id, eq_preset)
+        ]
+        if not pending:
+            return
+
+        # Re-read the window after every resolution since the queue may have changed meanwhile
+        song_metadata = pending[0]
+        attempted.add(id(song_metadata))
+        try:
+            if await resolve_stream_url(song_metadata) and not await LOUDNESS_STORE.get(song_metadata.video_id):
+                schedule_loudness_analysis(song_metadata)
+        except Exception as e:
+            logger.warning("Prefetch failed for '%s' in guild %s: %s", song_metadata.title, guild_id, e)
+
+
+class ResolutionCache:
+    """On-disk cache mapping normalized queries and Spotify track ids to YouTube videos.
+
+    Entries expire after `ttl` seconds and the least recently used entries are
+    evicted once the cache grows past `max_entries`. SQLite work runs in the
+    default executor so lookups never block the event loop.
+    """
+
+    # Evict at most every this many writes instead of counting rows on each one
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, path, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            "key TEXT PRIMARY KEY, video_id TEXT NOT NULL, title TEXT, duration INTEGER, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS resolutions_accessed ON resolutions (accessed_at)")
+        self._conn.commit()
+
+    def _get(self, keys):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT video_id, title, duration, created_at FROM resolutions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                if now - row[3] > self.ttl:
+                    self._conn.execute("DELETE FROM resolutions WHERE key = ?", (key,))
+                    continue
+                self._conn.execute("UPDATE resolutions SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                return {"video_id": row[0], "title": row[1], "duration": row[2]}
+            self._conn.commit()
+        return None
+
+    def _put(self, keys, video_id, title, duration):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO resolutions (key, video_id, title, duration, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, video_id, title, duration, now, now) for key in keys]
+            )
+            self._writes += 1
+            if self._writes % self.EVICTION_INTERVAL == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM resolutions").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM resolutions WHERE key IN "
+                "(SELECT key FROM resolutions ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            logger.info("Evicted %s entries from the resolution cache", count - self.max_entries)
+
+    def _count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM resolutions").fetchone()[0]
+
+    async def get(self, keys):
+        """Return the cached video for the first matching key, or None"""
+        if not keys:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(None, self._get, keys)
+        except sqlite3.Error as e:
+            logger.warning("Resolution cache lookup failed: %s", e)
+            result = None
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    async def put(self, keys, video_id, title, duration):
+        """Store a resolved video under every given key"""
+        if not keys:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._put, keys, video_id, title, duration)
+        except sqlite3.Error as e:
+            logger.warning("Resolution cache write failed: %s", e)
+
+    async def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        loop = asyncio.get_running_loop()
+        entries = await loop.run_in_executor(None, self._count)
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+def normalize_query(query):
+    """Normalize a search query so trivially different spellings share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+def resolution_cache_keys(song_query, is_url=False, spotify_metadata=None):
+    """Cache keys for a lookup, most specific first"""
+    keys = []
+    if spotify_metadata and spotify_metadata.spotify_id:
+        keys.append(f"spotify:{spotify_metadata.spotify_id}")
+    if not is_url:
+        keys.append(f"query:{normalize_query(song_query)}")
+    return keys
+
+
+class MemoryResolutionCache:
+    """In-process stand-in for ResolutionCache (same interface), with TTL and LRU eviction"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    async def get(self, keys):
+        """Return the cached video for the first matching key, or None"""
+        if not keys:
+            return None
+        now = time.time()
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if now - entry[0] > self.ttl:
+                del self._entries[key]
+                continue
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+        self.misses += 1
+        return None
+
+    async def put(self, keys, video_id, title, duration):
+        """Store a resolved video under every given key"""
+        for key in keys or ():
+            self._entries[key] = (time.time(), {"video_id": video_id, "title": title, "duration": duration})
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class RedisResolutionCache:
+    """ResolutionCache backed by Redis so every bot process shares one warm cache.
+
+    Entries expire after `ttl` seconds (a hit renews the lifetime); eviction
+    beyond that is left to the server's maxmemory policy.
+    """
+
+    def __init__(self, client, prefix, ttl):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, keys):
+        """Return the cached video for the first matching key, or None"""
+        if not keys:
+            return None
+        redis_keys = [f"{self.prefix}resolve:{key}" for key in keys]
+        result = None
+        try:
+            for redis_key, value in zip(redis_keys, await self.client.mget(redis_keys)):
+                if value:
+                    await self.client.expire(redis_key, self.ttl)
+                    result = json.loads(value)
+                    break
+        except redis.RedisError as e:
+            logger.warning("Resolution cache lookup failed: %s", e)
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    async def put(self, keys, video_id, title, duration):
+        """Store a resolved video under every given key"""
+        if not keys:
+            return
+        value = json.dumps({"video_id": video_id, "title": title, "duration": duration})
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(f"{self.prefix}resolve:{key}", value, ex=self.ttl)
+        try:
+            await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Resolution cache write failed: %s", e)
+
+    async def stats(self):
+        # Counting shared keys would need a full keyspace scan
+        return {"hits": self.hits, "misses": self.misses, "entries": None}
+
+
+if STATE_BACKEND == "redis":
+    RESOLUTION_CACHE = RedisResolutionCache(REDIS_CLIENT, REDIS_KEY_PREFIX, RESOLUTION_CACHE_TTL)
+elif STATE_BACKEND == "memory":
+    RESOLUTION_CACHE = MemoryResolutionCache(RESOLUTION_CACHE_TTL, RESOLUTION_CACHE_MAX_ENTRIES)
+else:
+    RESOLUTION_CACHE = ResolutionCache(RESOLUTION_CACHE_PATH, RESOLUTION_CACHE_TTL, RESOLUTION_CACHE_MAX_ENTRIES)
+
+
+class LoudnessStore:
+    """Persistent per-video loudness measurements (integrated loudness, true peak, range)"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS loudness ("
+            "video_id TEXT PRIMARY KEY, input_i REAL NOT NULL, input_tp REAL NOT NULL, "
+            "input_lra REAL, input_thresh REAL, measured_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT input_i, input_tp, input_lra, input_thresh FROM loudness WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"input_i": row[0], "input_tp": row[1], "input_lra": row[2], "input_thresh": row[3]}
+
+    def _put(self, video_id, measurement):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO loudness (video_id, input_i, input_tp, input_lra, input_thresh, measured_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, measurement["input_i"], measurement["input_tp"],
+                 measurement.get("input_lra"), measurement.get("input_thresh"), time.time())
+            )
+            self._conn.commit()
+
+    async def get(self, video_id):
+        """Return the stored measurement for a video, or None if it has not been analysed"""
+        if not video_id:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._get, video_id)
+        except sqlite3.Error as e:
+            logger.warning("Loudness lookup failed for %s: %s", video_id, e)
+            return None
+
+    async def put(self, video_id, measurement):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._put, video_id, measurement)
+        except sqlite3.Error as e:
+            logger.warning("Storing loudness for %s failed: %s", video_id, e)
+
+
+LOUDNESS_STORE = LoudnessStore(LOUDNESS_DB_PATH)
+
+
+def encode_queue(tracks):
+    """Serialize queue entries as compact JSON (stream URLs are left out since they expire)"""
+    return json.dumps([track.to_record() for track in tracks], separators=(",", ":"))
+
+
+class MemoryGuildStateBackend:
+    """In-process guild state backend, for tests and single-run setups.
+
+    Defines the backend interface: `load()` returns {guild_id: (state, queue
+    records)} and `write(states, queues, deleted)` applies one batch of changes.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._queues = {}
+
+    async def load(self):
+        return {
+            guild_id: (dict(self._states.get(guild_id) or {}), json.loads(self._queues.get(guild_id, "[]")))
+            for guild_id in set(self._states) | set(self._queues)
+        }
+
+    async def write(self, states, queues, deleted):
+        self._states.update((guild_id, dict(state)) for guild_id, state in states.items())
+        self._queues.update((guild_id, encode_queue(tracks)) for guild_id, tracks in queues.items())
+        for guild_id in deleted:
+            self._states.pop(guild_id, None)
+            self._queues.pop(guild_id, None)
+
+
+class SQLiteGuildStateBackend:
+    """Guild state in a local SQLite database; each batch is one transaction in the default executor"""
+
+    STATE_COLUMNS = ("eq_preset", "voice_channel_id", "text_channel_id", "current_track", "position", "now_playing_message_id", "pending_playlist")
+    # Columns stored as JSON text
+    JSON_COLUMNS = ("current_track", "pending_playlist")
+    # Columns added after the table was first created, with their types
+    ADDED_COLUMNS = {"now_playing_message_id": "INTEGER", "pending_playlist": "TEXT"}
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS guild_state ("
+            "guild_id TEXT PRIMARY KEY, eq_preset TEXT, voice_channel_id INTEGER, text_channel_id INTEGER, "
+            "current_track TEXT, position REAL, now_playing_message_id INTEGER, pending_playlist TEXT, "
+            "updated_at REAL NOT NULL)"
+        )
+        # Databases created by older versions lack the columns added since
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(guild_state)")}
+        for column, column_type in self.ADDED_COLUMNS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE guild_state ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS guild_queues (guild_id TEXT PRIMARY KEY, tracks TEXT NOT NULL)")
+        self._conn.commit()
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT guild_id, {', '.join(self.STATE_COLUMNS)} FROM guild_state").fetchall()
+            queues = dict(self._conn.execute("SELECT guild_id, tracks FROM guild_queues").fetchall())
+        states = {}
+        for guild_id, *values in rows:
+            state = dict(zip(self.STATE_COLUMNS, values))
+            for column in self.JSON_COLUMNS:
+                state[column] = json.loads(state[column]) if state[column] else None
+            states[guild_id] = (state, json.loads(queues.pop(guild_id, "[]")))
+        for guild_id, tracks in queues.items():
+            states[guild_id] = ({}, json.loads(tracks))
+        return states
+
+    def _write(self, states, queues, deleted):
+        now = time.time()
+        rows = []
+        for guild_id, state in states.items():
+            values = [
+                (json.dumps(state[column]) if state.get(column) else None) if column in self.JSON_COLUMNS else state.get(column)
+                for column in self.STATE_COLUMNS
+            ]
+            rows.append((guild_id, *values, now))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO guild_state (guild_id, {', '.join(self.STATE_COLUMNS)}, updated_at) "
+                f"VALUES ({', '.join('?' * (len(self.STATE_COLUMNS) + 2))})",
+                rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO guild_queues (guild_id, tracks) VALUES (?, ?)",
+                [(guild_id, encode_queue(tracks)) for guild_id, tracks in queues.items()]
+            )
+            self._conn.executemany("DELETE FROM guild_state WHERE guild_id = ?", [(guild_id,) for guild_id in deleted])
+            self._conn.executemany("DELETE FROM guild_queues WHERE guild_id = ?", [(guild_id,) for guild_id in deleted])
+            self._conn.commit()
+
+    async def load(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self._load)
+
+    async def write(self, states, queues, deleted):
+        await asyncio.get_running_loop().run_in_executor(None, self._write, states, queues, deleted)
+
+
+class RedisGuildStateBackend:
+    """Guild state in Redis, shared by every bot process; each batch is one pipelined round trip.
+
+    Keys: `<prefix>guilds` (set of guild ids), `<prefix>state:<guild>` and
+    `<prefix>queue:<guild>` (JSON strings).
+    """
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+
+    async def load(self):
+        guild_ids = [guild_id.decode() for guild_id in await self.client.smembers(f"{self.prefix}guilds")]
+        pipe = self.client.pipeline(transaction=False)
+        for guild_id in guild_ids:
+            pipe.get(f"{self.prefix}state:{guild_id}")
+            pipe.get(f"{self.prefix}queue:{guild_id}")
+        values = await pipe.execute()
+        states = {}
+        for index, guild_id in enumerate(guild_ids):
+            state, tracks = values[2 * index], values[2 * index + 1]
+            states[guild_id] = (json.loads(state) if state else {}, json.loads(tracks) if tracks else [])
+        return states
+
+    async def write(self, states, queues, deleted):
+        loop = asyncio.get_running_loop()
+        # Large queues are encoded off the event loop
+        encoded_queues = {
+            guild_id: await loop.run_in_executor(None, encode_queue, tracks) for guild_id, tracks in queues.items()
+        }
+        pipe = self.client.pipeline(transaction=False)
+        if states or encoded_queues:
+            pipe.sadd(f"{self.prefix}guilds", *set(states) | set(encoded_queues))
+        for guild_id, state in states.items():
+            pipe.set(f"{self.prefix}state:{guild_id}", json.dumps(state))
+        for guild_id, tracks in encoded_queues.items():
+            pipe.set(f"{self.prefix}queue:{guild_id}", tracks)
+        if deleted:
+            pipe.srem(f"{self.prefix}guilds", *deleted)
+            pipe.delete(*[f"{self.prefix}{kind}:{guild_id}" for guild_id in deleted for kind in ("state", "queue")])
+        await pipe.execute()
+
+
+class GuildStateStore:
+    """Persists each guild's queue, EQ preset and playing track (with position) across restarts.
+
+    Writes are batched behind the event loop: every `interval` seconds the
+    changed guilds are snapshotted and handed to the backend as one batch. A
+    queue is only rewritten when its version changed. Only guilds this process
+    restored or played are ever written, so processes sharing a backend leave
+    each other's guilds alone.
+    """
+
+    def __init__(self, backend, interval):
+        self.backend = backend
+        self.interval = interval
+        self.writes = 0
+        # Last written state and (queue, version) per guild
+        self._saved_states = {}
+        self._saved_queues = {}
+        self._task = None
+
+    async def load(self):
+        """Return the stored (state, queue records) of every guild"""
+        try:
+            return await self.backend.load()
+        except Exception as e:
+            logger.error("Failed to load guild state: %s", e)
+            return {}
+
+    def mark_saved(self, guild_id, state, queue=None):
+        """Record what the backend already holds for a restored guild"""
+        self._saved_states[guild_id] = state
+        if queue is not None:
+            self._saved_queues[guild_id] = (queue, queue.version)
+
+    def _snapshot_state(self, guild_id):
+        """The current state of a guild, or None if there is nothing worth keeping"""
+        current = CURRENT_SONG_INFO.get(guild_id) or {}
+        track = current.get("track")
+        guild = bot.get_guild(int(guild_id)) if guild_id.isdigit() else None
+        voice_client = guild.voice_client if guild else None
+        voice_channel_id = voice_client.channel.id if voice_client and voice_client.is_connected() else None
+        position = 0
+        if track and voice_client and voice_client.source is not None:
+            position = round(getattr(voice_client.source, "position", 0), 1)
+        eq_preset = GUILD_EQ_SETTINGS.get(guild_id)
+        pending_playlist = next(
+            (progress["resume"](progress["done"]) for progress in GUILD_INGESTIONS.get(guild_id, []) if progress.get("resume")),
+            None
+        )
+        if not (eq_preset or track or SONG_QUEUES.get(guild_id) or pending_playlist):
+            return None
+        message = GUILD_NOW_PLAYING_MESSAGES.get(guild_id)
+        return {
+            "eq_preset": eq_preset,
+            "voice_channel_id": voice_channel_id,
+            "text_channel_id": current.get("channel_id") or (message.channel.id if message else None),
+            "current_track": track.to_record() if track else None,
+            "position": position,
+            "now_playing_message_id": message.id if message else None,
+            "pending_playlist": pending_playlist,
+        }
+
+    async def flush(self):
+        """Write every guild whose state changed since the last flush"""
+        states, queues, deleted = {}, {}, []
+        for guild_id in set(SONG_QUEUES) | set(GUILD_EQ_SETTINGS) | set(CURRENT_SONG_INFO) | set(self._saved_states):
+            if guild_id in GUILD_RESUMES_PENDING:
+                continue
+            state = self._snapshot_state(guild_id)
+            if state is None:
+                if guild_id in self._saved_states:
+                    deleted.append(guild_id)
+                    del self._saved_states[guild_id]
+                    self._saved_queues.pop(guild_id, None)
+                continue
+            if self._saved_states.get(guild_id) != state:
+                states[guild_id] = self._saved_states[guild_id] = state
+            queue = SONG_QUEUES.get(guild_id)
+            version = queue.version if queue is not None else 0
+            saved_queue, saved_version = self._saved_queues.get(guild_id, (False, None))
+            if saved_queue is not queue or saved_version != version:
+                # Serialized off the event loop by the backend
+                queues[guild_id] = queue.snapshot() if queue is not None else []
+                self._saved_queues[guild_id] = (queue, version)
+
+        if not (states or queues or deleted):
+            return
+        try:
+            await self.backend.write(states, queues, deleted)
+            self.writes += 1
+        except Exception as e:
+            logger.warning("Writing guild state failed: %s", e)
+            # Retry these guilds on the next flush
+            for guild_id in states:
+                self._saved_states.pop(guild_id, None)
+            for guild_id in queues:
+                self._saved_queues.pop(guild_id, None)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Voice disconnects during shutdown must not overwrite the state we want to resume from
+            if bot.is_closed():
+                return
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Guild state flush failed: %s", e)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+
+if STATE_BACKEND == "redis":
+    GUILD_STATE_STORE = GuildStateStore(RedisGuildStateBackend(REDIS_CLIENT, REDIS_KEY_PREFIX), GUILD_STATE_FLUSH_INTERVAL)
+elif STATE_BACKEND == "memory":
+    GUILD_STATE_STORE = GuildStateStore(MemoryGuildStateBackend(), GUILD_STATE_FLUSH_INTERVAL)
+else:
+    GUILD_STATE_STORE = GuildStateStore(SQLiteGuildStateBackend(GUILD_STATE_DB_PATH), GUILD_STATE_FLUSH_INTERVAL)
+
+# Track and position (seconds) to continue from when a restored guild starts playing
+GUILD_RESUME_POSITIONS = {}
+GUILD_STATES_RESTORED = False
+# Restored guilds still reconnecting; their saved state is kept until playback has resumed
+GUILD_RESUMES_PENDING = set()
+
+# Video ids currently being analysed, and the limit on concurrent analyses (created on first use)
+LOUDNESS_ANALYSIS_IN_PROGRESS = set()
+LOUDNESS_ANALYSIS_SEMAPHORE = None
+
+
+class LoudnessAnalysisProcess:
+    """Supervisor handle for a loudness analysis ffmpeg, so it takes a slot, shows in /status
+    and is killed like a playback process once it stops making progress
+    """
+
+    def __init__(self):
+        # The supervisor skips handles whose process has not been spawned yet
+        self._process = None
+        self._reading_since = None
+
+    def attach(self, process):
+        self.pid = process.pid
+        self._subprocess = process
+        self._reading_since = time.monotonic()
+        # The supervisor polls and kills `_process`, which this handle implements for the asyncio subprocess
+        self._process = self
+
+    def progressed(self):
+        self._reading_since = time.monotonic()
+
+    def poll(self):
+        return self._subprocess.returncode
+
+    def kill(self):
+        if self._subprocess.returncode is None:
+            self._subprocess.kill()
+
+
+async def measure_loudness(audio_url):
+    """Run a loudnorm measurement pass over a stream and return its input statistics"""
+    await FFMPEG_SUPERVISOR.wait_for_capacity()
+    # Registered before spawning so concurrent analyses cannot all pass the capacity check
+    handle = LoudnessAnalysisProcess()
+    FFMPEG_SUPERVISOR.register(handle)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            get_ffmpeg_executable(), "-hide_banner", "-nostats", "-threads", "1",
+            "-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5",
+            "-i", audio_url, "-vn", "-af", f"{LIVE_LOUDNORM_FILTER}:print_format=json", "-f", "null",
+            "-progress", "pipe:1", "-",
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        handle.attach(process)
+        stderr_task = asyncio.create_task(process.stderr.read())
+        try:
+            # -progress reports the decoded position about twice a second; only a moving position counts
+            last_position = None
+            async for line in process.stdout:
+                if line.startswith(b"out_time_us=") and line != last_position:
+                    last_position = line
+                    handle.progressed()
+            stderr = await stderr_task
+            await process.wait()
+        except BaseException:
+            # Don't leave a full-track decode running if the analysis is cancelled
+            stderr_task.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+    finally:
+        FFMPEG_SUPERVISOR.unregister(handle)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+
+    # loudnorm prints its JSON summary as the last {...} block on stderr
+    output = stderr.decode("utf-8", errors="replace")
+    stats = json.loads(output[output.rindex("{"):output.rindex("}") + 1])
+    measurement = {
+        "input_i": float(stats["input_i"]),
+        "input_tp": float(stats["input_tp"]),
+        "input_lra": float(stats["input_lra"]),
+        "input_thresh": float(stats["input_thresh"]),
+    }
+    # Silence measures as -inf and cannot be normalized with a fixed gain
+    if not all(abs(value) != float("inf") for value in measurement.values()):
+        raise ValueError("track is silent or too short to measure")
+    return measurement
+
+
+async def analyze_loudness(song_metadata):
+    """Measure a track's loudness in the background and store it for future plays"""
+    global LOUDNESS_ANALYSIS_SEMAPHORE
+    if LOUDNESS_ANALYSIS_SEMAPHORE is None:
+        LOUDNESS_ANALYSIS_SEMAPHORE = asyncio.Semaphore(LOUDNESS_ANALYSIS_CONCURRENCY)
+
+    video_id = song_metadata.video_id
+    try:
+        async with LOUDNESS_ANALYSIS_SEMAPHORE:
+            if await LOUDNESS_STORE.get(video_id):
+                return
+            if not stream_url_is_fresh(song_metadata):
+                return
+            measurement = await measure_loudness(song_metadata.audio_url)
+        await LOUDNESS_STORE.put(video_id, measurement)
+        logger.info("Measured loudness for '%s': %.1f LUFS, %.1f dBTP", song_metadata.title, measurement['input_i'], measurement['input_tp'])
+    except Exception as e:
+        logger.warning("Loudness analysis failed for '%s': %s", song_metadata.title, e)
+    finally:
+        LOUDNESS_ANALYSIS_IN_PROGRESS.discard(video_id)
+
+
+def schedule_loudness_analysis(song_metadata):
+    """Queue a background loudness measurement for a resolved track that has none yet"""
+    video_id = song_metadata.video_id
+    if not LOUDNESS_ANALYSIS_ENABLED or not video_id or video_id in LOUDNESS_ANALYSIS_IN_PROGRESS:
+        return
+    if not stream_url_is_fresh(song_metadata):
+        return
+    LOUDNESS_ANALYSIS_IN_PROGRESS.add(video_id)
+    asyncio.create_task(analyze_loudness(song_metadata))
+
+
+class CachedOpusSource(discord.AudioSource):
+    """Plays Opus packets from an on-disk cache file through a memory map (no ffmpeg, no network)"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offset = len(OPUS_CACHE_MAGIC)
+
+    def read(self):
+        if self._map is None or self._offset + 2 > len(self._map):
+            return b''
+        (length,) = OPUS_PACKET_HEADER.unpack_from(self._map, self._offset)
+        start = self._offset + OPUS_PACKET_HEADER.size
+        self._offset = start + length
+        return self._map[start:self._offset]
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+
+class CachingOpusSource(discord.AudioSource):
+    """Passes Opus packets through, counting the play if the track is played to the end.
+
+    With `record`, the packets are also written to a temporary file that is committed
+    to the cache when the play is complete.
+    """
+
+    def __init__(self, original, cache, key, expected_duration, record=True):
+        self.original = original
+        self._cache = cache
+        self._key = key
+        self._expected_duration = expected_duration
+        self._packets = 0
+        self._finished = False
+        self._committed = False
+        self._tmp_path = None
+        self._file = None
+        if record:
+            self._tmp_path = cache.temp_path(key)
+            self._file = open(self._tmp_path, "wb")
+            self._file.write(OPUS_CACHE_MAGIC)
+
+    def read(self):
+        packet = self.original.read()
+        if packet:
+            if self._file is not None:
+                self._file.write(OPUS_PACKET_HEADER.pack(len(packet)))
+                self._file.write(packet)
+            self._packets += 1
+        else:
+            self._finished = True
+        return packet
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self.original.cleanup()
+        if self._committed:
+            return
+        self._committed = True
+        if self._file is not None:
+            self._file.close()
+        # Skipped, stopped, never played (discarded preloads) and truncated streams do not count (packets are 20 ms each)
+        complete = self._finished and self._packets * 0.02 >= self._expected_duration - 2
+        self._cache.commit(self._key, self._tmp_path, complete)
+
+
+def process_is_alive(pid):
+    """Whether a process with this id (a string, as found in file names) is running"""
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class OpusSegmentCache:
+    """Size-bounded disk cache of final encoded Opus output keyed by (video id, EQ preset).
+
+    Tracks are admitted once they have been played to the end `min_plays` times, and
+    the least recently used files are evicted when the total size exceeds `max_bytes`.
+    Recency is kept in the file modification times and the directory is rescanned
+    before evicting, so cluster workers sharing the directory share one size limit.
+    """
+
+    def __init__(self, directory, max_bytes, min_plays):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._play_counts = {}
+        self._recording = set()
+
+        if max_bytes <= 0:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            # Leftover from an interrupted recording (cluster workers share the directory)
+            if name.endswith(".tmp") and not process_is_alive(name.split(".")[-3]):
+                os.remove(os.path.join(directory, name))
+        self._load(self._scan())
+
+    def _scan(self):
+        """(modification time, key, size) of every cached file on disk, least recently used first"""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".opus"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another worker meanwhile
+                files.append((stat.st_mtime, entry.name[:-len(".opus")], stat.st_size))
+        files.sort()
+        return files
+
+    def _load(self, files):
+        self._entries = OrderedDict((key, size) for _, key, size in files)
+        self._total_bytes = sum(size for _, _, size in files)
+
+    @staticmethod
+    def make_key(video_id, eq_preset):
+        return f"{video_id}.{eq_preset}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.opus")
+
+    def temp_path(self, key):
+        return os.path.join(self.directory, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def contains(self, video_id, eq_preset):
+        return bool(video_id) and self.make_key(video_id, eq_preset) in self._entries
+
+    def open(self, video_id, eq_preset):
+        """Return a source for a cached track (marking it recently used), or None on a miss"""
+        if self.max_bytes <= 0 or not video_id:
+            return None
+        key = self.make_key(video_id, eq_preset)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))  # Persist recency across restarts and cluster workers
+            source = CachedOpusSource(self._path(key))
+        except FileNotFoundError:
+            # Evicted by another cluster worker sharing the directory
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Dropping unreadable Opus cache entry %s: %s", key, e)
+            self._remove(key)
+            return None
+        with self._lock:
+            self.hits += 1
+        return source
+
+    def wrap_for_recording(self, source, song_metadata, eq_preset):
+        """Count the play of a track, recording it if this play makes it hot enough to cache.
+
+        Returns the source unchanged for tracks that cannot be cached.
+        """
+        video_id = song_metadata.video_id
+        # Without a known length a truncated stream cannot be told apart from a complete one
+        if self.max_bytes <= 0 or not video_id or not song_metadata.duration:
+            return source
+        key = self.make_key(video_id, eq_preset)
+        with self._lock:
+            if key in self._entries:
+                return source
+            record = self._play_counts.get(key, 0) + 1 >= self.min_plays and key not in self._recording
+            if record:
+                self._recording.add(key)
+        try:
+            return CachingOpusSource(source, self, key, song_metadata.duration, record)
+        except OSError as e:
+            logger.warning("Cannot record '%s' to the Opus cache: %s", song_metadata.title, e)
+            with self._lock:
+                self._recording.discard(key)
+            return CachingOpusSource(source, self, key, song_metadata.duration, record=False)
+
+    def commit(self, key, tmp_path, complete):
+        """Called from the audio thread when a play ends; `tmp_path` is the recording, if any"""
+        with self._lock:
+            if tmp_path is not None:
+                self._recording.discard(key)
+            if complete:
+                self._play_counts[key] = self._play_counts.get(key, 0) + 1
+        if tmp_path is None:
+            return
+        try:
+            if not complete:
+                os.remove(tmp_path)
+                return
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self._path(key))
+            # Other cluster workers add and evict files too, so the limit is checked against the disk
+            files = self._scan()
+        except OSError as e:
+            logger.warning("Failed to store %s in the Opus cache: %s", key, e)
+            return
+        with self._lock:
+            self._load(files)
+            if key not in self._entries:
+                self._entries[key] = size
+                self._total_bytes += size
+            self._entries.move_to_end(key)
+            self._play_counts.pop(key, None)
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass  # Still mapped by a player on some platforms; the next scan cleans it up
+        logger.info("Cached Opus output for %s (%.1f MiB), evicted %s entries", key, size / 1048576, len(evicted))
+
+    def _remove(self, key):
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._total_bytes}
+
+
+OPUS_CACHE = OpusSegmentCache(OPUS_CACHE_DIR, OPUS_CACHE_MAX_BYTES, OPUS_CACHE_MIN_PLAYS)
+
+
+PROC_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PROC_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def read_process_usage(pid):
+    """Return (CPU seconds, resident bytes) of a process from /proc, or None where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as stat_file:
+            # Fields after the parenthesised command name; utime and stime are the 12th and 13th
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / PROC_CLOCK_TICKS, resident_pages * PROC_PAGE_SIZE
+
+
+class FFmpegSupervisor:
+    """Owns every ffmpeg process: caps how many run at once, accounts their
+    CPU and memory from /proc, and kills processes that stop producing output.
+    """
+
+    def __init__(self, max_processes, stall_timeout, interval):
+        self.max_processes = max_processes
+        self.stall_timeout = stall_timeout
+        self.interval = interval
+        self.spawned = 0
+        self.killed = 0
+        self.cpu_percent = 0.0
+        self.rss_bytes = 0
+        self._sources = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._cpu_samples = {}  # pid -> (CPU seconds, monotonic time) at the previous check
+        self._loop = None
+        self._task = None
+
+    def running(self):
+        with self._lock:
+            return len(self._sources)
+
+    async def wait_for_capacity(self):
+        """Wait until another ffmpeg process may be started"""
+        self._loop = asyncio.get_running_loop()
+        while self.max_processes > 0 and self.running() >= self.max_processes:
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                self._waiters.remove(waiter)
+
+    def register(self, source):
+        with self._lock:
+            self._sources.add(source)
+            self.spawned += 1
+
+    def unregister(self, source):
+        """Release a process slot; may be called from the audio thread"""
+        with self._lock:
+            if source not in self._sources:
+                return
+            self._sources.discard(source)
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake_waiters)
+
+    def _wake_waiters(self):
+        # Every waiter re-checks the count, so waking all of them is safe
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._monitor())
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning("ffmpeg supervisor check failed: %s", e)
+
+    def check(self):
+        """Reap exited processes, kill stalled ones and refresh the resource totals"""
+        with self._lock:
+            sources = list(self._sources)
+
+        now = time.monotonic()
+        cpu_percent = 0.0
+        rss_bytes = 0
+        samples = {}
+        for source in sources:
+            process = source._process
+            if not process:
+                continue
+            # poll() also reaps a process that exited on its own so it cannot linger as a zombie
+            if process.poll() is not None:
+                self.unregister(source)
+                continue
+
+            reading_since = source._reading_since
+            if reading_since is not None and now - reading_since > self.stall_timeout:
+                logger.warning("Killing ffmpeg process %s: no output for %.0fs", process.pid, now - reading_since)
+                process.kill()
+                self.killed += 1
+                continue
+
+            usage = read_process_usage(process.pid)
+            if usage is None:
+                continue
+            cpu_seconds, rss = usage
+            rss_bytes += rss
+            samples[process.pid] = (cpu_seconds, now)
+            previous = self._cpu_samples.get(process.pid)
+            if previous and now > previous[1]:
+                cpu_percent += 100 * (cpu_seconds - previous[0]) / (now - previous[1])
+
+        self._cpu_samples = samples
+        self.cpu_percent = cpu_percent
+        self.rss_bytes = rss_bytes
+
+    def stats(self):
+        return {
+            "running": self.running(),
+            "queued": len(self._waiters),
+            "spawned": self.spawned,
+            "killed": self.killed,
+            "cpu_percent": self.cpu_percent,
+            "rss_bytes": self.rss_bytes,
+        }
+
+
+FFMPEG_SUPERVISOR = FFmpegSupervisor(FFMPEG_MAX_PROCESSES, FFMPEG_STALL_TIMEOUT, FFMPEG_MONITOR_INTERVAL)
+
+
+class SupervisedFFmpegMixin:
+    """Registers an ffmpeg audio source with the supervisor and marks reads that are waiting on ffmpeg"""
+
+    def __init__(self, *args, **kwargs):
+        self._reading_since = None
+        super().__init__(*args, **kwargs)
+        FFMPEG_SUPERVISOR.register(self)
+
+    def read(self):
+        self._reading_since = time.monotonic()
+        try:
+            return super().read()
+        finally:
+            self._reading_since = None
+
+    def cleanup(self):
+        FFMPEG_SUPERVISOR.unregister(self)
+        super().cleanup()
+
+
+class SupervisedFFmpegOpusAudio(SupervisedFFmpegMixin, discord.FFmpegOpusAudio):
+    pass
+
+
+class SupervisedFFmpegPCMAudio(SupervisedFFmpegMixin, discord.FFmpegPCMAudio):
+    pass
+
+
+class TrackSource(discord.AudioSource):
+    """Wraps a track's audio source to track the playback position and allow priming before playback.
+
+    `near_end_callback` is called once (from the audio thread) when playback gets
+    within GAPLESS_PRELOAD_SECONDS of the track's expected end.
+    """
+
+    def __init__(self, original, duration=None, start_seconds=0):
+        self.original = original
+        self.duration = duration or 0
+        self.near_end_callback = None
+        # perf_counter() time playback of this track was requested, for the time-to-first-audio metric
+        self.play_requested_at = None
+        # /play trace waiting for this source's first read
+        self._trace = None
+        self._trace_started = None
+        self._frames = int(start_seconds / 0.02)
+        self._primed = None
+
+    @property
+    def position(self):
+        """Seconds of audio handed to the voice connection so far (frames are 20 ms)"""
+        return self._frames * 0.02
+
+    def prime(self):
+        """Blocking: read the first frame ahead of playback so process spawn, connect and filter start-up are done"""
+        if self._primed is None:
+            self._primed = self.original.read()
+
+    def read(self):
+        primed = self._primed is not None
+        if primed:
+            data, self._primed = self._primed, None
+        else:
+            data = self.original.read()
+        if self.play_requested_at is not None:
+            FIRST_AUDIO_SECONDS.observe(time.perf_counter() - self.play_requested_at)
+            self.play_requested_at = None
+        if self._trace is not None:
+            trace, self._trace = self._trace, None
+            trace.add_span("first_read", self._trace_started, time.perf_counter() - self._trace_started, primed=primed)
+            trace.release()
+        if data:
+            self._frames += 1
+            if self.near_end_callback and self.duration and self.position >= self.duration - GAPLESS_PRELOAD_SECONDS:
+                callback, self.near_end_callback = self.near_end_callback, None
+                callback()
+        return data
+
+    def is_opus(self):
+        return self.original.is_opus()
+
+    def attach_trace(self, trace):
+        """Make a /play trace wait for (and record) the first read of this source"""
+        if trace is not None:
+            trace.hold()
+            self._trace, self._trace_started = trace, time.perf_counter()
+
+    def cleanup(self):
+        if self._trace is not None:
+            # Playback ended before the first read
+            trace, self._trace = self._trace, None
+            trace.release()
+        self.original.cleanup()
+
+
+def peaking_biquad(frequency, width, gain, sample_rate=48000):
+    """Peaking EQ biquad coefficients (b, a) with a0 = 1, matching ffmpeg's equalizer with width_type=h"""
+    w0 = 2 * np.pi * frequency / sample_rate
+    alpha = np.sin(w0) / (2 * frequency / width)
+    amplitude = 10 ** (gain / 40)
+    a0 = 1 + alpha / amplitude
+    b = np.array([1 + alpha * amplitude, -2 * np.cos(w0), 1 - alpha * amplitude]) / a0
+    a = np.array([1.0, -2 * np.cos(w0) / a0, (1 - alpha / amplitude) / a0])
+    return b, a
+
+
+def build_eq_block_filter(bands, block_size=DSP_BLOCK_SIZE):
+    """Precompute block state-space matrices for a preset's cascade of peaking biquads.
+
+    For an input block x (block_size x channels) and filter state s, the output is
+    y = T @ x + O @ s and the next state is AL @ s + G @ x, so every block is
+    filtered with a few matrix products instead of a per-sample loop.
+    """
+    if not bands:
+        return None
+
+    # Series connection of one controllable-canonical-form section per band
+    A, B, C, D = np.zeros((0, 0)), np.zeros((0, 1)), np.zeros((1, 0)), np.ones((1, 1))
+    for frequency, width, gain in bands:
+        b, a = peaking_biquad(frequency, width, gain)
+        section_A = np.array([[-a[1], -a[2]], [1.0, 0.0]])
+        section_B = np.array([[1.0], [0.0]])
+        section_C = np.array([[b[1] - b[0] * a[1], b[2] - b[0] * a[2]]])
+        order = A.shape[0]
+        A = np.block([[A, np.zeros((order, 2))], [section_B @ C, section_A]])
+        B = np.vstack([B, section_B @ D])
+        C = np.hstack([b[0] * C, section_C])
+        D = b[0] * D
+
+    powers = [np.eye(A.shape[0])]
+    for _ in range(block_size):
+        powers.append(A @ powers[-1])
+    impulse = [D.item()] + [(C @ powers[n - 1] @ B).item() for n in range(1, block_size)]
+    T = np.zeros((block_size, block_size))
+    for n in range(block_size):
+        T[n, :n + 1] = impulse[n::-1]
+    return {
+        "T": T,
+        "O": np.vstack([C @ powers[n] for n in range(block_size)]),
+        "G": np.hstack([powers[block_size - 1 - k] @ B for k in range(block_size)]),
+        "AL": powers[block_size],
+    }
+
+
+# Precomputed DSP equalizer matrices per preset (None for presets without bands)
+DSP_EQ_FILTERS = {
+    name: build_eq_block_filter(preset["bands"]) for name, preset in AUDIO_PRESETS.items()
+} if EQ_ENGINE == "dsp" else {}
+
+
+class DSPEqualizerSource(discord.AudioSource):
+    """Applies a preset's EQ to 16-bit stereo PCM frames in-process; the preset can change mid-track.
+
+    Boosted peaks are held at the true peak target by a limiter that looks one frame
+    ahead, so the output runs one frame behind the input. discord.py encodes the PCM
+    output itself; set `encoder` to the voice client's Opus encoder to have preset
+    changes also switch its bitrate.
+    """
+
+    def __init__(self, original, eq_preset):
+        self.original = original
+        self.eq_preset = eq_preset
+        self.encoder = None
+        self._filter = DSP_EQ_FILTERS.get(eq_preset)
+        self._state = None
+        self._pending_preset = None
+        # Limiter: the frame waiting for the next one, its gain target and the current gain
+        self._held = None
+        self._held_target = 1.0
+        self._gain = 1.0
+
+    def set_preset(self, eq_preset):
+        """Switch presets from any thread; takes effect at the next frame"""
+        self._pending_preset = eq_preset
+
+    def read(self):
+        data = self.original.read()
+        previous_filter = self._filter
+        switched = self._pending_preset is not None
+        if switched:
+            self.eq_preset, self._pending_preset = self._pending_preset, None
+            self._filter = DSP_EQ_FILTERS.get(self.eq_preset)
+            if self.encoder is not None:
+                # On the audio thread, between two encodes
+                self.encoder.set_bitrate(preset_bitrate_kbps(self.eq_preset))
+        if not data:
+            if self._held is None:
+                return data
+            # End of the track: nothing left to look ahead to
+            held, self._held = self._held, None
+            return self._release(held, self._held_target, self._held_target)
+        if self._filter is None and self._held is None and not switched:
+            # Flat preset from the start: ffmpeg has already limited the input
+            return data
+
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float64).reshape(-1, 2)
+        output, state = self._apply(self._filter, samples, self._state)
+        if switched:
+            # The new filter continues from the old state; fading over the frame hides the change
+            previous_output, _ = self._apply(previous_filter, samples, self._state)
+            fade = np.linspace(0.0, 1.0, len(samples))[:, None]
+            output = previous_output + fade * (output - previous_output)
+        self._state = state
+
+        peak = np.abs(output).max()
+        target = min(1.0, DSP_LIMITER_CEILING / peak) if peak else 1.0
+        held, held_target = self._held, self._held_target
+        self._held, self._held_target = output, target
+        if held is None:
+            # The first frame waits for the next one to look ahead to, starting at its own gain
+            self._gain = min(self._gain, target)
+            return self.read()
+        return self._release(held, held_target, target)
+
+    @staticmethod
+    def _apply(eq_filter, samples, state):
+        """Filter one frame (samples x channels) from `state`; returns the output and the next state"""
+        if eq_filter is None:
+            return samples, state
+        if state is None or state.shape[0] != eq_filter["AL"].shape[0]:
+            state = np.zeros((eq_filter["AL"].shape[0], 2))
+        # Split the frame into blocks: (blocks, block_size, channels)
+        blocks = samples.reshape(-1, DSP_BLOCK_SIZE, 2)
+
+        # Only the short state recursion runs per block; the heavy products are batched
+        state_inputs = eq_filter["G"] @ blocks
+        states = np.empty((len(blocks),) + state.shape)
+        for index in range(len(blocks)):
+            states[index] = state
+            state = eq_filter["AL"] @ state + state_inputs[index]
+        output = eq_filter["T"] @ blocks + eq_filter["O"] @ states
+        return output.reshape(-1, 2), state
+
+    def _release(self, frame, frame_target, next_target):
+        """Output a held frame, ramping the gain so neither it nor the next frame exceeds the ceiling"""
+        end_gain = min(frame_target, next_target, 1 - (1 - self._gain) * DSP_LIMITER_RELEASE)
+        # The ramp starts at or below this frame's target, so it never exceeds it
+        gain = np.linspace(self._gain, end_gain, len(frame))[:, None]
+        self._gain = end_gain
+        return np.clip(frame * gain, -32768, 32767).astype(np.int16).tobytes()
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.original.cleanup()
+
+
+class SharedStream:
+    """One upstream decode of a track whose frames are fanned out to its subscribers through a ring buffer.
+
+    Frames are pulled from ffmpeg on demand by whichever subscriber is furthest
+    ahead; the others replay them from the buffer at their own offsets.
+    """
+
+    def __init__(self, hub, key, open_stream):
+        self.hub = hub
+        self.key = key
+        self.open_stream = open_stream
+        self.upstream = open_stream()
+        self.capacity = hub.capacity
+        self.subscribers = 0
+        self._frames = [None] * self.capacity
+        self._written = 0
+        self._ended = False
+        self._fetching = False
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def joinable(self):
+        """Whether the buffer still holds the start of the track"""
+        return not self._closed and self._written <= self.capacity
+
+    def try_subscribe(self):
+        """Add a subscriber if the buffer still holds the start of the track"""
+        with self._condition:
+            if not self.joinable():
+                return False
+            self.subscribers += 1
+            return True
+
+    def frame(self, index):
+        """Return frame `index` (b'' at the end of the track), or None once it has left the buffer"""
+        with self._condition:
+            while True:
+                if index < self._written - self.capacity:
+                    return None
+                if index < self._written:
+                    return self._frames[index % self.capacity]
+                if self._ended:
+                    return b''
+                if not self._fetching:
+                    break
+                self._condition.wait()
+            self._fetching = True
+
+        # Read outside the lock so trailing subscribers keep replaying buffered frames
+        data = b''
+        try:
+            data = self.upstream.read()
+        finally:
+            with self._condition:
+                self._fetching = False
+                if data:
+                    self._frames[self._written % self.capacity] = data
+                    self._written += 1
+                else:
+                    self._ended = True
+                self._condition.notify_all()
+        return data
+
+    def release(self):
+        with self._condition:
+            self.subscribers -= 1
+            if self.subscribers > 0:
+                return
+            self._closed = True
+        self.upstream.cleanup()
+        self.hub.forget(self)
+
+
+class SharedStreamSubscriber(discord.AudioSource):
+    """One listener's view of a SharedStream with its own read offset.
+
+    A listener that falls out of the shared buffer (e.g. paused for a long time) ends
+    with `fell_behind` set; play_next_song then continues the track on a private decode.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.fell_behind = False
+        self._is_opus = stream.upstream.is_opus()
+        self._offset = 0
+        self._released = False
+
+    def read(self):
+        if self.fell_behind:
+            return b""
+        data = self.stream.frame(self._offset)
+        if data is None:
+            # Spawning a decode here would block the audio thread and skip the ffmpeg
+            # capacity limit, so the track is resumed from the event loop instead
+            logger.info("Listener fell behind shared decode %s at %.1fs", self.stream.key, self._offset * 0.02)
+            self.fell_behind = True
+            self._release()
+            return b""
+        if data:
+            self._offset += 1
+        return data
+
+    def is_opus(self):
+        return self._is_opus
+
+    def cleanup(self):
+        self._release()
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self.stream.release()
+
+
+class SharedDecodeHub:
+    """Registry of running decodes keyed by (video id, EQ preset) so concurrent plays of a track share one ffmpeg"""
+
+    def __init__(self, buffer_seconds):
+        self.capacity = int(buffer_seconds / 0.02)
+        self.shared_opens = 0
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def open(self, key, open_stream):
+        """Return a source for a track, joining a running decode of it when possible.
+
+        `open_stream()` spawns the ffmpeg source for the shared decode.
+        """
+        if self.capacity <= 0:
+            return open_stream()
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is not None and stream.try_subscribe():
+                self.shared_opens += 1
+                return SharedStreamSubscriber(stream)
+
+        stream = SharedStream(self, key, open_stream)
+        stream.try_subscribe()
+        with self._lock:
+            self._streams[key] = stream
+        return SharedStreamSubscriber(stream)
+
+    def joinable(self, key):
+        with self._lock:
+            stream = self._streams.get(key)
+        return self.capacity > 0 and stream is not None and stream.joinable()
+
+    def forget(self, stream):
+        with self._lock:
+            if self._streams.get(stream.key) is stream:
+                del self._streams[stream.key]
+
+    def stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            "streams": len(streams),
+            "listeners": sum(stream.subscribers for stream in streams),
+            "shared_opens": self.shared_opens,
+        }
+
+
+DECODE_HUB = SharedDecodeHub(SHARED_DECODE_BUFFER_SECONDS)
+
+
+def find_wrapped_source(source, source_type):
+    """Unwrap nested audio sources down to one of `source_type`, if there is one"""
+    while source is not None and not isinstance(source, source_type):
+        source = getattr(source, "original", None)
+    return source
+
+
+def find_dsp_source(source):
+    """Unwrap nested audio sources down to a DSPEqualizerSource, if there is one"""
+    return find_wrapped_source(source, DSPEqualizerSource)
+
+
+def apply_eq_to_current_track(guild, eq_preset):
+    """Switch the EQ of the playing track in place when it runs through the DSP equalizer"""
+    if AUDIO_PRESETS[eq_preset].get("passthrough"):
+        return False
+    dsp_source = find_dsp_source(getattr(guild.voice_client, "source", None))
+    if dsp_source is None:
+        return False
+    dsp_source.set_preset(eq_preset)
+    return True
+
+
+# Setup of intents. Intents are permissions the bot has on the server
+intents = discord.Intents.default()
+intents.message_content = True
+
+# Bot setup. Under cluster.py each worker process is an AutoShardedBot owning a range of shards
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+
+
+def collect_health():
+    """Summary of this process for the cluster supervisor"""
+    voice_clients = [voice_client for voice_client in bot.voice_clients if voice_client.is_connected()]
+    latencies = [latency for _, latency in bot.latencies] if SHARD_COUNT else [bot.latency]
+    finite_latencies = [latency for latency in latencies if latency == latency and latency != float("inf")]
+    return {
+        "cluster_id": CLUSTER_ID,
+        "pid": os.getpid(),
+        "shard_ids": SHARD_IDS,
+        "ready": bot.is_ready(),
+        "guilds": len(bot.guilds),
+        "voice_connections": len(voice_clients),
+        "playing": sum(1 for voice_client in voice_clients if voice_client.is_playing()),
+        "queued_tracks": sum(len(queue) for queue in SONG_QUEUES.values()),
+        "latency_ms": round(max(finite_latencies) * 1000) if finite_latencies else None,
+        "ffmpeg_processes": FFMPEG_SUPERVISOR.running(),
+        "max_loop_lag_ms": round(LOOP_WATCHDOG.max_lag * 1000),
+        "time": time.time(),
+    }
+
+
+def write_heartbeat(path, health):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(health, f)
+    os.replace(tmp_path, path)
+
+
+async def heartbeat_loop():
+    """Periodically write this worker's health to CLUSTER_HEARTBEAT_FILE; a stale file means the worker hung"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, write_heartbeat, CLUSTER_HEARTBEAT_FILE, collect_health())
+        except OSError as e:
+            logger.warning("Failed to write cluster heartbeat: %s", e)
+        await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+
+@bot.event
+async def setup_hook():
+    # Runs after login, before the shards connect: the supervisor sees "ready": false
+    # heartbeats while shards identify and the bot gets ready, instead of none at all
+    global HEARTBEAT_TASK
+    if CLUSTER_HEARTBEAT_FILE and HEARTBEAT_TASK is None:
+        HEARTBEAT_TASK = asyncio.create_task(heartbeat_loop())
+
+async def close_bot():
+    """Write the final guild state while the voice clients are still connected, then close the bot"""
+    if not bot.is_closed():
+        try:
+            await GUILD_STATE_STORE.flush()
+        except Exception as e:
+            logger.error("Final guild state flush failed: %s", e)
+    await type(bot).close(bot)
+
+bot.close = close_bot
+
+# Bot ready-up code
+@bot.event
+async def on_ready():
+    LOOP_WATCHDOG.start()
+    # Commands are global, so only one cluster worker needs to sync them
+    if not CLUSTER_ID:
+        await bot.tree.sync()
+    await EXTRACTION_POOL.start()
+    FFMPEG_SUPERVISOR.start()
+    GUILD_STATE_STORE.start()
+    await restore_guild_states()
+    await start_metrics_server()
+    logger.info("Bot %s is online and ready!", bot.user)
+    print(f"{bot.user} is online!")
+
+class LoopWatchdog:
+    """Measures event loop scheduling lag and captures what blocks the loop.
+
+    A task sleeps for `interval` and records how late it wakes up. A separate
+    thread notices when that task has not run for `stall_seconds` and snapshots
+    the loop thread's stack, i.e. the code that is blocking it.
+    """
+
+    def __init__(self, interval, stall_seconds, slow_callback_ms):
+        self.interval = interval
+        self.stall_seconds = stall_seconds
+        self.slow_callback_ms = slow_callback_ms
+        self.current_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.slow_callbacks = 0
+        self.recent_stalls = deque(maxlen=5)
+        self._last_tick = None
+        self._captured_tick = None
+        self._loop_thread_id = None
+        self._task = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self.slow_callback_ms > 0:
+            loop.slow_callback_duration = self.slow_callback_ms / 1000
+            loop.set_debug(True)
+            logging.getLogger("asyncio").addFilter(self._count_slow_callback)
+        self._last_tick = time.monotonic()
+        self._task = asyncio.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def _count_slow_callback(self, record):
+        if record.getMessage().startswith("Executing "):
+            self.slow_callbacks += 1
+        return True
+
+    async def _measure(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            LOOP_LAG_SECONDS.observe(lag)
+            self.current_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            now = time.monotonic()
+            # A stall captured during this sleep is over; record how long it lasted in total
+            if self._captured_tick == self._last_tick and self.recent_stalls:
+                self.recent_stalls[-1]["blocked"] = now - self._last_tick
+            self._last_tick = now
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval / 2)
+            tick = self._last_tick
+            blocked = time.monotonic() - tick
+            if blocked < self.stall_seconds or tick == self._captured_tick:
+                continue
+            self._captured_tick = tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.extract_stack(frame) if frame else []
+            # Point at the innermost frame of our own code, falling back to the innermost frame
+            own_frames = [entry for entry in stack if entry.filename == __file__]
+            culprit = (own_frames or stack or [None])[-1]
+            location = f"line {culprit.lineno} in {culprit.name}" if culprit else "unknown"
+            self.stalls += 1
+            self.recent_stalls.append({"at": time.time(), "blocked": blocked, "location": location})
+            logger.warning("Event loop blocked for %.1fs at %s; loop thread stack:\n%s",
+                           blocked, location, "".join(traceback.format_list(stack)))
+
+    def stats(self):
+        return {
+            "current_lag": self.current_lag,
+            "max_lag": self.max_lag,
+            "stalls": self.stalls,
+            "slow_callbacks": self.slow_callbacks,
+            "recent_stalls": list(self.recent_stalls),
+        }
+
+
+LOOP_WATCHDOG = LoopWatchdog(LOOP_LAG_INTERVAL, LOOP_STALL_SECONDS, LOOP_SLOW_CALLBACK_MS)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    voice_clients = [voice_client for voice_client in bot.voice_clients if voice_client.is_connected()]
+    ffmpeg_stats = FFMPEG_SUPERVISOR.stats()
+    backlog = []
+    for guild_id, ingestions in GUILD_INGESTIONS.items():
+        # Streamed playlists of unknown length count only what is already known
+        remaining = sum(max(progress["total"] - progress["done"], 0) for progress in ingestions
+                        if isinstance(progress["total"], int))
+        backlog.append(({"guild": guild_id}, remaining))
+    sections = [
+        YTDLP_EXTRACT_SECONDS.render(),
+        SPOTIFY_REQUEST_SECONDS.render(),
+        FIRST_AUDIO_SECONDS.render(),
+        EMBED_UPDATE_SECONDS.render(),
+        LOOP_LAG_SECONDS.render(),
+        PLAY_STAGE_STATS.render("djpablo_play_stage_seconds", "Duration of each /play trace stage over the last 1000 requests"),
+        render_gauge("djpablo_event_loop_stalls_total", f"Times the event loop was blocked for {LOOP_STALL_SECONDS}s or more",
+                     [(None, LOOP_WATCHDOG.stalls)], metric_type="counter"),
+        render_gauge("djpablo_slow_callbacks_total", "Callbacks reported slow by asyncio debug mode",
+                     [(None, LOOP_WATCHDOG.slow_callbacks)], metric_type="counter"),
+        render_gauge("djpablo_queue_depth", "Songs waiting in each guild's queue",
+                     [({"guild": guild_id}, len(queue)) for guild_id, queue in SONG_QUEUES.items() if queue]),
+        render_gauge("djpablo_voice_clients", "Connected voice clients", [(None, len(voice_clients))]),
+        render_gauge("djpablo_voice_clients_playing", "Voice clients currently playing",
+                     [(None, sum(1 for voice_client in voice_clients if voice_client.is_playing()))]),
+        render_gauge("djpablo_ffmpeg_processes", "Live ffmpeg processes (playback and loudness analysis)", [(None, ffmpeg_stats["running"])]),
+        render_gauge("djpablo_ffmpeg_waiting", "Plays waiting for an ffmpeg slot", [(None, ffmpeg_stats["queued"])]),
+        render_gauge("djpablo_ingestion_backlog", "Playlist tracks still to be added by background ingestion", backlog),
+        render_gauge("djpablo_guilds", "Guilds served by this process", [(None, len(bot.guilds))]),
+    ]
+    return "\n".join(sections) + "\n"
+
+
+async def handle_metrics(request):
+    return web.Response(body=render_metrics().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+METRICS_RUNNER = None
+
+
+async def start_metrics_server():
+    """Serve /metrics on METRICS_HOST (once per process; cluster workers use METRICS_PORT + worker index)"""
+    global METRICS_RUNNER
+    if METRICS_PORT <= 0 or METRICS_RUNNER is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    METRICS_RUNNER = web.AppRunner(app, access_log=None)
+    await METRICS_RUNNER.setup()
+    port = METRICS_PORT + CLUSTER_ID
+    try:
+        await web.TCPSite(METRICS_RUNNER, METRICS_HOST, port).start()
+        logger.info("Serving metrics on http://%s:%s/metrics", METRICS_HOST, port)
+    except OSError as e:
+        logger.warning("Could not start the metrics endpoint on port %s: %s", port, e)
+
+
+async def restore_guild_states():
+    """Restore queues and EQ presets saved before the last shutdown, and resume playback where possible"""
+    global GUILD_STATES_RESTORED
+    # on_ready fires again after reconnects; only restore once per process
+    if GUILD_STATES_RESTORED:
+        return
+    GUILD_STATES_RESTORED = True
+
+    states = await GUILD_STATE_STORE.load()
+    for guild_id, (state, queue_records) in states.items():
+        # Other processes sharing the backend own the guilds this one is not connected to
+        guild = bot.get_guild(int(guild_id)) if guild_id.isdigit() else None
+        if guild is None:
+            continue
+        if state.get("eq_preset") in AUDIO_PRESETS:
+            GUILD_EQ_SETTINGS[guild_id] = state["eq_preset"]
+        text_channel = bot.get_channel(state["text_channel_id"]) if state.get("text_channel_id") else None
+        if text_channel and state.get("now_playing_message_id"):
+            # Keep editing the existing now playing message instead of posting a new one
+            GUILD_NOW_PLAYING_MESSAGES[guild_id] = text_channel.get_partial_message(state["now_playing_message_id"])
+
+        queue = GuildQueue()
+        try:
+            queue.extend(Track.from_record(record) for record in queue_records)
+            current_track = Track.from_record(state["current_track"]) if state.get("current_track") else None
+        except (TypeError, ValueError) as e:
+            logger.warning("Discarding unreadable saved queue for guild %s: %s", guild_id, e)
+            continue
+        if current_track:
+            queue.appendleft(current_track)
+            GUILD_RESUME_POSITIONS[guild_id] = (current_track, state.get("position") or 0)
+        SONG_QUEUES[guild_id] = queue
+        # With a playing track the merged queue differs from the saved one and is written on the next flush
+        GUILD_STATE_STORE.mark_saved(guild_id, state, None if current_track else queue)
+        pending_playlist = state.get("pending_playlist")
+        if pending_playlist and spotify_client:
+            # Continue listing a Spotify playlist whose remaining tracks were not queued yet
+            cursor = SpotifyTrackCursor(spotify_client, pending_playlist["url"], start_offset=pending_playlist["offset"])
+            asyncio.create_task(process_remaining_tracks(cursor, guild_id, text_channel))
+            logger.info("Continuing Spotify playlist for guild %s from track %s", guild_id, pending_playlist["offset"] + 1)
+        if not queue:
+            continue
+        logger.info("Restored %s queued tracks for guild %s", len(queue), guild_id)
+
+        if not (RESUME_PLAYBACK and current_track and state.get("voice_channel_id")):
+            continue
+        voice_channel = bot.get_channel(state["voice_channel_id"])
+        if voice_channel is None or text_channel is None:
+            continue
+        # Each guild connects in its own task, so one slow voice connection doesn't hold up the others
+        GUILD_RESUMES_PENDING.add(guild_id)
+        asyncio.create_task(resume_guild_playback(guild, guild_id, voice_channel, text_channel, state.get("position") or 0))
+
+
+async def resume_guild_playback(guild, guild_id, voice_channel, text_channel, position):
+    """Reconnect to a restored guild's voice channel and continue its saved track"""
+    try:
+        voice_client = guild.voice_client or await voice_channel.connect()
+        await play_next_song(voice_client, guild_id, text_channel)
+        logger.info("Resumed playback in guild %s at %.0fs", guild_id, position)
+    except Exception as e:
+        logger.warning("Could not resume playback in guild %s: %s", guild_id, e)
+    finally:
+        GUILD_RESUMES_PENDING.discard(guild_id)
+
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    """Handle bot disconnect and cleanup"""
+    if member == bot.user:
+        # Bot was disconnected from voice channel (any reason)
+        if before.channel is not None and after.channel is None:
+            guild_id = str(before.channel.guild.id)
+            logger.info("Bot disconnected from voice channel in guild %s", guild_id)
+            
+            # Clean up the now playing message
+            if guild_id in GUILD_NOW_PLAYING_MESSAGES:
+                try:
+                    message = GUILD_NOW_PLAYING_MESSAGES[guild_id]
+                    await message.delete()
+                    logger.info("Deleted now playing message due to disconnect in guild %s", guild_id)
+                except Exception as e:
+                    logger.debug("Failed to delete now playing message in guild %s: %s", guild_id, e)
+                    pass  # Message might already be deleted
+                finally:
+                    del GUILD_NOW_PLAYING_MESSAGES[guild_id]
+            
+            # Clear song info and queue
+            if guild_id in CURRENT_SONG_INFO:
+                del CURRENT_SONG_INFO[guild_id]
+            if guild_id in SONG_QUEUES:
+                SONG_QUEUES[guild_id].clear()
+            cancel_ingestion(guild_id)
+            discard_preloaded_source(guild_id)
+        
+        # Bot was moved to a different channel - update tracking but keep playing
+        elif before.channel is not None and after.channel is not None and before.channel != after.channel:
+            guild_id = str(after.channel.guild.id)
+            logger.info("Bot moved from '%s' to '%s' in guild %s", before.channel.name, after.channel.name, guild_id)
+            # No need to delete embed when just moving channels
+
+
+@bot.tree.command(name="skip", description="Skips the current playing song")
+async def skip(interaction: discord.Interaction):
+    guild_id = str(interaction.guild_id)
+    user = interaction.user
+    
+    if interaction.guild.voice_client and (interaction.guild.voice_client.is_playing() or interaction.guild.voice_client.is_paused()):
+        current_song = CURRENT_SONG_INFO.get(guild_id, {}).get('title', 'Unknown')
+        interaction.guild.voice_client.stop()
+        logger.info("User %s (%s) skipped song '%s' in guild %s", user, user.id, current_song, guild_id)
+        await interaction.response.send_message("Skipped the current song.")
+    else:
+        logger.info("User %s (%s) attempted to skip but nothing was playing in guild %s", user, user.id, guild_id)
+        await interaction.response.send_message("Not playing anything to skip.")
+
+
+@bot.tree.command(name="pause", description="Pause the currently playing song.")
+async def pause(interaction: discord.Interaction):
+    voice_client = interaction.guild.voice_client
+    guild_id = str(interaction.guild_id)
+    user = interaction.user
+
+    # Check if the bot is in a voice channel
+    if voice_client is None:
+        logger.info("User %s (%s) attempted to pause but bot not in voice channel in guild %s", user, user.id, guild_id)
+        return await interaction.response.send_message("I'm not in a voice channel.")
+
+    # Check if something is actually playing
+    if not voice_client.is_playing():
+        logger.info("User %s (%s) attempted to pause but nothing playing in guild %s", user, user.id, guild_id)
+        return await interaction.response.send_message("Nothing is currently playing.")
+    
+    # Pause the track
+    current_song = CURRENT_SONG_INFO.get(guild_id, {}).get('title', 'Unknown')
+    voice_client.pause()
+    logger.info("User %s (%s) paused song '%s' in guild %s", user, user.id, current_song, guild_id)
+    await interaction.response.send_message("Playback paused!")
+
+
+@bot.tree.command(name="resume", description="Resume the currently paused song.")
+async def resume(interaction: discord.Interaction):
+    voice_client = interaction.guild.voice_client
+    guild_id = str(interaction.guild_id)
+    user = interaction.user
+
+    # Check if the bot is in a voice channel
+    if voice_client is None:
+        logger.info("User %s (%s) attempted to resume but bot not in voice channel in guild %s", user, user.id, guild_id)
+        return await interaction.response.send_message("I'm not in a voice channel.")
+
+    # Check if it's actually paused
+    if not voice_client.is_paused():
+        logger.info("User %s (%s) attempted to resume but not paused in guild %s", user, user.id, guild_id)
+        return await interaction.response.send_message("I'm not paused right now.")
+    
+    # Resume playback
+    current_song = CURRENT_SONG_INFO.get(guild_id, {}).get('title', 'Unknown')
+    voice_client.resume()
+    logger.info("User %s (%s) resumed song '%s' in guild %s", user, user.id, current_song, guild_id)
+    await interaction.response.send_message("Playback resumed!")
+
+
+@bot.tree.command(name="stop", description="Stop playback and clear the queue.")
+async def stop(interaction: discord.Interaction):
+    voice_client = interaction.guild.voice_client
+    guild_id_str = str(interaction.guild_id)
+    user = interaction.user
+
+    # Check if the bot is in a voice channel
+    if not voice_client or not voice_client.is_connected():
+        logger.info("User %s (%s) attempted to stop but bot not connected in guild %s", user, user.id, guild_id_str)
+        return await interaction.response.send_message("I'm not connected to any voice channel.")
+
+    current_song = CURRENT_SONG_INFO.get(guild_id_str, {}).get('title', 'Unknown')
+    queue_length = len(SONG_QUEUES.get(guild_id_str, []))
+
+    # Clear the guild's queue
+    if guild_id_str in SONG_QUEUES:
+        SONG_QUEUES[guild_id_str].clear()
+    cancel_ingestion(guild_id_str)
+    discard_preloaded_source(guild_id_str)
+    
+    # Delete and clear the now playing message
+    if guild_id_str in GUILD_NOW_PLAYING_MESSAGES:
+        try:
+            message = GUILD_NOW_PLAYING_MESSAGES[guild_id_str]
+            await message.delete()
+            logger.info("Deleted now playing message for guild %s", guild_id_str)
+        except:
+            pass  # Message might already be deleted
+        finally:
+            del GUILD_NOW_PLAYING_MESSAGES[guild_id_str]
+
+    # Clear current song info
+    if guild_id_str in CURRENT_SONG_INFO:
+        del CURRENT_SONG_INFO[guild_id_str]
+
+    # If something is playing or paused, stop it
+    if voice_client.is_playing() or voice_client.is_paused():
+        voice_client.stop()
+
+    # Disconnect from the channel
+    await voice_client.disconnect()
+
+    logger.info("User %s (%s) stopped playback in guild %s. Song: '%s', Queue size: %s", user, user.id, guild_id_str, current_song, queue_length)
+    await interaction.response.send_message("Stopped playback and disconnected!")
+
+
+@bot.tree.command(name="play", description="Play a song/playlist or add it to the queue.")
+@app_commands.describe(song_query="Search query, YouTube URL, Spotify URL, or playlist URL")
+async def play(interaction: discord.Interaction, song_query: str):
+    guild_id = str(interaction.guild_id)
+    trace = PlayTrace(guild_id, song_query)
+    CURRENT_TRACE.set(trace)
+    try:
+        with trace_span("defer"):
+            await interaction.response.defer()
+
+        user = interaction.user
+        logger.info("User %s (%s) requested to play: '%s' in guild %s", user, user.id, song_query, guild_id)
+        await handle_play(interaction, song_query, guild_id)
+    finally:
+        trace.release()
+
+
+async def handle_play(interaction, song_query, guild_id):
+    """Connect to the requester's voice channel and dispatch the query by type"""
+    user = interaction.user
+    voice_channel = interaction.user.voice.channel
+
+    if voice_channel is None:
+        logger.info("User %s (%s) not in voice channel in guild %s", user, user.id, guild_id)
+        await interaction.followup.send("You must be in a voice channel.")
+        return
+
+    voice_client = interaction.guild.voice_client
+
+    if voice_client is None:
+        with trace_span("voice_connect"):
+            voice_client = await voice_channel.connect()
+        logger.info("Bot connected to voice channel '%s' in guild %s", voice_channel.name, guild_id)
+    elif voice_channel != voice_client.channel:
+        with trace_span("voice_move"):
+            await voice_client.move_to(voice_channel)
+        logger.info("Bot moved to voice channel '%s' in guild %s", voice_channel.name, guild_id)
+
+    if SONG_QUEUES.get(guild_id) is None:
+        SONG_QUEUES[guild_id] = GuildQueue()
+
+    # Check if it's a playlist URL
+    if is_spotify_url(song_query):
+        await handle_spotify_url(interaction, song_query, voice_client, guild_id)
+    elif is_youtube_playlist(song_query):
+        await handle_youtube_playlist(interaction, song_query, voice_client, guild_id)
+    else:
+        # Handle single song (existing logic)
+        await handle_single_song(interaction, song_query, voice_client, guild_id)
+
+
+async def handle_spotify_url(interaction, url, voice_client, guild_id):
+    """Handle Spotify URL (track, playlist, or album)"""
+    if not spotify_client:
+        logger.error("Spotify integration not configured for guild %s", guild_id)
+        await interaction.followup.send("Spotify integration is not configured. Please check your API credentials.")
+        return
+    
+    logger.info("Processing Spotify URL: %s in guild %s", url, guild_id)
+    
+    # Only the first page is fetched now; the rest is paged in as the queue drains
+    cursor = SpotifyTrackCursor(spotify_client, url)
+    try:
+        with trace_span("spotify_first_page"):
+            first_track = await cursor.first()
+    except Exception as e:
+        logger.error("Error getting Spotify tracks for %s in guild %s: %s", url, guild_id, e)
+        first_track = None
+    if first_track is None:
+        logger.warning("No tracks found for Spotify URL: %s in guild %s", url, guild_id)
+        await interaction.followup.send("No tracks found or failed to process Spotify content.")
+        return
+    
+    logger.info("Found %s tracks from Spotify URL in guild %s", cursor.total, guild_id)
+    
+    # Process first song immediately
+    if first_track:
+        try:
+            with trace_span("lookup"):
+                song_info = await search_and_queue_song(first_track.query, guild_id, spotify_metadata=first_track)
+            if song_info:
+                title, duration_str = song_info
+                logger.info("Successfully queued Spotify track '%s' in guild %s", title, guild_id)
+                
+                if cursor.total == 1:
+                    with trace_span("followup_send"):
+                        await interaction.followup.send(f"✅ Now playing: **{title}**{duration_str}")
+                else:
+                    with trace_span("followup_send"):
+                        await interaction.followup.send(f"✅ Now playing: **{title}**{duration_str}")
+                
+                # Start playing immediately
+                if not voice_client.is_playing() and not voice_client.is_paused():
+                    await play_next_song(voice_client, guild_id, interaction.channel)
+                
+                # Process remaining songs in background (no spam messages)
+                if cursor.total > 1:
+                    logger.info("Processing %s additional tracks in background for guild %s", cursor.total - 1, guild_id)
+                    asyncio.create_task(process_remaining_tracks(cursor, guild_id, interaction.channel))
+            else:
+                cursor.close()
+                logger.error("Could not find Spotify track on YouTube: '%s' in guild %s", first_track.query, guild_id)
+                await interaction.followup.send(f"❌ Could not find **{first_track.title}** by **{first_track.artist or 'Unknown Artist'}** on YouTube. This might be due to YouTube access restrictions or the song not being available.")
+        except Exception as e:
+            cursor.close()
+            logger.error("Error processing Spotify content in guild %s: %s", guild_id, e)
+            error_msg = str(e)
+            if "Sign in to confirm you're not a bot" in error_msg:
+                await interaction.followup.send("❌ YouTube is currently blocking access. Please try again in a few minutes, or try playing the song directly from YouTube instead.")
+            elif "cookies" in error_msg.lower():
+                await interaction.followup.send("❌ YouTube access is restricted. Try searching for the song by name instead of using Spotify links.")
+            else:
+                await interaction.followup.send(f"❌ Error processing Spotify content. Try using a direct search instead.")
+    else:
+        logger.warning("No tracks found in Spotify content for guild %s", guild_id)
+        await interaction.followup.send("❌ No tracks found in Spotify content.")
+
+
+async def handle_youtube_playlist(interaction, url, voice_client, guild_id):
+    """Handle YouTube playlist URL"""
+    await interaction.followup.send("🎵 Processing YouTube playlist...")
+    
+    # Entries stream in as YouTube lists the playlist; the first one plays right away
+    stream = YouTubePlaylistStream(url)
+    try:
+        with trace_span("playlist_first_page"):
+            first_track = await stream.first()
+    except Exception as e:
+        logger.error("Error getting YouTube playlist tracks for %s in guild %s: %s", url, guild_id, e)
+        first_track = None
+    if first_track is None:
+        stream.close()
+        await interaction.followup.send("No tracks found in the YouTube playlist.")
+        return
+    
+    # Process first song immediately
+    if first_track:
+        try:
+            # Playlist entries already carry their video id; the stream URL is resolved on play
+            SONG_QUEUES[guild_id].append(first_track)
+            title, duration_str = first_track.title, first_track.duration_str
+            if stream.total == 1:
+                with trace_span("followup_send"):
+                    await interaction.followup.send(f"✅ Now playing: **{title}**{duration_str}")
+            elif stream.total:
+                with trace_span("followup_send"):
+                    await interaction.followup.send(f"✅ Now playing: **{title}**{duration_str}\n🎵 Processing {stream.total-1} more songs in background...")
+            else:
+                with trace_span("followup_send"):
+                    await interaction.followup.send(f"✅ Now playing: **{title}**{duration_str}\n🎵 Loading the rest of the playlist in background...")
+            
+            # Start playing immediately
+            if not voice_client.is_playing() and not voice_client.is_paused():
+                await play_next_song(voice_client, guild_id, interaction.channel)
+            
+            # Process remaining songs in background
+            if stream.total != 1:
+                asyncio.create_task(process_remaining_youtube_tracks(stream, guild_id, interaction.channel))
+            else:
+                stream.close()
+        except Exception as e:
+            stream.close()
+            await interaction.followup.send(f"❌ Error processing YouTube playlist: {str(e)}")
+    else:
+        await interaction.followup.send("❌ No tracks found in YouTube playlist.")
+
+
+async def iterate_async(items):
+    for item in items:
+        yield item
+
+
+def notify_queue_drained(guild_id):
+    """Wake ingestion that is paused at the queue high-water mark"""
+    event = GUILD_QUEUE_DRAINED.get(guild_id)
+    if event is not None:
+        event.set()
+
+
+async def wait_for_queue_drain(guild_id):
+    event = GUILD_QUEUE_DRAINED.setdefault(guild_id, asyncio.Event())
+    event.clear()
+    await event.wait()
+
+
+async def ingest_tracks(items, guild_id, resolve, label, total=None, high_water=None, resume=None):
+    """Resolve playlist items with bounded concurrency, appending results to the queue in playlist order.
+
+    `items` may be a sequence or an async iterator (`total` may then be None,
+    shown as "?" until the iterator is exhausted). With
+    `high_water`, no new items are pulled while the queue holds that many songs,
+    so lazily paged sources are only fetched as playback drains the queue.
+    `resolve` is a coroutine function mapping an item to song metadata (or None).
+    `resume` maps the number of items processed so far to a JSON-serializable
+    record from which the guild state store can restart ingestion after a restart.
+    Returns the number of tracks added.
+    """
+    if total is None:
+        total = len(items) if hasattr(items, "__len__") else "?"
+    progress = {"label": label, "total": total, "done": 0, "added": 0, "task": asyncio.current_task(), "resume": resume}
+    GUILD_INGESTIONS.setdefault(guild_id, []).append(progress)
+    semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+    items_iter = items.__aiter__() if hasattr(items, "__aiter__") else iterate_async(items)
+    pending = deque()
+    exhausted = False
+
+    async def resolve_limited(item):
+        async with semaphore:
+            return await resolve(item)
+
+    async def refill():
+        nonlocal exhausted
+        # Keep a few more lookups scheduled than can run so the pipeline never idles on one slow track
+        while not exhausted and len(pending) < INGEST_CONCURRENCY * 2:
+            if high_water and len(SONG_QUEUES[guild_id]) + len(pending) >= high_water:
+                return
+            try:
+                item = await items_iter.__anext__()
+            except StopAsyncIteration:
+                exhausted = True
+                if progress["total"] == "?":
+                    progress["total"] = progress["done"] + len(pending)
+                return
+            except Exception as e:
+                logger.warning("Stopped reading %s tracks for guild %s: %s", label, guild_id, e)
+                exhausted = True
+                return
+            pending.append((item, asyncio.create_task(resolve_limited(item))))
+
+    try:
+        await refill()
+        while pending or not exhausted:
+            if not pending:
+                # The queue is at the high-water mark; continue once playback takes songs off it
+                await wait_for_queue_drain(guild_id)
+                await refill()
+                continue
+            item, task = pending.popleft()
+            try:
+                song_metadata = await task
+            except Exception as e:
+                logger.warning("Error adding %s track '%s' in guild %s: %s", label, item.query or item.title, guild_id, e)
+                song_metadata = None
+            await refill()
+
+            progress["done"] += 1
+            if song_metadata:
+                SONG_QUEUES[guild_id].append(song_metadata)
+                progress["added"] += 1
+                logger.debug("Added %s track %s/%s: '%s' in guild %s", label, progress['done'], progress['total'], song_metadata.title, guild_id)
+                if len(SONG_QUEUES[guild_id]) <= PREFETCH_WINDOW:
+                    schedule_prefetch(guild_id)
+
+            if progress["done"] % INGEST_PROGRESS_INTERVAL == 0:
+                logger.info("%s ingestion progress for guild %s: %s/%s processed, %s added", label, guild_id, progress['done'], progress['total'], progress['added'])
+    finally:
+        for _, task in pending:
+            task.cancel()
+        GUILD_INGESTIONS[guild_id].remove(progress)
+        if not GUILD_INGESTIONS[guild_id]:
+            del GUILD_INGESTIONS[guild_id]
+
+    return progress["added"]
+
+
+def cancel_ingestion(guild_id):
+    """Stop any background playlist ingestion for a guild"""
+    for progress in GUILD_INGESTIONS.get(guild_id, []):
+        progress["task"].cancel()
+
+
+async def process_remaining_tracks(cursor, guild_id, channel):
+    """Process remaining Spotify tracks in background without spamming channel"""
+    # Started from a /play request, but not part of its trace
+    CURRENT_TRACE.set(None)
+    try:
+        await cursor.start()
+    except Exception as e:
+        logger.warning("Could not continue Spotify playlist %s for guild %s: %s", cursor.url, guild_id, e)
+        return
+    already_handed_out = cursor.handed_out
+    total_tracks = max(cursor.total - cursor.resume_offset(already_handed_out), 0)
+    
+    logger.info("Starting background processing of %s tracks for guild %s", total_tracks, guild_id)
+    
+    async def resolve(track_metadata):
+        return await lookup_song(track_metadata.query, guild_id, spotify_metadata=track_metadata)
+    
+    def resume(done):
+        # Tracks not yet queued are not in the saved queue; the store saves where to continue listing instead
+        return {"url": cursor.url, "offset": cursor.resume_offset(already_handed_out + done)}
+    
+    try:
+        added_count = await ingest_tracks(cursor, guild_id, resolve, "Spotify", total=total_tracks,
+                                          high_water=INGEST_QUEUE_HIGH_WATER, resume=resume)
+    finally:
+        cursor.close()
+    
+    # Final summary in logs only
+    logger.info("Background processing complete for guild %s: %s/%s tracks added successfully", guild_id, added_count, total_tracks)
+
+
+async def process_remaining_youtube_tracks(stream, guild_id, channel):
+    """Process remaining YouTube tracks in background without spamming channel"""
+    # Started from a /play request, but not part of its trace
+    CURRENT_TRACE.set(None)
+    total_tracks = stream.total - 1 if stream.total else None
+    
+    logger.info("Starting background processing of %s YouTube tracks for guild %s", total_tracks or 'remaining', guild_id)
+    
+    async def resolve(song_metadata):
+        # Playlist entries already carry their video id, so no extraction is needed here
+        return song_metadata
+    
+    try:
+        added_count = await ingest_tracks(stream, guild_id, resolve, "YouTube", total=total_tracks)
+    finally:
+        stream.close()
+    
+    # Final summary in logs only
+    logger.info("YouTube playlist processing complete for guild %s: %s/%s tracks added successfully", guild_id, added_count, stream.count - 1)
+
+
+async def handle_single_song(interaction, song_query, voice_client, guild_id):
+    """Handle single song search/URL"""
+    try:
+        with trace_span("lookup"):
+            song_info = await search_and_queue_song(song_query, guild_id)
+        if not song_info:
+            await interaction.followup.send("❌ No results found. Try a different search term or check if the URL is accessible.")
+            return
+        
+        title, duration_str = song_info
+        
+        if voice_client.is_playing() or voice_client.is_paused():
+            with trace_span("followup_send"):
+                await interaction.followup.send(f"✅ Added to queue: **{title}**{duration_str}")
+        else:
+            with trace_span("followup_send"):
+                await interaction.followup.send(f"✅ Now playing: **{title}**{duration_str}")
+            await play_next_song(voice_client, guild_id, interaction.channel)
+            
+    except Exception as e:
+        error_msg = str(e)
+        if is_youtube_auth_error(error_msg):
+            user_friendly_msg = get_youtube_error_message(error_msg)
+            await interaction.followup.send(f"❌ {user_friendly_msg}")
+        else:
+            await interaction.followup.send(f"❌ Error searching for song: {error_msg}")
+
+
+async def search_and_queue_song(song_query, guild_id, is_url=False, spotify_metadata=None):
+    """Search for a song and add it to the queue with metadata"""
+    song_metadata = await lookup_song(song_query, guild_id, is_url, spotify_metadata)
+    if not song_metadata:
+        return None
+
+    SONG_QUEUES[guild_id].append(song_metadata)
+    schedule_prefetch(guild_id)
+    return song_metadata.title, song_metadata.duration_str
+
+
+async def lookup_song(song_query, guild_id, is_url=False, spotify_metadata=None):
+    """Search for a song and return its queue entry (without queueing it)"""
+    # Repeat plays of the same query or Spotify track skip the search entirely
+    cache_keys = resolution_cache_keys(song_query, is_url, spotify_metadata)
+    cached = await RESOLUTION_CACHE.get(cache_keys)
+    if cached:
+        trace_event("resolution_cache_hit")
+        return create_song_metadata(
+            cached["title"],
+            duration=cached["duration"],
+            video_id=cached["video_id"],
+            query=song_query,
+            spotify_metadata=spotify_metadata,
+        )
+
+    if is_url:
+        query = song_query
+    else:
+        query = "ytsearch1: " + song_query
+    
+    # Only the video id is looked up here; resolve_stream_url fetches the stream URL near the playhead
+    try:
+        results = await search_ytdlp_async(query, "search")
+        tracks = results.get("entries", [results]) if results else []
+
+        if not tracks:
+            # Try fallback without cookies if no results
+            logger.warning("No results found for '%s', trying fallback options", song_query)
+            try:
+                results = await search_ytdlp_async(query, "search_nocookies")
+                tracks = results.get("entries", [results]) if results else []
+            except Exception as fallback_error:
+                logger.error("Fallback search also failed for '%s': %s", song_query, fallback_error)
+                return None
+
+        if not tracks:
+            logger.warning("No tracks found for query: '%s'", song_query)
+            return None
+
+    except Exception as e:
+        logger.error("Error searching for '%s': %s", song_query, e)
+        
+        # Try alternative sources as last resort
+        if not is_url:  # Only try alternatives for search queries, not direct URLs
+            logger.info("Trying alternative sources for '%s'", song_query)
+            return await search_alternative_sources(song_query, guild_id, spotify_metadata)
+        
+        return None
+
+    first_track = tracks[0]
+    song_metadata = create_song_metadata(
+        first_track.get("title", "Untitled"),
+        duration=first_track.get("duration"),
+        video_id=first_track.get("id"),
+        webpage_url=first_track.get("webpage_url"),
+        query=song_query,
+        spotify_metadata=spotify_metadata,
+    )
+
+    # A full extraction (direct URL) already carries a stream URL, so keep it
+    if first_track.get("formats") and first_track.get("url"):
+        song_metadata.audio_url = first_track["url"]
+        song_metadata.audio_codec = first_track.get("acodec")
+        song_metadata.audio_rate = first_track.get("asr")
+        song_metadata.resolved_at = time.time()
+
+    if song_metadata.video_id:
+        await RESOLUTION_CACHE.put(cache_keys, song_metadata.video_id, first_track.get("title", "Untitled"), song_metadata.duration)
+
+    return song_metadata
+
+
+async def create_audio_source(song_metadata, eq_preset, start_seconds=0):
+    """Create the audio source for a track: from the Opus cache if possible, otherwise via ffmpeg.
+
+    With `start_seconds` (resuming a track) ffmpeg seeks into the stream and the
+    cache and shared decodes, which always start at the beginning, are bypassed.
+    """
+    # The DSP equalizer works on PCM, so its tracks bypass the (encoded) Opus cache
+    live_eq = EQ_ENGINE == "dsp" and not AUDIO_PRESETS[eq_preset].get("passthrough")
+
+    cached_source = None if live_eq or start_seconds else OPUS_CACHE.open(song_metadata.video_id, eq_preset)
+    if cached_source:
+        logger.info("Playing '%s' from the Opus cache", song_metadata.title)
+        return cached_source
+
+    if not stream_url_is_fresh(song_metadata) and not await resolve_stream_url(song_metadata):
+        raise RuntimeError("no playable stream found")
+
+    # Measured tracks get a precomputed gain instead of live loudnorm (passthrough copies packets as-is)
+    passthrough = AUDIO_PRESETS[eq_preset].get("passthrough") and can_passthrough(song_metadata)
+    loudness = None
+    if not passthrough:
+        loudness = await LOUDNESS_STORE.get(song_metadata.video_id)
+        if loudness is None:
+            schedule_loudness_analysis(song_metadata)
+
+    audio_url = song_metadata.audio_url
+    executable = get_ffmpeg_executable()
+
+    def open_stream(start_seconds=0):
+        """Spawn ffmpeg for this track, optionally seeking into it"""
+        seek = f"-ss {start_seconds:.2f} " if start_seconds else ""
+        if live_eq:
+            options = build_pcm_ffmpeg_options(loudness)
+            return SupervisedFFmpegPCMAudio(
+                audio_url,
+                before_options=seek + options["before_options"],
+                options=options["options"],
+                executable=executable
+            )
+        if passthrough:
+            # Opus sources are copied packet for packet: no decode, filters or encode
+            return SupervisedFFmpegOpusAudio(
+                audio_url,
+                codec="copy",
+                before_options=seek + build_ffmpeg_options(eq_preset)["before_options"],
+                options="-vn",
+                executable=executable
+            )
+        options = build_ffmpeg_options(eq_preset, loudness)
+        return SupervisedFFmpegOpusAudio(
+            audio_url,
+            before_options=seek + options["before_options"],
+            options=options["options"],
+            executable=executable
+        )
+
+    if start_seconds:
+        await FFMPEG_SUPERVISOR.wait_for_capacity()
+        source = open_stream(start_seconds)
+        return DSPEqualizerSource(source, eq_preset) if live_eq else source
+
+    # Guilds starting the same track at about the same time share one decode
+    video_id = song_metadata.video_id
+    decode_key = (video_id, "pcm" if live_eq else eq_preset)
+    if not (video_id and DECODE_HUB.joinable(decode_key)):
+        await FFMPEG_SUPERVISOR.wait_for_capacity()
+    if video_id:
+        source = DECODE_HUB.open(decode_key, open_stream)
+    else:
+        source = open_stream()
+
+    if live_eq:
+        return DSPEqualizerSource(source, eq_preset)
+    return OPUS_CACHE.wrap_for_recording(source, song_metadata, eq_preset)
+
+
+def schedule_preload(guild_id):
+    """Start preparing the next track's audio source unless one is already prepared or in progress"""
+    preload = GUILD_PRELOAD_TASKS.get(guild_id)
+    if guild_id in GUILD_PRELOADED_SOURCES or (preload is not None and not preload[1].done()):
+        return
+    queue = SONG_QUEUES.get(guild_id)
+    if not queue:
+        return
+    song_metadata = queue[0]
+    GUILD_PRELOAD_TASKS[guild_id] = (song_metadata, asyncio.create_task(preload_next_source(guild_id, song_metadata)))
+
+
+async def preload_next_source(guild_id, song_metadata):
+    """Open and prime the audio source of the next queue entry so the track change is gapless"""
+    # Started from a /play request, but not part of its trace
+    CURRENT_TRACE.set(None)
+    eq_preset = GUILD_EQ_SETTINGS.get(guild_id, "enhanced")
+
+    source = None
+    try:
+        source = TrackSource(await create_audio_source(song_metadata, eq_preset), song_metadata.duration)
+        await asyncio.get_running_loop().run_in_executor(None, source.prime)
+    except asyncio.CancelledError:
+        if source:
+            source.cleanup()
+        raise
+    except Exception as e:
+        # play_next_song will retry (and skip the entry if needed) when the track comes up
+        logger.warning("Failed to preload '%s' in guild %s: %s", song_metadata.title, guild_id, e)
+        if source:
+            source.cleanup()
+        return
+
+    GUILD_PRELOADED_SOURCES[guild_id] = (song_metadata, eq_preset, source)
+    logger.debug("Preloaded '%s' in guild %s", song_metadata.title, guild_id)
+
+
+async def finish_preload(guild_id, song_metadata):
+    """Wait for a preload of this queue entry that is still running; cancel one for any other entry"""
+    preload = GUILD_PRELOAD_TASKS.get(guild_id)
+    if preload is None or preload[1].done():
+        return
+    preloaded_song, task = preload
+    if preloaded_song is not song_metadata:
+        GUILD_PRELOAD_TASKS.pop(guild_id, None)
+        task.cancel()
+        return
+    # asyncio.wait neither raises if the preload is cancelled elsewhere nor cancels it if we are
+    await asyncio.wait([task])
+
+
+def take_preloaded_source(guild_id, song_metadata, eq_preset):
+    """Return the primed source for a queue entry if it was preloaded with the same EQ; discard stale ones"""
+    preloaded = GUILD_PRELOADED_SOURCES.pop(guild_id, None)
+    if preloaded is None:
+        return None
+    preloaded_song, preloaded_eq, source = preloaded
+    if preloaded_song is song_metadata and preloaded_eq == eq_preset:
+        return source
+    # A DSP-equalized source can simply switch to the new preset
+    dsp_source = find_dsp_source(source)
+    if preloaded_song is song_metadata and dsp_source and not AUDIO_PRESETS[eq_preset].get("passthrough"):
+        dsp_source.set_preset(eq_preset)
+        return source
+    source.cleanup()
+    return None
+
+
+def discard_preloaded_source(guild_id):
+    """Cancel any preload in progress for a guild and release a primed source"""
+    preload = GUILD_PRELOAD_TASKS.pop(guild_id, None)
+    if preload is not None:
+        preload[1].cancel()
+    preloaded = GUILD_PRELOADED_SOURCES.pop(guild_id, None)
+    if preloaded is not None:
+        preloaded[2].cleanup()
+
+
+async def resume_track(voice_client, guild_id, channel, song_metadata, position):
+    """Continue a track from `position` seconds on a fresh source (stream URL checked, ffmpeg capacity respected)"""
+    logger.info("Resuming '%s' in guild %s at %.1fs", song_metadata.title, guild_id, position)
+    SONG_QUEUES.setdefault(guild_id, GuildQueue()).appendleft(song_metadata)
+    GUILD_RESUME_POSITIONS[guild_id] = (song_metadata, position)
+    await play_next_song(voice_client, guild_id, channel)
+
+
+async def play_next_song(voice_client, guild_id, channel):
+    requested_at = time.perf_counter()
+    eq_preset = GUILD_EQ_SETTINGS.get(guild_id, "enhanced")
+
+    # Take the next track whose stream URL can be resolved, skipping dead entries
+    song_metadata = None
+    source = None
+    while SONG_QUEUES[guild_id]:
+        candidate = SONG_QUEUES[guild_id].popleft()
+        notify_queue_drained(guild_id)
+        # A source primed while the previous track played starts without any spawn/connect delay;
+        # one still being primed is waited for rather than opened a second time
+        await finish_preload(guild_id, candidate)
+        source = take_preloaded_source(guild_id, candidate, eq_preset)
+        if source:
+            song_metadata = candidate
+            break
+        # Cached tracks play from disk and need no stream URL
+        if OPUS_CACHE.contains(candidate.video_id, eq_preset):
+            song_metadata = candidate
+            break
+        if stream_url_is_fresh(candidate) or await resolve_stream_url(candidate):
+            song_metadata = candidate
+            break
+        logger.warning("Skipping '%s' in guild %s: no playable stream found", candidate.title, guild_id)
+
+    # Playback may have been started or stopped elsewhere while resolving
+    if song_metadata and (voice_client.is_playing() or voice_client.is_paused()):
+        SONG_QUEUES[guild_id].appendleft(song_metadata)
+        if source:
+            GUILD_PRELOADED_SOURCES[guild_id] = (song_metadata, eq_preset, source)
+        return
+    if song_metadata and not voice_client.is_connected():
+        if source:
+            source.cleanup()
+        return
+
+    # A track restored after a restart continues where it left off
+    start_seconds = 0
+    resume = GUILD_RESUME_POSITIONS.pop(guild_id, None)
+    if song_metadata and resume and resume[0] is song_metadata:
+        start_seconds = resume[1]
+
+    if song_metadata:
+        # Extract metadata
+        audio_url = song_metadata.audio_url
+        title = song_metadata.title
+        duration_str = song_metadata.duration_str
+        artwork_url = song_metadata.artwork_url
+        artist = song_metadata.artist
+        is_spotify = song_metadata.is_spotify
+
+        logger.info("Playing next song in guild %s: '%s' (Spotify: %s)", guild_id, title, is_spotify)
+
+        # Store current song info
+        CURRENT_SONG_INFO[guild_id] = {
+            'title': title,
+            'url': audio_url,
+            'start_time': discord.utils.utcnow() - timedelta(seconds=start_seconds),
+            'artwork_url': artwork_url,
+            'artist': artist,
+            'is_spotify': is_spotify,
+            'track': song_metadata,
+            'channel_id': channel.id
+        }
+
+        if source is None:
+            try:
+                with trace_span("create_source"):
+                    source = TrackSource(
+                        await create_audio_source(song_metadata, eq_preset, start_seconds),
+                        song_metadata.duration,
+                        start_seconds
+                    )
+            except Exception as e:
+                logger.error("Failed to create audio source for '%s' in guild %s: %s", title, guild_id, e)
+                # Try next song if this one fails
+                asyncio.run_coroutine_threadsafe(play_next_song(voice_client, guild_id, channel), bot.loop)
+                return
+
+        # Prepare the following track shortly before this one ends
+        source.near_end_callback = lambda: bot.loop.call_soon_threadsafe(schedule_preload, guild_id)
+
+        def after_play(error):
+            subscriber = find_wrapped_source(source, SharedStreamSubscriber)
+            if error:
+                logger.error("Error playing '%s' in guild %s: %s", title, guild_id, error)
+            elif subscriber is not None and subscriber.fell_behind:
+                # Left behind by a shared decode: continue the track on its own decode
+                asyncio.run_coroutine_threadsafe(
+                    resume_track(voice_client, guild_id, channel, song_metadata, source.position), bot.loop
+                )
+                return
+            else:
+                logger.info("Finished playing '%s' in guild %s", title, guild_id)
+            
+            # Clear current song info when song ends
+            if guild_id in CURRENT_SONG_INFO:
+                del CURRENT_SONG_INFO[guild_id]
+                
+            asyncio.run_coroutine_threadsafe(play_next_song(voice_client, guild_id, channel), bot.loop)
+
+        source.play_requested_at = requested_at
+        source.attach_trace(CURRENT_TRACE.get())
+        # The bitrate only applies to PCM (DSP equalizer) sources, which discord.py encodes itself
+        voice_client.play(source, after=after_play, bitrate=preset_bitrate_kbps(eq_preset))
+        dsp_source = find_dsp_source(source)
+        if dsp_source is not None:
+            dsp_source.encoder = getattr(voice_client, "encoder", None)
+        
+        # Resolve the following tracks while this one plays
+        schedule_prefetch(guild_id)
+        
+        # Create rich embed with control buttons and artwork
+        embed = create_now_playing_embed(title, duration_str, artwork_url, artist)
+        
+        # Add source indicator
+        if is_spotify:
+            embed.add_field(name="🎵 Source", value="Spotify", inline=True)
+        
+        # Add EQ info
+        preset_names = {
+            "default": "🎵 Default",
+            "bass_boost": "🔊 Bass Boost", 
+            "enhanced": "✨ Enhanced",
+            "vocal_boost": "🎤 Vocal Boost",
+            "treble_boost": "🔔 Treble Boost",
+            "cinema": "🎬 Cinema",
+            "raw": "📡 Raw"
+        }
+        embed.add_field(name="🎛️ EQ", value=preset_names[eq_preset], inline=True)
+        
+        # Add queue info if there are more songs
+        queue_count = len(SONG_QUEUES[guild_id])
+        if queue_count > 0:
+            embed.add_field(name="📋 Up Next", value=f"{queue_count} songs in queue", inline=True)
+        
+        view = MusicControlView()
+        
+        # Try to update the existing now playing message, if any
+        try:
+            if guild_id in GUILD_NOW_PLAYING_MESSAGES:
+                message = GUILD_NOW_PLAYING_MESSAGES[guild_id]
+                with EMBED_UPDATE_SECONDS.time("edit"):
+                    await message.edit(embed=embed, view=view)
+                return  # Message updated, no need to send a new one
+        except (discord.NotFound, discord.HTTPException):
+            # Message was deleted or can't be edited, remove from tracking
+            if guild_id in GUILD_NOW_PLAYING_MESSAGES:
+                del GUILD_NOW_PLAYING_MESSAGES[guild_id]
+        except Exception:
+            pass  # Ignore other errors, fallback to sending a new message
+        
+        # Send as a new message if update fails or no existing message
+        try:
+            with EMBED_UPDATE_SECONDS.time("send"):
+                new_message = await channel.send(embed=embed, view=view)
+            GUILD_NOW_PLAYING_MESSAGES[guild_id] = new_message  # Store for future updates
+        except:
+            # Fallback to simple message if embed fails
+            simple_message = await channel.send(f"🎵 Now playing: **{title}**")
+            GUILD_NOW_PLAYING_MESSAGES[guild_id] = simple_message
+    else:
+        # Clear current song info when queue is empty
+        if guild_id in CURRENT_SONG_INFO:
+            del CURRENT_SONG_INFO[guild_id]
+        
+        # Delete and clear the now playing message when disconnecting
+        if guild_id in GUILD_NOW_PLAYING_MESSAGES:
+            try:
+                message = GUILD_NOW_PLAYING_MESSAGES[guild_id]
+                await message.delete()
+                logger.info("Deleted now playing message when queue ended in guild %s", guild_id)
+            except:
+                pass  # Message might already be deleted
+            finally:
+                del GUILD_NOW_PLAYING_MESSAGES[guild_id]
+            
+        await voice_client.disconnect()
+        SONG_QUEUES[guild_id] = GuildQueue()
+
+
+@bot.tree.command(name="queue", description="Show the current song queue with pagination.")
+async def queue(interaction: discord.Interaction):
+    guild_id = str(interaction.guild_id)
+    
+    if guild_id not in SONG_QUEUES or not SONG_QUEUES[guild_id]:
+        embed = discord.Embed(
+            title="📋 Empty Queue",
+            description="The queue is currently empty.\nUse `/play` to add some music!",
+            color=0x95a5a6
+        )
+        await interaction.response.send_message(embed=embed)
+        return
+    
+    # Create paginated queue view
+    queue_view = QueuePaginationView(guild_id)
+    embed = queue_view.create_queue_embed()
+    await interaction.response.send_message(embed=embed, view=queue_view)
+
+
+@bot.tree.command(name="nowplaying", description="Show the currently playing song with controls.")
+async def nowplaying(interaction: discord.Interaction):
+    voice_client = interaction.guild.voice_client
+    guild_id = str(interaction.guild_id)
+    
+    if not voice_client or not voice_client.is_playing():
+        embed = discord.Embed(
+            title="🔇 Nothing Playing",
+            description="No music is currently playing.",
+            color=0x95a5a6
+        )
+        await interaction.response.send_message(embed=embed)
+        return
+    
+    # Get current song info
+    current_song = CURRENT_SONG_INFO.get(guild_id)
+    if current_song:
+        title = current_song['title']
+        start_time = current_song['start_time']
+        artwork_url = current_song.get('artwork_url')
+        artist = current_song.get('artist')
+        is_spotify = current_song.get('is_spotify', False)
+        
+        # Calculate elapsed time
+        elapsed = discord.utils.utcnow() - start_time
+        elapsed_str = f"{int(elapsed.total_seconds() // 60)}:{int(elapsed.total_seconds() % 60):02d}"
+        
+        embed = create_now_playing_embed(title, "", artwork_url, artist)
+        
+        # Add source indicator if from Spotify
+        if is_spotify:
+            embed.add_field(name="🎵 Source", value="Spotify", inline=True)
+        
+        embed.add_field(name="⏰ Elapsed", value=elapsed_str, inline=True)
+        
+        # Add queue info
+        queue_count = len(SONG_QUEUES.get(guild_id, []))
+        if queue_count > 0:
+            embed.add_field(name="📋 Up Next", value=f"{queue_count} songs in queue", inline=True)
+        
+        # Add playback status
+        status = "⏸️ Paused" if voice_client.is_paused() else "▶️ Playing"
+        embed.add_field(name="🎵 Status", value=status, inline=True)
+        
+        view = MusicControlView()
+        await interaction.response.send_message(embed=embed, view=view)
+    else:
+        # Fallback if no song info stored
+        embed = discord.Embed(
+            title="🎵 Something is Playing",
+            description="A song is currently playing, but details are not available.",
+            color=0x1DB954
+        )
+        view = MusicControlView()
+        await interaction.response.send_message(embed=embed, view=view)
+
+
+@bot.tree.command(name="help", description="Show all available music bot commands")
+async def help_command(interaction: discord.Interaction):
+    embed = discord.Embed(
+        title="🎵 Music Bot Commands",
+        description="Here are all the available commands for the music bot:",
+        color=0x00ff00
+    )
+    
+    embed.add_field(
+        name="🎶 Playback Commands",
+        value="`/play` - Play a song, playlist, or add to queue\n"
+              "`/pause` - Pause the current song\n"
+              "`/resume` - Resume the paused song\n"
+              "`/skip` - Skip to the next song\n"
+              "`/stop` - Stop playback and clear queue\n"
+              "`/eq` - Change audio equalizer settings",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="📋 Queue Commands",
+        value="`/queue` - Show the current song queue\n"
+              "`/nowplaying` - Show the currently playing song\n"
+              "`/shuffle` - Shuffle the current queue\n"
+              "`/remove` - Remove a song from the queue\n"
+              "`/move` - Move a song to another position\n"
+              "`/status` - Check bot status and troubleshooting",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="🎵 Supported Sources",
+        value="• YouTube videos and playlists\n"
+              "• Spotify tracks, playlists, and albums\n"
+              "• Direct song searches\n"
+              "• YouTube Music",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="📝 Usage Examples",
+        value="`/play Never Gonna Give You Up`\n"
+              "`/play https://open.spotify.com/playlist/...`\n"
+              "`/play https://youtube.com/playlist?list=...`\n"
+              "`/play https://youtu.be/dQw4w9WgXcQ`",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="🔧 Troubleshooting",
+        value="• If YouTube links fail, try searching by song name\n"
+              "• Use `/status` to check bot health and get tips\n"
+              "• SoundCloud is used as backup when needed",
+        inline=False
+    )
+    
+    embed.set_footer(text="🤖 Made with ❤️ using Discord.py")
+    embed.set_thumbnail(url="https://cdn.discordapp.com/attachments/123456789/123456789/music_note.png")
+    
+    await interaction.response.send_message(embed=embed)
+
+
+# Music control buttons view
+class MusicControlView(discord.ui.View):
+    def __init__(self, *, timeout=300):
+        super().__init__(timeout=timeout)
+    
+    @discord.ui.button(label="⏸️ Pause", style=discord.ButtonStyle.secondary)
+    async def pause_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        voice_client = interaction.guild.voice_client
+        
+        if voice_client is None:
+            await interaction.response.send_message("I'm not in a voice channel.", ephemeral=True)
+            return
+        
+        if voice_client.is_playing():
+            voice_client.pause()
+            button.label = "▶️ Resume"
+            button.style = discord.ButtonStyle.success
+            
+            # Update the embed to show paused status
+            embed = interaction.message.embeds[0] if interaction.message.embeds else None
+            if embed:
+                # Update the embed title to show paused status
+                embed.title = "⏸️ Paused"
+                embed.color = 0x95a5a6  # Gray color for paused
+            
+            await interaction.response.edit_message(embed=embed, view=self)
+        elif voice_client.is_paused():
+            voice_client.resume()
+            button.label = "⏸️ Pause"
+            button.style = discord.ButtonStyle.secondary
+            
+            # Update the embed to show playing status
+            embed = interaction.message.embeds[0] if interaction.message.embeds else None
+            if embed:
+                # Update the embed title to show playing status
+                embed.title = "🎵 Now Playing"
+                embed.color = 0x1DB954  # Spotify green for playing
+            
+            await interaction.response.edit_message(embed=embed, view=self)
+        else:
+            await interaction.response.send_message("Nothing is currently playing.", ephemeral=True)
+    
+    @discord.ui.button(label="⏭️ Skip", style=discord.ButtonStyle.primary)
+    async def skip_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        voice_client = interaction.guild.voice_client
+        guild_id = str(interaction.guild_id)
+        user = interaction.user
+        
+        if not voice_client or not (voice_client.is_playing() or voice_client.is_paused()):
+            await interaction.response.send_message("Not playing anything to skip.", ephemeral=True)
+            return
+        
+        current_song = CURRENT_SONG_INFO.get(guild_id, {}).get('title', 'Unknown')
+        voice_client.stop()
+        logger.info("User %s (%s) used skip button for '%s' in guild %s", user, user.id, current_song, guild_id)
+        await interaction.response.send_message("⏭️ Skipped!", ephemeral=True)
+    
+    @discord.ui.button(label="🔀 Shuffle", style=discord.ButtonStyle.secondary)
+    async def shuffle_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        guild_id = str(interaction.guild_id)
+        user = interaction.user
+        
+        # Check if there are songs in queue or if something is currently playing (meaning more might be added)
+        queue_length = len(SONG_QUEUES.get(guild_id, []))
+        is_playing = interaction.guild.voice_client and (interaction.guild.voice_client.is_playing() or interaction.guild.voice_client.is_paused())
+        
+        if queue_length == 0 and not is_playing:
+            await interaction.response.send_message("Queue is empty and nothing is playing.", ephemeral=True)
+            return
+        elif queue_length == 0 and is_playing:
+            await interaction.response.send_message("Queue is currently empty, but more songs may be added soon. Try shuffling again in a moment.", ephemeral=True)
+            return
+        
+        SONG_QUEUES[guild_id].shuffle()
+        
+        logger.info("User %s (%s) shuffled queue (%s songs) in guild %s", user, user.id, queue_length, guild_id)
+        await interaction.response.send_message(f"🔀 Shuffled {queue_length} songs!", ephemeral=True)
+    
+    @discord.ui.button(label="📋 Queue", style=discord.ButtonStyle.secondary)
+    async def queue_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        guild_id = str(interaction.guild_id)
+        
+        if guild_id not in SONG_QUEUES or not SONG_QUEUES[guild_id]:
+            await interaction.response.send_message("The queue is empty.", ephemeral=True)
+            return
+        
+        # Create paginated queue view
+        queue_view = QueuePaginationView(guild_id)
+        embed = queue_view.create_queue_embed()
+        await interaction.response.send_message(embed=embed, view=queue_view, ephemeral=True)
+    
+    @discord.ui.button(label="🎛️ EQ", style=discord.ButtonStyle.secondary)
+    async def eq_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Create EQ selection view
+        eq_view = EQSelectionView()
+        embed = eq_view.create_eq_embed(interaction.guild_id)
+        await interaction.response.send_message(embed=embed, view=eq_view, ephemeral=True)
+    
+    @discord.ui.button(label="⏹️ Stop", style=discord.ButtonStyle.danger, row=1)
+    async def stop_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        voice_client = interaction.guild.voice_client
+        guild_id = str(interaction.guild_id)
+        user = interaction.user
+        
+        if not voice_client or not voice_client.is_connected():
+            await interaction.response.send_message("I'm not connected to any voice channel.", ephemeral=True)
+            return
+        
+        current_song = CURRENT_SONG_INFO.get(guild_id, {}).get('title', 'Unknown')
+        queue_size = len(SONG_QUEUES.get(guild_id, []))
+        
+        if guild_id in SONG_QUEUES:
+            SONG_QUEUES[guild_id].clear()
+        cancel_ingestion(guild_id)
+        discard_preloaded_source(guild_id)
+        
+        # Delete and clear the now playing message
+        if guild_id in GUILD_NOW_PLAYING_MESSAGES:
+            try:
+                message = GUILD_NOW_PLAYING_MESSAGES[guild_id]
+                await message.delete()
+            except:
+                pass  # Message might already be deleted
+            finally:
+                del GUILD_NOW_PLAYING_MESSAGES[guild_id]
+        
+        if voice_client.is_playing() or voice_client.is_paused():
+            voice_client.stop()
+        
+        await voice_client.disconnect()
+        logger.info("User %s (%s) stopped playback via button in guild %s. Song: '%s', Queue size: %s", user, user.id, guild_id, current_song, queue_size)
+        await interaction.response.send_message("⏹️ Stopped playback and disconnected!", ephemeral=True)
+
+
+# Paginated Queue View
+class QueuePaginationView(discord.ui.View):
+    def __init__(self, guild_id, *, timeout=300):
+        super().__init__(timeout=timeout)
+        self.guild_id = guild_id
+        self.current_page = 0
+        self.songs_per_page = 10
+        self.queue_version = None
+        
+    def get_total_pages(self):
+        queue_length = len(SONG_QUEUES.get(self.guild_id, []))
+        return max(1, (queue_length + self.songs_per_page - 1) // self.songs_per_page)
+    
+    def create_queue_embed(self):
+        queue = SONG_QUEUES.get(self.guild_id) or GuildQueue()
+        total_pages = self.get_total_pages()
+        
+        # Keep the page in range if the queue shrank since the last render
+        if queue.version != self.queue_version:
+            self.queue_version = queue.version
+            self.current_page = min(self.current_page, total_pages - 1)
+        
+        embed = discord.Embed(
+            title="📋 Music Queue",
+            color=0x3498db
+        )
+        
+        # Show currently playing if available
+        current_song = CURRENT_SONG_INFO.get(self.guild_id)
+        if current_song:
+            embed.add_field(
+                name="🎵 Now Playing",
+                value=f"**{current_song['title']}**",
+                inline=False
+            )
+        
+        # Calculate pagination
+        start_idx = self.current_page * self.songs_per_page
+        page = queue[start_idx:start_idx + self.songs_per_page]
+        
+        if queue:
+            queue_text = ""
+            for i, song_metadata in enumerate(page, start_idx):
+                # Show artist name if available (for Spotify tracks)
+                queue_text += f"`{i+1}.` {format_queue_entry(song_metadata)}\n"
+            
+            if queue_text:
+                embed.add_field(
+                    name=f"⏭️ Up Next (Page {self.current_page + 1}/{total_pages})",
+                    value=queue_text,
+                    inline=False
+                )
+        else:
+            embed.add_field(
+                name="⏭️ Up Next",
+                value="*Queue is empty*",
+                inline=False
+            )
+        
+        embed.set_footer(text=f"Total: {len(queue)} songs • Page {self.current_page + 1}/{total_pages}")
+        
+        # Update button states
+        self.update_buttons()
+        
+        return embed
+    
+    def update_buttons(self):
+        total_pages = self.get_total_pages()
+        
+        # Update previous button
+        self.previous_page.disabled = (self.current_page == 0)
+        
+        # Update next button
+        self.next_page.disabled = (self.current_page >= total_pages - 1)
+    
+    @discord.ui.button(label="◀️ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page > 0:
+            self.current_page -= 1
+            embed = self.create_queue_embed()
+            await interaction.response.edit_message(embed=embed, view=self)
+        else:
+            await interaction.response.defer()
+    
+    @discord.ui.button(label="▶️ Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        total_pages = self.get_total_pages()
+        if self.current_page < total_pages - 1:
+            self.current_page += 1
+            embed = self.create_queue_embed()
+            await interaction.response.edit_message(embed=embed, view=self)
+        else:
+            await interaction.response.defer()
+    
+    @discord.ui.button(label="🔄 Refresh", style=discord.ButtonStyle.primary)
+    async def refresh_queue(self, interaction: discord.Interaction, button: discord.ui.Button):
+        embed = self.create_queue_embed()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+
+# EQ Selection View
+class EQSelectionView(discord.ui.View):
+    def __init__(self, *, timeout=300):
+        super().__init__(timeout=timeout)
+    
+    def create_eq_embed(self, guild_id):
+        current_eq = GUILD_EQ_SETTINGS.get(str(guild_id), "enhanced")
+        
+        preset_names = {
+            "default": "🎵 Default - Balanced sound",
+            "bass_boost": "🔊 Bass Boost - Enhanced low frequencies",
+            "enhanced": "✨ Enhanced - Full range with bass boost",
+            "vocal_boost": "🎤 Vocal Boost - Clear vocals",
+            "treble_boost": "🔔 Treble Boost - Crisp highs",
+            "cinema": "🎬 Cinema - Movie-like sound",
+            "raw": "📡 Raw - Original stream, no processing"
+        }
+        
+        embed = discord.Embed(
+            title="🎛️ Audio Equalizer Settings",
+            description=f"**Current EQ:** {preset_names[current_eq]}",
+            color=0x9b59b6
+        )
+        
+        apply_note = "New settings apply immediately." if EQ_ENGINE == "dsp" else "New settings will apply to the next song."
+        embed.add_field(
+            name="📝 Available Presets",
+            value=f"Use the buttons below to change the EQ preset.\n{apply_note}",
+            inline=False
+        )
+        
+        return embed
+    
+    @discord.ui.button(label="🎵 Default", style=discord.ButtonStyle.secondary)
+    async def default_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "default", "🎵 Default - Balanced sound")
+    
+    @discord.ui.button(label="🔊 Bass Boost", style=discord.ButtonStyle.success)
+    async def bass_boost_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "bass_boost", "🔊 Bass Boost - Enhanced low frequencies")
+    
+    @discord.ui.button(label="✨ Enhanced", style=discord.ButtonStyle.primary)
+    async def enhanced_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "enhanced", "✨ Enhanced - Full range with bass boost")
+    
+    @discord.ui.button(label="🎤 Vocal Boost", style=discord.ButtonStyle.secondary)
+    async def vocal_boost_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "vocal_boost", "🎤 Vocal Boost - Clear vocals")
+    
+    @discord.ui.button(label="🔔 Treble Boost", style=discord.ButtonStyle.secondary)
+    async def treble_boost_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "treble_boost", "🔔 Treble Boost - Crisp highs")
+    
+    @discord.ui.button(label="🎬 Cinema", style=discord.ButtonStyle.secondary, row=1)
+    async def cinema_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "cinema", "🎬 Cinema - Movie-like sound")
+    
+    @discord.ui.button(label="📡 Raw", style=discord.ButtonStyle.secondary, row=1)
+    async def raw_eq(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.set_eq(interaction, "raw", "📡 Raw - Original stream, no processing")
+    
+    async def set_eq(self, interaction: discord.Interaction, preset: str, preset_name: str):
+        guild_id = str(interaction.guild_id)
+        GUILD_EQ_SETTINGS[guild_id] = preset
+        applied_now = apply_eq_to_current_track(interaction.guild, preset)
+        
+        embed = discord.Embed(
+            title="🎛️ EQ Updated!",
+            description=f"Audio preset changed to: **{preset_name}**",
+            color=0x00ff00
+        )
+        
+        embed.add_field(
+            name="📝 Note",
+            value="Applied to the current song." if applied_now else "The new EQ settings will apply to the next song that plays.",
+            inline=False
+        )
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        
+        await interaction.response.edit_message(embed=embed, view=None)
+
+
+def create_now_playing_embed(title, duration_str="", thumbnail_url=None, author=None):
+    """Create a rich embed for now playing"""
+    embed = discord.Embed(
+        title="🎵 Now Playing",
+        description=f"**{title}**{duration_str}",
+        color=0x1DB954  # Spotify green
+    )
+    
+    if author:
+        embed.add_field(name="👤 Artist", value=author, inline=True)
+    
+    if thumbnail_url:
+        embed.set_thumbnail(url=thumbnail_url)
+    else:
+        # Default music icon if no thumbnail
+        embed.set_thumbnail(url="https://i.imgur.com/QvWbWJ9.png")  # Musical note icon
+    
+    embed.set_footer(text="Use the buttons below to control playback")
+    embed.timestamp = discord.utils.utcnow()
+    
+    return embed
+
+@bot.tree.command(name="eq", description="Change audio equalizer settings")
+@app_commands.describe(preset="Choose an EQ preset for better audio quality")
+@app_commands.choices(preset=[
+    app_commands.Choice(name="🎵 Default - Balanced sound", value="default"),
+    app_commands.Choice(name="🔊 Bass Boost - Enhanced low frequencies", value="bass_boost"),
+    app_commands.Choice(name="✨ Enhanced - Full range with bass boost", value="enhanced"),
+    app_commands.Choice(name="🎤 Vocal Boost - Clear vocals", value="vocal_boost"),
+    app_commands.Choice(name="🔔 Treble Boost - Crisp highs", value="treble_boost"),
+    app_commands.Choice(name="🎬 Cinema - Movie-like sound", value="cinema"),
+    app_commands.Choice(name="📡 Raw - Original stream, no processing", value="raw")
+])
+async def eq_command(interaction: discord.Interaction, preset: str):
+    guild_id = str(interaction.guild_id)
+    GUILD_EQ_SETTINGS[guild_id] = preset
+    applied_now = apply_eq_to_current_track(interaction.guild, preset)
+    
+    preset_names = {
+        "default": "🎵 Default - Balanced sound",
+        "bass_boost": "🔊 Bass Boost - Enhanced low frequencies", 
+        "enhanced": "✨ Enhanced - Full range with bass boost",
+        "vocal_boost": "🎤 Vocal Boost - Clear vocals",
+        "treble_boost": "🔔 Treble Boost - Crisp highs",
+        "cinema": "🎬 Cinema - Movie-like sound",
+        "raw": "📡 Raw - Original stream, no processing"
+    }
+    
+    embed = discord.Embed(
+        title="🎛️ Audio EQ Updated",
+        description=f"EQ preset changed to: **{preset_names[preset]}**",
+        color=0x9b59b6
+    )
+    
+    embed.add_field(
+        name="📝 Note",
+        value="Applied to the current song." if applied_now else "The new EQ settings will apply to the next song that plays.",
+        inline=False
+    )
+    
+    # Show what this preset does
+    preset_descriptions = {
+        "default": "Balanced audio with no modifications",
+        "bass_boost": "Boosts 60Hz and 170Hz frequencies for deeper bass",
+        "enhanced": "Bass boost + vocal clarity + loudness normalization",
+        "vocal_boost": "Enhances 1kHz and 3kHz for clearer vocals",
+        "treble_boost": "Boosts 4kHz and 8kHz for crisp high frequencies",
+        "cinema": "Bass boost with mid scoop and treble enhancement",
+        "raw": "Sends Opus streams as-is without re-encoding (no EQ or volume normalization)"
+    }
+    
+    embed.add_field(
+        name="🎚️ What this does",
+        value=preset_descriptions[preset],
+        inline=False
+    )
+    
+    await interaction.response.send_message(embed=embed)
+
+
+@bot.tree.command(name="shuffle", description="Shuffle the current queue")
+async def shuffle_command(interaction: discord.Interaction):
+    guild_id = str(interaction.guild_id)
+    user = interaction.user
+    
+    # Check if there are songs in queue
+    queue_length = len(SONG_QUEUES.get(guild_id, []))
+    is_playing = interaction.guild.voice_client and (interaction.guild.voice_client.is_playing() or interaction.guild.voice_client.is_paused())
+    
+    if queue_length == 0 and not is_playing:
+        embed = discord.Embed(
+            title="🔀 Cannot Shuffle",
+            description="Queue is empty and nothing is playing.",
+            color=0x95a5a6
+        )
+        await interaction.response.send_message(embed=embed)
+        return
+    elif queue_length == 0 and is_playing:
+        embed = discord.Embed(
+            title="🔀 Queue Currently Empty",
+            description="The queue is currently empty, but if you just added a playlist, more songs may be added soon.\nTry shuffling again in a moment.",
+            color=0xf39c12
+        )
+        await interaction.response.send_message(embed=embed)
+        return
+    elif queue_length == 1:
+        embed = discord.Embed(
+            title="🔀 Only One Song",
+            description="There's only one song in the queue. Add more songs to shuffle!",
+            color=0xf39c12
+        )
+        await interaction.response.send_message(embed=embed)
+        return
+    
+    # Shuffle the queue
+    SONG_QUEUES[guild_id].shuffle()
+    
+    embed = discord.Embed(
+        title="🔀 Queue Shuffled!",
+        description=f"Successfully shuffled {queue_length} songs in the queue.",
+        color=0x00ff00
+    )
+    
+    logger.info("User %s (%s) shuffled queue (%s songs) in guild %s", user, user.id, queue_length, guild_id)
+    await interaction.response.send_message(embed=embed)
+
+
+def format_queue_entry(song_metadata):
+    """Queue display name: "Artist - Title" when the artist is known"""
+    title = song_metadata.title or "Unknown Title"
+    artist = song_metadata.artist
+    return f"{artist} - {title}" if artist else title
+
+
+@bot.tree.command(name="remove", description="Remove a song from the queue")
+@app_commands.describe(position="Position of the song in the queue (as shown by /queue)")
+async def remove_command(interaction: discord.Interaction, position: int):
+    guild_id = str(interaction.guild_id)
+    user = interaction.user
+    queue = SONG_QUEUES.get(guild_id)
+    
+    if not queue or not 1 <= position <= len(queue):
+        embed = discord.Embed(
+            title="🗑️ Cannot Remove",
+            description=f"There is no song at position {position}. The queue has {len(queue or [])} songs.",
+            color=0x95a5a6
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    
+    removed = queue.pop(position - 1)
+    notify_queue_drained(guild_id)
+    
+    embed = discord.Embed(
+        title="🗑️ Removed from Queue",
+        description=f"`{position}.` {format_queue_entry(removed)}",
+        color=0x00ff00
+    )
+    
+    logger.info("User %s (%s) removed '%s' at position %s in guild %s", user, user.id, removed.title, position, guild_id)
+    await interaction.response.send_message(embed=embed)
+
+
+@bot.tree.command(name="move", description="Move a song to a different position in the queue")
+@app_commands.describe(
+    from_position="Current position of the song (as shown by /queue)",
+    to_position="New position for the song"
+)
+async def move_command(interaction: discord.Interaction, from_position: int, to_position: int):
+    guild_id = str(interaction.guild_id)
+    user = interaction.user
+    queue = SONG_QUEUES.get(guild_id)
+    
+    if not queue or not 1 <= from_position <= len(queue) or not 1 <= to_position <= len(queue):
+        embed = discord.Embed(
+            title="↕️ Cannot Move",
+            description=f"Positions must be between 1 and {len(queue or [])}.",
+            color=0x95a5a6
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    
+    moved = queue.move(from_position - 1, to_position - 1)
+    
+    embed = discord.Embed(
+        title="↕️ Moved in Queue",
+        description=f"{format_queue_entry(moved)}\n`{from_position}.` → `{to_position}.`",
+        color=0x00ff00
+    )
+    
+    logger.info("User %s (%s) moved '%s' from %s to %s in guild %s", user, user.id, moved.title, from_position, to_position, guild_id)
+    await interaction.response.send_message(embed=embed)
+
+
+# Alternative search function for when YouTube is having issues
+def is_youtube_auth_error(error_msg):
+    """Check if the error is related to YouTube authentication issues"""
+    auth_error_keywords = [
+        "sign in to confirm you're not a bot",
+        "this video is unavailable",
+        "private video",
+        "video unavailable", 
+        "unable to extract video",
+        "cookies",
+        "login required",
+        "age-restricted",
+        "blocked"
+    ]
+    return any(keyword in error_msg.lower() for keyword in auth_error_keywords)
+
+def get_youtube_error_message(error_msg):
+    """Get user-friendly error message for YouTube errors"""
+    error_msg_lower = error_msg.lower()
+    
+    if "sign in to confirm you're not a bot" in error_msg_lower:
+        return "YouTube is temporarily blocking access. Try again in a few minutes or search for the song by name instead."
+    elif "private video" in error_msg_lower or "video unavailable" in error_msg_lower:
+        return "This video is private or unavailable. Try a different video or search by song name."
+    elif "age-restricted" in error_msg_lower:
+        return "This video is age-restricted. Try searching for the song by name instead."
+    elif "cookies" in error_msg_lower or "login required" in error_msg_lower:
+        return "YouTube access is restricted. Try searching for the song by name instead of using direct links."
+    elif "blocked" in error_msg_lower:
+        return "This content is blocked in your region. Try searching for an alternative version."
+    else:
+        return "YouTube access failed. Try searching for the song by name instead."
+
+
+async def search_alternative_sources(song_query, guild_id, spotify_metadata=None):
+    """Try alternative sources when YouTube fails and return the queue entry found"""
+    logger.info("Trying alternative sources for '%s' in guild %s", song_query, guild_id)
+    
+    # Try with simplified yt-dlp options (no cookies, basic search)
+    try:
+        # Try a more generic search
+        if spotify_metadata:
+            # For Spotify tracks, try just the song title without artist
+            alt_query = f"ytsearch1:{spotify_metadata.title}"
+        else:
+            alt_query = f"ytsearch1:{song_query}"
+        
+        logger.info("Trying alternative search: '%s'", alt_query)
+        results = await search_ytdlp_async(alt_query, "alternative")
+        tracks = results.get("entries", [])
+        
+        if tracks:
+            first_track = tracks[0]
+            title = first_track.get("title", "Untitled")
+
+            # Create song metadata; the stream URL is resolved near the playhead
+            song_metadata = create_song_metadata(
+                title,
+                duration=first_track.get("duration"),
+                video_id=first_track.get("id"),
+                query=alt_query[len("ytsearch1:"):],
+                spotify_metadata=spotify_metadata,
+            )
+            song_metadata.is_spotify = bool(spotify_metadata)
+
+            logger.info("Successfully found alternative source for '%s': '%s'", song_query, title)
+            return song_metadata
+        
+    except Exception as e:
+        logger.error("Alternative source search failed for '%s': %s", song_query, e)
+    
+    return None
+
+# Helper function to handle YouTube authentication issues
+def is_youtube_auth_error(error_message):
+    """Check if the error is related to YouTube authentication"""
+    auth_keywords = [
+        "sign in to confirm you're not a bot",
+        "cookies",
+        "authentication",
+        "login_required",
+        "private video",
+        "members-only"
+    ]
+    return any(keyword in error_message.lower() for keyword in auth_keywords)
+
+def get_youtube_error_message(error_message):
+    """Get a user-friendly error message for YouTube issues"""
+    if "sign in to confirm you're not a bot" in error_message.lower():
+        return "YouTube is blocking bot access. Try again in a few minutes or search by song name instead."
+    elif "private video" in error_message.lower() or "members-only" in error_message.lower():
+        return "This video is private or members-only and cannot be played."
+    elif "cookies" in error_message.lower():
+        return "YouTube access is restricted. Try searching for the song by name instead of using direct links."
+    elif "video unavailable" in error_message.lower():
+        return "This video is unavailable in your region or has been removed."
+    else:
+        return "YouTube access error. Try searching for the song by name instead."
+
+
+@bot.tree.command(name="status", description="Check bot status and troubleshooting info")
+async def status_command(interaction: discord.Interaction):
+    guild_id = str(interaction.guild_id)
+    voice_client = interaction.guild.voice_client
+    
+    embed = discord.Embed(
+        title="🤖 Bot Status",
+        color=0x00ff00
+    )
+    
+    # Voice connection status
+    if voice_client and voice_client.is_connected():
+        channel_name = voice_client.channel.name
+        if voice_client.is_playing():
+            status = f"🔊 Connected to **{channel_name}** - Playing music"
+        elif voice_client.is_paused():
+            status = f"⏸️ Connected to **{channel_name}** - Paused"
+        else:
+            status = f"🔌 Connected to **{channel_name}** - Idle"
+    else:
+        status = "❌ Not connected to any voice channel"
+    
+    embed.add_field(name="🎵 Voice Status", value=status, inline=False)
+    
+    # Which cluster worker and shard serve this server
+    if SHARD_COUNT:
+        embed.add_field(
+            name="🧩 Cluster",
+            value=f"Worker {CLUSTER_ID} • shard {interaction.guild.shard_id} of {SHARD_COUNT}",
+            inline=True
+        )
+    
+    # Queue status
+    queue_count = len(SONG_QUEUES.get(guild_id, []))
+    if queue_count > 0:
+        queue_status = f"📋 {queue_count} songs in queue"
+    else:
+        queue_status = "📋 Queue is empty"
+    
+    embed.add_field(name="🎶 Queue Status", value=queue_status, inline=True)
+    
+    # Background playlist loading progress
+    ingestions = GUILD_INGESTIONS.get(guild_id, [])
+    if ingestions:
+        ingestion_status = "\n".join(
+            f"📥 {progress['label']}: {progress['done']}/{progress['total']} processed" for progress in ingestions
+        )
+        embed.add_field(name="📥 Loading Playlists", value=ingestion_status, inline=True)
+    
+    # Current EQ setting
+    current_eq = GUILD_EQ_SETTINGS.get(guild_id, "enhanced")
+    eq_names = {
+        "default": "🎵 Default",
+        "bass_boost": "🔊 Bass Boost",
+        "enhanced": "✨ Enhanced",
+        "vocal_boost": "🎤 Vocal Boost",
+        "treble_boost": "🔔 Treble Boost",
+        "cinema": "🎬 Cinema",
+        "raw": "📡 Raw"
+    }
+    embed.add_field(name="🎛️ Current EQ", value=eq_names[current_eq], inline=True)
+    
+    # Resolution cache effectiveness
+    cache_stats = await RESOLUTION_CACHE.stats()
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    hit_rate = f"{cache_stats['hits'] / lookups:.0%}" if lookups else "n/a"
+    embed.add_field(
+        name="🗃️ Search Cache",
+        value=f"{hit_rate} hit rate ({cache_stats['hits']} hits / {cache_stats['misses']} misses)\n"
+              + (f"{cache_stats['entries']} cached songs" if cache_stats['entries'] is not None else "Shared Redis cache"),
+        inline=True
+    )
+    
+    # Opus cache usage
+    opus_stats = OPUS_CACHE.stats()
+    if OPUS_CACHE_MAX_BYTES > 0:
+        embed.add_field(
+            name="💾 Audio Cache",
+            value=f"{opus_stats['entries']} tracks ({opus_stats['bytes'] / 1048576:.0f} MiB)\n{opus_stats['hits']} plays from cache",
+            inline=True
+        )
+    
+    # ffmpeg process usage
+    ffmpeg_stats = FFMPEG_SUPERVISOR.stats()
+    embed.add_field(
+        name="⚙️ ffmpeg",
+        value=(
+            f"{ffmpeg_stats['running']}/{FFMPEG_MAX_PROCESSES} running, {ffmpeg_stats['queued']} queued\n"
+            f"CPU {ffmpeg_stats['cpu_percent']:.0f}% · RSS {ffmpeg_stats['rss_bytes'] / 1048576:.0f} MiB\n"
+            f"{ffmpeg_stats['killed']} stalled processes killed"
+        ),
+        inline=True
+    )
+    
+    # Event loop health (server managers only; it describes the whole bot, not this server)
+    if interaction.user.guild_permissions.manage_guild:
+        loop_stats = LOOP_WATCHDOG.stats()
+        loop_status = (
+            f"Lag {loop_stats['current_lag'] * 1000:.0f} ms now, {loop_stats['max_lag'] * 1000:.0f} ms max\n"
+            f"{loop_stats['stalls']} stalls ≥ {LOOP_STALL_SECONDS:g}s"
+        )
+        if LOOP_SLOW_CALLBACK_MS > 0:
+            loop_status += f", {loop_stats['slow_callbacks']} slow callbacks"
+        for stall in reversed(loop_stats["recent_stalls"][-3:]):
+            loop_status += f"\n• <t:{int(stall['at'])}:R> {stall['blocked']:.1f}s at `{stall['location']}`"
+        embed.add_field(name="⏱️ Event Loop", value=loop_status, inline=False)
+    
+    # Decodes shared between guilds playing the same track
+    decode_stats = DECODE_HUB.stats()
+    if DECODE_HUB.capacity > 0:
+        embed.add_field(
+            name="🔀 Shared Decodes",
+            value=f"{decode_stats['streams']} decodes serving {decode_stats['listeners']} listeners\n{decode_stats['shared_opens']} plays joined a running decode",
+            inline=True
+        )
+    
+    # Spotify integration status
+    if spotify_client:
+        spotify_status = "✅ Available"
+    else:
+        spotify_status = "❌ Not configured"
+    
+    embed.add_field(name="🎵 Spotify Integration", value=spotify_status, inline=True)
+    
+    # Troubleshooting info
+    embed.add_field(
+        name="🔧 Troubleshooting",
+        value="• If YouTube links fail, try searching by song name\n"
+              "• For Spotify issues, use `/play song name artist` instead\n"
+              "• SoundCloud is used as backup when YouTube is blocked\n"
+              "• Use `/help` for all available commands",
+        inline=False
+    )
+    
+    embed.set_footer(text="Bot is running normally • Use /help for commands")
+    embed.timestamp = discord.utils.utcnow()
+    
+    await interaction.response.send_message(embed=embed)
+
+
+def main():
+    """Run the bot until it is closed (started by the MusicBot.py launcher)"""
+    try:
+        bot.run(TOKEN)
+    finally:
+        EXTRACTION_POOL.shutdown()
@@ -0,0 +1,50 @@
+# yt-dlp extraction worker for the bot's extraction process pool.
+# Kept separate from dj_pablo.py so worker processes only import yt-dlp.
+import os
+import yt_dlp
+
+# Long-lived YoutubeDL instances per option profile, created once per worker process
+_YDL_INSTANCES = {}
+_PROFILES = {}
+
+
+class ExtractionError(Exception):
+    """Picklable stand-in for yt-dlp errors raised inside a worker process"""
+
+
+def init_worker(profiles):
+    """Process pool initializer: build one warm YoutubeDL per option profile"""
+    _PROFILES.clear()
+    _PROFILES.update(profiles)
+    _YDL_INSTANCES.clear()
+    for name, options in profiles.items():
+        _YDL_INSTANCES[name] = yt_dlp.YoutubeDL(options)
+
+
+def ping():
+    """No-op used to start and initialize worker processes ahead of the first request"""
+    return os.getpid()
+
+
+def extract(profile, query, overrides=None):
+    """Run extract_info with the warm instance for a profile; returns a picklable dict.
+
+    `overrides` (e.g. a playlist range) replace some of the profile's options for this call only.
+    """
+    ydl = _YDL_INSTANCES[profile]
+    saved = {key: ydl.params.get(key) for key in overrides or {}}
+    ydl.params.update(overrides or {})
+    try:
+        info = ydl.extract_info(query, download=False)
+    except Exception as e:
+        # yt-dlp exceptions carry unpicklable state, so only the message crosses the process boundary
+        raise ExtractionError(str(e)) from None
+    finally:
+        ydl.params.update(saved)
+    return ydl.sanitize_info(info)
+
+
+def extract_once(options, query):
+    """Run extract_info with a throwaway YoutubeDL (used when the process pool is disabled)"""
+    with yt_dlp.YoutubeDL(options) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(query, download=False))